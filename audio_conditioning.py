@@ -0,0 +1,321 @@
+"""
+Conditionnement audio avant inférence (NumPy vectorisé, état conservé d'un bloc à l'autre)
+- Passe-haut : Butterworth en sections d'ordre 2 (scipy.signal.sosfilt, état zi persistant) ;
+  sans SciPy, masque fréquentiel appliqué dans l'étage spectral
+- Réduction de bruit : soustraction spectrale (STFT à 50 % de recouvrement), profil de bruit
+  suivi par statistiques de minimum sur une fenêtre glissante de plusieurs secondes,
+  plancher de gain contre le "bruit musical"
+- AGC : gain lissé vers un niveau RMS cible, mis à jour seulement au-dessus du seuil de bruit
+Les tableaux de travail sont préalloués et réutilisés ; ils ne grandissent que si un bloc
+dépasse leur capacité.
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from scipy.signal import butter, sosfilt, sosfilt_zi
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+DEFAULT_HIGHPASS_HZ = 100
+DEFAULT_NOISE_REDUCTION = 1.0   # facteur de sur-soustraction (0 = désactivé)
+DEFAULT_GAIN_FLOOR = 0.1        # atténuation maximale du bruit (-20 dB)
+DEFAULT_AGC_TARGET_RMS = 0.1    # -20 dBFS (0 = AGC désactivé)
+DEFAULT_AGC_MAX_GAIN = 10.0
+
+N_FFT = 512                     # 32 ms à 16 kHz
+# Statistiques de minimum : puissance moyennée par sous-fenêtre, minimum sur les dernières
+# sous-fenêtres. La fenêtre doit dépasser la plus longue plage de voix continue.
+MIN_STAT_SUBWINDOW = 8          # trames par sous-fenêtre (128 ms à 16 kHz)
+MIN_STAT_SECONDS = 5.0
+MIN_STAT_BIAS = 1.5             # le minimum de moyennes sous-estime le niveau moyen du bruit
+# Tant que la fenêtre n'est pas remplie (début de session, nouveau micro), profil plafonné à
+# un bruit blanc de ce niveau : une voix soutenue ne peut pas être apprise comme du bruit
+NOISE_INIT_MAX_RMS = 0.005
+EPS = 1e-10
+
+
+class _Workspace:
+    """Tampon préalloué ; agrandi (x2) seulement quand la demande dépasse la capacité"""
+
+    def __init__(self, dtype=np.float32):
+        self.array = np.zeros(0, dtype=dtype)
+
+    def get(self, size):
+        if len(self.array) < size:
+            self.array = np.zeros(max(size, 2 * len(self.array)), dtype=self.array.dtype)
+        return self.array[:size]
+
+
+# ----------------------
+# Étages
+# ----------------------
+class HighPassFilter:
+    """Butterworth passe-haut ; l'état du filtre est conservé entre les blocs"""
+
+    def __init__(self, cutoff_hz, sample_rate, order=2):
+        self.sos = butter(order, cutoff_hz, btype="highpass", fs=sample_rate, output="sos")
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def process(self, block):
+        if self.zi is None:
+            # Démarrage sur le premier échantillon : pas de transitoire sur la composante continue
+            self.zi = sosfilt_zi(self.sos) * block[0]
+        filtered, self.zi = sosfilt(self.sos, block, zi=self.zi)
+        return filtered.astype(np.float32, copy=False)
+
+
+class SpectralSubtractor:
+    """
+    Soustraction spectrale en flux : fenêtres racine de Hann (analyse et synthèse) à 50 %,
+    reconstruction par addition-recouvrement. Latence : un demi-cadre (16 ms à 16 kHz).
+    process() renvoie une vue sur un tampon interne, valable jusqu'à l'appel suivant.
+    """
+
+    def __init__(self, sample_rate, strength=DEFAULT_NOISE_REDUCTION, gain_floor=DEFAULT_GAIN_FLOOR,
+                 highpass_hz=0, n_fft=N_FFT):
+        self.n_fft = n_fft
+        self.hop = n_fft // 2
+        self.strength = strength
+        self.floor = gain_floor ** 2  # en puissance
+        self.window = np.sqrt(np.hanning(n_fft + 1)[:-1]).astype(np.float32)
+        freqs = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+        if highpass_hz:
+            # Passe-haut sans SciPy : rampe entre cutoff/2 et cutoff
+            self.mask = np.clip((freqs - highpass_hz / 2) / (highpass_hz / 2), 0.0, 1.0).astype(np.float32)
+        else:
+            self.mask = None
+        self.noise = None
+        frame_seconds = self.hop / sample_rate
+        self._minima = deque(maxlen=max(1, int(MIN_STAT_SECONDS / (MIN_STAT_SUBWINDOW * frame_seconds))))
+        self._subwindow = np.zeros(len(freqs))
+        self._subwindow_frames = 0
+        # Puissance par bin d'un bruit blanc de NOISE_INIT_MAX_RMS à travers la fenêtre d'analyse
+        self._init_cap = np.full(len(freqs), NOISE_INIT_MAX_RMS ** 2 * float(np.sum(np.square(self.window))))
+        self._input = _Workspace()
+        self._frames = _Workspace()
+        self._output = _Workspace()
+        self._carry = _Workspace()
+        self._carry_len = 0
+        self._tail = np.zeros(self.hop, dtype=np.float32)
+        self.reset()
+
+    def reset(self, keep_profile=True):
+        # Un demi-cadre de silence en tête : chaque échantillon est couvert par deux trames
+        self._carry.get(self.hop)[:] = 0.0
+        self._carry_len = self.hop
+        self._tail[:] = 0.0
+        if not keep_profile:
+            self.noise = None
+            self._minima.clear()
+            self._subwindow[:] = 0.0
+            self._subwindow_frames = 0
+
+    def process(self, block):
+        hop, n_fft = self.hop, self.n_fft
+        total = self._carry_len + len(block)
+        buf = self._input.get(total)
+        buf[:self._carry_len] = self._carry.get(self._carry_len)
+        buf[self._carry_len:] = block
+        n_frames = (total - n_fft) // hop + 1 if total >= n_fft else 0
+        if n_frames <= 0:
+            self._store_carry(buf)
+            return buf[:0]
+
+        frames = self._frames.get(n_frames * n_fft).reshape(n_frames, n_fft)
+        np.multiply(sliding_window_view(buf, n_fft)[::hop][:n_frames], self.window, out=frames)
+        spectrum = np.fft.rfft(frames, axis=1)
+        power = np.square(spectrum.real) + np.square(spectrum.imag)
+        if self.strength > 0:
+            self._update_noise(power)
+            # Gain de Wiener simplifié, borné par le plancher, puis passage en amplitude
+            gain = 1.0 - self.strength * self.noise / np.maximum(power, EPS)
+            np.sqrt(np.maximum(gain, self.floor, out=gain), out=gain)
+            if self.mask is not None:
+                gain *= self.mask
+            spectrum *= gain
+        elif self.mask is not None:
+            spectrum *= self.mask
+        synthesized = np.fft.irfft(spectrum, n=n_fft, axis=1)
+        synthesized *= self.window
+
+        # Addition-recouvrement vectorisée (deux moitiés de cadre décalées d'un hop)
+        out = self._output.get((n_frames + 1) * hop)
+        out[:n_frames * hop] = synthesized[:, :hop].ravel()
+        out[n_frames * hop:] = 0.0
+        out[hop:] += synthesized[:, hop:].ravel()
+        out[:hop] += self._tail
+        self._tail[:] = out[n_frames * hop:]
+        self._store_carry(buf[n_frames * hop:])
+        return out[:n_frames * hop]
+
+    def _store_carry(self, samples):
+        self._carry_len = len(samples)
+        self._carry.get(self._carry_len)[:] = samples
+
+    def _update_noise(self, power):
+        """
+        Profil de bruit par statistiques de minimum, d'un bloc à l'autre : moyenne par
+        sous-fenêtre de MIN_STAT_SUBWINDOW trames, minimum par bin sur MIN_STAT_SECONDS
+        """
+        start = 0
+        while start < len(power):
+            take = min(MIN_STAT_SUBWINDOW - self._subwindow_frames, len(power) - start)
+            self._subwindow += power[start:start + take].sum(axis=0)
+            self._subwindow_frames += take
+            start += take
+            if self._subwindow_frames == MIN_STAT_SUBWINDOW:
+                self._minima.append(self._subwindow / MIN_STAT_SUBWINDOW)
+                self._subwindow = np.zeros_like(self._subwindow)
+                self._subwindow_frames = 0
+        if not self._minima:
+            self.noise = self._init_cap.copy()
+            return
+        noise = np.min(np.stack(self._minima), axis=0) * MIN_STAT_BIAS
+        if len(self._minima) < self._minima.maxlen:
+            np.minimum(noise, self._init_cap, out=noise)
+        self.noise = noise
+
+    @property
+    def warmed_up(self):
+        return len(self._minima) == self._minima.maxlen
+
+
+class AutomaticGainControl:
+    """
+    Gain calculé par sous-blocs de block_seconds : attaque rapide quand le niveau monte,
+    relâchement lent. Le gain est figé sous gate_rms ou à moins de gate_ratio fois le plancher
+    de bruit suivi (le bruit de fond n'est pas amplifié pendant les pauses).
+    Le gain varie linéairement au sein d'un sous-bloc (pas de marche audible).
+    """
+
+    def __init__(self, sample_rate, target_rms=DEFAULT_AGC_TARGET_RMS, max_gain=DEFAULT_AGC_MAX_GAIN,
+                 min_gain=0.1, gate_rms=0.005, gate_ratio=3.0, attack=0.5, release=0.05, block_seconds=0.1):
+        self.target_rms = target_rms
+        self.max_gain = max_gain
+        self.min_gain = min_gain
+        self.gate_rms = gate_rms
+        self.gate_ratio = gate_ratio
+        self.attack = attack
+        self.release = release
+        self.block = max(1, int(sample_rate * block_seconds))
+        self.gain = 1.0
+        self.noise_floor = None
+        self._squares = _Workspace()
+        self._output = _Workspace()
+
+    def reset(self):
+        self.gain = 1.0
+        self.noise_floor = None
+
+    def process(self, block):
+        n = len(block)
+        if not n:
+            return block
+        n_sub = -(-n // self.block)
+        squares = self._squares.get(n_sub * self.block)
+        np.square(block, out=squares[:n])
+        squares[n:] = 0.0
+        sums = squares.reshape(n_sub, self.block).sum(axis=1)
+        counts = np.full(n_sub, self.block, dtype=np.float32)
+        counts[-1] = n - (n_sub - 1) * self.block
+        levels = np.sqrt(sums / counts)
+        desired = np.clip(self.target_rms / np.maximum(levels, EPS), self.min_gain, self.max_gain)
+
+        gains = np.empty(n_sub + 1, dtype=np.float32)
+        gains[0] = gain = self.gain
+        floor = self.noise_floor
+        for i in range(n_sub):
+            level = float(levels[i])
+            # Plancher : suit immédiatement les baisses, remonte lentement
+            floor = level if floor is None or level < floor else floor + 0.01 * (level - floor)
+            if level >= max(self.gate_rms, self.gate_ratio * floor):
+                rate = self.attack if desired[i] < gain else self.release
+                gain += rate * (desired[i] - gain)
+            gains[i + 1] = gain
+        self.gain = float(gain)
+        self.noise_floor = floor
+
+        edges = np.minimum(np.arange(n_sub + 1) * self.block, n)
+        out = self._output.get(n)
+        np.multiply(block, np.interp(np.arange(n), edges, gains), out=out, casting="unsafe")
+        return np.clip(out, -1.0, 1.0, out=out)
+
+
+# ----------------------
+# Chaîne complète
+# ----------------------
+class AudioConditioner:
+    """Passe-haut -> réduction de bruit -> AGC ; level = RMS avant AGC (pour la détection de parole)"""
+
+    def __init__(self, sample_rate, highpass_hz=DEFAULT_HIGHPASS_HZ, noise_reduction=DEFAULT_NOISE_REDUCTION,
+                 gain_floor=DEFAULT_GAIN_FLOOR, agc_target_rms=DEFAULT_AGC_TARGET_RMS,
+                 agc_max_gain=DEFAULT_AGC_MAX_GAIN):
+        self.highpass = HighPassFilter(highpass_hz, sample_rate) if highpass_hz and SCIPY_AVAILABLE else None
+        spectral_highpass = highpass_hz if highpass_hz and not SCIPY_AVAILABLE else 0
+        self.denoiser = None
+        if noise_reduction > 0 or spectral_highpass:
+            self.denoiser = SpectralSubtractor(sample_rate, noise_reduction, gain_floor, spectral_highpass)
+        self.agc = AutomaticGainControl(sample_rate, agc_target_rms, agc_max_gain) if agc_target_rms else None
+        self.sample_rate = sample_rate
+        self.level = 0.0
+        self.stats = {"chunks": 0, "audio_s": 0.0, "cpu_ms": 0.0}
+
+    @classmethod
+    def from_config(cls, config, sample_rate):
+        return cls(
+            sample_rate,
+            highpass_hz=config.get("highpass_hz", DEFAULT_HIGHPASS_HZ),
+            noise_reduction=config.get("noise_reduction", DEFAULT_NOISE_REDUCTION),
+            gain_floor=config.get("noise_gain_floor", DEFAULT_GAIN_FLOOR),
+            agc_target_rms=config.get("agc_target_rms", DEFAULT_AGC_TARGET_RMS),
+            agc_max_gain=config.get("agc_max_gain", DEFAULT_AGC_MAX_GAIN)
+        )
+
+    def reset(self, keep_profile=True):
+        """Nouveau flux : états des filtres remis à zéro ; profil de bruit et gain gardés si même micro"""
+        if self.highpass:
+            self.highpass.reset()
+        if self.denoiser:
+            self.denoiser.reset(keep_profile)
+        if self.agc and not keep_profile:
+            self.agc.reset()
+
+    def process(self, audio):
+        started = time.perf_counter()
+        signal = np.asarray(audio, dtype=np.float32).ravel()
+        if self.highpass:
+            signal = self.highpass.process(signal)
+        if self.denoiser:
+            signal = self.denoiser.process(signal)
+        self.level = float(np.sqrt(np.mean(np.square(signal)))) if len(signal) else 0.0
+        if self.agc:
+            signal = self.agc.process(signal)
+        # Copie propre : les étages renvoient des vues sur leurs tampons
+        out = np.array(signal, dtype=np.float32)
+        self.stats["chunks"] += 1
+        self.stats["audio_s"] += len(audio) / self.sample_rate
+        self.stats["cpu_ms"] += (time.perf_counter() - started) * 1000
+        return out
+
+    def status(self):
+        audio_s = self.stats["audio_s"]
+        return {
+            "highpass": "scipy" if self.highpass else ("spectral" if self.denoiser and self.denoiser.mask is not None
+                                                       else None),
+            "noise_reduction": bool(self.denoiser and self.denoiser.strength > 0),
+            "noise_profile": None if self.denoiser is None else
+            ("tracking" if self.denoiser.warmed_up else "warming_up"),
+            "agc_gain": round(self.agc.gain, 2) if self.agc else None,
+            "level": round(self.level, 4),
+            "chunks": self.stats["chunks"],
+            "cpu_ms_per_audio_s": round(self.stats["cpu_ms"] / audio_s, 3) if audio_s else None
+        }
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Mode hors ligne : transcription / traduction d'un dossier d'enregistrements
+- Pool de processus dimensionné selon les cœurs et la mémoire (un fichier par worker)
+- Décodage en flux via ffmpeg, par fenêtres de 30 s coupées sur un silence
+- Reprise après interruption (journal .partial.jsonl par fichier)
+- Sorties par fichier : .txt / .srt / .vtt (langue source et cible) et .json
+
+Usage :
+    python batch.py recordings/ --output transcripts/ --model medium --target fr
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import psutil
+
+CONFIG_FILE = "config.json"
+SAMPLE_RATE = 16000
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".aac", ".wma",
+                    ".mp4", ".mkv", ".mov", ".webm"}
+DEFAULT_WINDOW_SECONDS = 30   # fenêtre native de Whisper
+CUT_SEARCH_SECONDS = 3        # zone de recherche du silence en fin de fenêtre
+CUT_FRAME_SECONDS = 0.02
+FORMATS = ("txt", "srt", "vtt", "json")
+
+# Mémoire approximative d'un worker (Whisper + MarianMT, fp32) pour dimensionner le pool
+MODEL_MEMORY_GB = {"tiny": 1.0, "base": 1.2, "small": 2.0, "medium": 4.5, "large": 8.0, "turbo": 5.0}
+
+
+def load_defaults():
+    defaults = {"model_name": "small", "spoken_language": "en", "target_language": "fr", "use_gpu": False,
+                "mmap_weights": False, "cpu_weights_precision": "fp32", "translator_backend": "auto"}
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                defaults.update(json.load(f))
+        except Exception as e:
+            print(f"⚠️ Config ignorée: {e}")
+    return defaults
+
+
+def default_workers(model_name, device):
+    """Autant de workers que la mémoire le permet, au moins 2 cœurs chacun"""
+    if device != "cpu":
+        return 1
+    cores = psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    per_worker = MODEL_MEMORY_GB.get(model_name.split(".")[0].split("-")[0], 3.0)
+    available = psutil.virtual_memory().available / 1024 ** 3
+    return max(1, min(cores // 2, int(available * 0.8 // per_worker)))
+
+
+def find_audio_files(root, extensions=AUDIO_EXTENSIONS):
+    root = Path(root)
+    if root.is_file():
+        return [root]
+    return sorted(p for p in root.rglob("*") if p.is_file() and p.suffix.lower() in extensions)
+
+
+# ----------------------
+# Décodage en flux
+# ----------------------
+def stream_audio(path, start_seconds=0.0, window_seconds=DEFAULT_WINDOW_SECONDS):
+    """
+    Produit (offset_en_échantillons, audio float32) par fenêtres d'au plus window_seconds.
+    Chaque fenêtre est coupée au point le plus silencieux de ses dernières secondes ;
+    le reste est reporté sur la fenêtre suivante. ffmpeg ne garde en mémoire qu'une fenêtre.
+    """
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0"]
+    if start_seconds:
+        cmd += ["-ss", f"{start_seconds:.3f}"]
+    cmd += ["-i", str(path), "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    window = int(window_seconds * SAMPLE_RATE)
+    offset = int(round(start_seconds * SAMPLE_RATE))
+    carry = np.zeros(0, dtype=np.float32)
+    completed = False
+    try:
+        while True:
+            needed = window - len(carry)
+            raw = process.stdout.read(needed * 2)
+            chunk = np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+            audio = np.concatenate([carry, chunk]) if len(carry) else chunk
+            if len(raw) < needed * 2:
+                if len(audio):
+                    yield offset, audio
+                completed = True
+                break
+            cut = quietest_cut(audio)
+            yield offset, audio[:cut]
+            offset += cut
+            carry = audio[cut:].copy()
+    finally:
+        process.stdout.close()
+        error = process.stderr.read().decode(errors="replace").strip()
+        process.stderr.close()
+        if process.poll() is None:
+            process.kill()
+        # Erreur remontée seulement en fin de lecture normale (pas quand le consommateur s'arrête)
+        if process.wait() != 0 and error and completed:
+            raise RuntimeError(f"ffmpeg: {error}")
+
+
+def quietest_cut(audio):
+    frame = int(CUT_FRAME_SECONDS * SAMPLE_RATE)
+    search = min(int(CUT_SEARCH_SECONDS * SAMPLE_RATE), len(audio) // 2)
+    tail = audio[len(audio) - search:]
+    frames = len(tail) // frame
+    if frames < 2:
+        return len(audio)
+    energy = np.square(tail[:frames * frame]).reshape(frames, frame).mean(axis=1)
+    return len(audio) - search + int(np.argmin(energy)) * frame + frame // 2
+
+
+# ----------------------
+# Sorties
+# ----------------------
+def format_timestamp(seconds, separator=","):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+
+def write_subtitles(path, segments, key, kind):
+    with open(path, "w", encoding="utf-8") as f:
+        if kind == "vtt":
+            f.write("WEBVTT\n\n")
+        for index, segment in enumerate(segments, 1):
+            separator = "." if kind == "vtt" else ","
+            if kind == "srt":
+                f.write(f"{index}\n")
+            f.write(f"{format_timestamp(segment['start'], separator)} --> "
+                    f"{format_timestamp(segment['end'], separator)}\n{segment[key].strip()}\n\n")
+
+
+def write_outputs(base, segments, language, target_language, formats, info):
+    tracks = [("text", language)]
+    if any("translation" in s for s in segments):
+        tracks.append(("translation", target_language))
+    for key, lang in tracks:
+        if "txt" in formats:
+            with open(f"{base}.{lang}.txt", "w", encoding="utf-8") as f:
+                f.write("\n".join(s[key].strip() for s in segments) + "\n")
+        for kind in ("srt", "vtt"):
+            if kind in formats:
+                write_subtitles(f"{base}.{lang}.{kind}", segments, key, kind)
+    # Le .json est écrit en dernier : sa présence marque le fichier comme terminé
+    with open(f"{base}.json", "w", encoding="utf-8") as f:
+        json.dump({**info, "language": language, "target_language": target_language, "segments": segments},
+                  f, indent=2, ensure_ascii=False)
+
+
+# ----------------------
+# Worker
+# ----------------------
+_state = {}
+
+
+def init_worker(options):
+    """Chargé une fois par processus : modèles réutilisés pour tous ses fichiers"""
+    from inference import TranslatorRouter, load_whisper_model, set_torch_threads
+    from transcript_filter import TranscriptFilter
+    from translation_engines import TranslationSettings
+    set_torch_threads(options["threads"])
+    _state["options"] = options
+    _state["model"] = load_whisper_model(options["model_name"], options["device"],
+                                         options["mmap_weights"], options["precision"])
+    _state["translators"] = None
+    if options["target_language"]:
+        translator_device = "cuda" if options["device"] == "cuda" else "cpu"
+        _state["translators"] = TranslatorRouter(
+            options["target_language"], translator_device, options["mmap_weights"], options["translator_precision"],
+            options["translator_backend"], TranslationSettings(beam_size=options["translator_beam_size"]))
+    _state["filter"] = TranscriptFilter()
+
+
+def _read_partial(path):
+    windows = []
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    windows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # dernière ligne tronquée par l'interruption
+    return windows
+
+
+def process_file(audio_path, output_base):
+    from inference import transcribe_audio
+    from language_detection import is_auto
+    from text_segmentation import TranslationCache, translate_sentences
+    options = _state["options"]
+    model = _state["model"]
+    translators = _state["translators"]
+    transcript_filter = _state["filter"]
+    transcript_filter.reset()
+    cache = TranslationCache()
+    started = time.monotonic()
+
+    partial_path = Path(f"{output_base}.partial.jsonl")
+    windows = _read_partial(partial_path)
+    resume_at = windows[-1]["end"] if windows else 0.0
+    language = windows[0]["language"] if windows else options["spoken_language"]
+    processed = 0.0
+
+    Path(output_base).parent.mkdir(parents=True, exist_ok=True)
+    with open(partial_path, "a", encoding="utf-8") as partial:
+        for offset, audio in stream_audio(audio_path, resume_at, options["window_seconds"]):
+            start = offset / SAMPLE_RATE
+            end = start + len(audio) / SAMPLE_RATE
+            # Le texte de la fenêtre précédente sert de contexte au décodage
+            prompt = windows[-1]["text"][-200:] if windows and windows[-1]["text"] else None
+            result = transcribe_audio(model, audio, language, options["language_candidates"],
+                                      beam_size=options["beam_size"], initial_prompt=prompt)
+            if is_auto(language):
+                language = result.get("language") or language  # détectée sur la 1re fenêtre, fixée ensuite
+            segments = []
+            for segment in result.get("segments", []):
+                if transcript_filter.segment_reason(segment):
+                    continue
+                text = segment["text"].strip()
+                entry = {"start": round(start + segment["start"], 2), "end": round(min(start + segment["end"], end), 2),
+                         "text": text}
+                if translators and language != options["target_language"] and translators.get(language):
+                    entry["translation"] = translate_sentences(
+                        text, lambda s: translators.translate(s, language), cache, language)
+                segments.append(entry)
+            window = {"start": round(start, 3), "end": round(end, 3), "language": language,
+                      "text": " ".join(s["text"] for s in segments), "segments": segments}
+            partial.write(json.dumps(window, ensure_ascii=False) + "\n")
+            partial.flush()
+            windows.append(window)
+            processed += end - start
+
+    segments = [s for w in windows for s in w["segments"]]
+    duration = windows[-1]["end"] if windows else 0.0
+    info = {"source": str(audio_path), "model": options["model_name"], "duration": duration}
+    write_outputs(output_base, segments, language, options["target_language"], options["formats"], info)
+    partial_path.unlink(missing_ok=True)
+    return {"file": str(audio_path), "duration": duration, "processed": processed,
+            "resumed_at": resume_at, "elapsed": time.monotonic() - started}
+
+
+# ----------------------
+# CLI
+# ----------------------
+def main():
+    defaults = load_defaults()
+    parser = argparse.ArgumentParser(description="Transcription / traduction hors ligne d'un dossier d'enregistrements")
+    parser.add_argument("input", help="dossier (parcouru récursivement) ou fichier audio/vidéo")
+    parser.add_argument("--output", default=None, help="dossier de sortie (défaut : <input>/transcripts)")
+    parser.add_argument("--model", default=defaults["model_name"])
+    parser.add_argument("--spoken", default=defaults["spoken_language"], help="langue parlée ou 'auto' (par fichier)")
+    parser.add_argument("--target", default=defaults["target_language"])
+    parser.add_argument("--no-translate", action="store_true")
+    parser.add_argument("--workers", type=int, default=0, help="processus (0 = selon cœurs et mémoire)")
+    parser.add_argument("--threads", type=int, default=0, help="threads torch par worker (0 = cœurs / workers)")
+    parser.add_argument("--device", default=None, help="cpu, cuda ou mps (auto si absent)")
+    parser.add_argument("--beam-size", type=int, default=5, help="beam Whisper (qualité hors ligne)")
+    parser.add_argument("--translator-beam-size", type=int, default=4)
+    parser.add_argument("--translator-backend", default=defaults["translator_backend"])
+    parser.add_argument("--precision", default=defaults["cpu_weights_precision"], choices=("fp32", "bf16", "int8"))
+    parser.add_argument("--mmap", action="store_true", default=defaults["mmap_weights"],
+                        help="poids safetensors mappés (pages partagées entre workers)")
+    parser.add_argument("--window", type=float, default=DEFAULT_WINDOW_SECONDS, help="fenêtre de décodage (s)")
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--force", action="store_true", help="retraite les fichiers déjà terminés")
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    output_dir = Path(args.output) if args.output else (input_path if input_path.is_dir() else input_path.parent) / "transcripts"
+    files = find_audio_files(input_path)
+    if not files:
+        print(f"❌ Aucun fichier audio dans {input_path}")
+        return False
+
+    device = args.device
+    if device is None:
+        from inference import detect_gpu_device
+        device = detect_gpu_device() if defaults.get("use_gpu") else "cpu"
+    workers = args.workers or default_workers(args.model, device)
+    workers = min(workers, len(files))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+
+    root = input_path if input_path.is_dir() else input_path.parent
+    jobs = []
+    skipped = 0
+    for path in files:
+        # Extension conservée : talk.wav et talk.mp3 ont des sorties et des journaux distincts
+        base = output_dir / path.relative_to(root)
+        if Path(f"{base}.json").exists() and not args.force:
+            skipped += 1
+            continue
+        if args.force:
+            Path(f"{base}.partial.jsonl").unlink(missing_ok=True)
+        jobs.append((path, base))
+    print(f"📂 {len(files)} fichier(s), {skipped} déjà traité(s), {len(jobs)} à traiter")
+    print(f"⚙️ {workers} worker(s) x {threads} thread(s), modèle {args.model} sur {device}")
+    if not jobs:
+        return True
+
+    from translation_engines import translator_precision
+    options = {
+        "model_name": args.model, "device": device, "threads": threads,
+        "spoken_language": args.spoken, "target_language": None if args.no_translate else args.target,
+        "language_candidates": defaults.get("language_candidates") or None,
+        "mmap_weights": args.mmap, "precision": args.precision,
+        "translator_precision": translator_precision({**defaults, "cpu_weights_precision": args.precision}),
+        "translator_backend": args.translator_backend, "translator_beam_size": args.translator_beam_size,
+        "beam_size": args.beam_size, "window_seconds": args.window,
+        "formats": set(args.formats.split(","))
+    }
+
+    started = time.monotonic()
+    audio_seconds = 0.0
+    failures = 0
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                   initializer=init_worker, initargs=(options,))
+    try:
+        futures = {executor.submit(process_file, path, base): path for path, base in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"❌ [{done}/{len(jobs)}] {path}: {e}")
+                continue
+            audio_seconds += result["processed"]
+            speed = result["processed"] / result["elapsed"] if result["elapsed"] else 0.0
+            resumed = f", repris à {result['resumed_at']:.0f}s" if result["resumed_at"] else ""
+            print(f"✅ [{done}/{len(jobs)}] {path.name}: {result['duration'] / 60:.1f} min en "
+                  f"{result['elapsed']:.0f}s (x{speed:.1f}{resumed})", flush=True)
+    except KeyboardInterrupt:
+        print("\n🛑 Interrompu : relancez la même commande pour reprendre")
+        executor.shutdown(wait=False, cancel_futures=True)
+        return False
+    executor.shutdown()
+
+    elapsed = time.monotonic() - started
+    print(f"🏁 {audio_seconds / 3600:.2f} h d'audio en {elapsed / 3600:.2f} h "
+          f"({audio_seconds / elapsed:.1f} h d'audio / h), {failures} échec(s)")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
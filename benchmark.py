@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Benchmarks locaux des étapes du pipeline
+
+    python benchmark.py translate --backends torch,torch-int8,ctranslate2,onnx --beams 1,4
+    python benchmark.py dsp --audio salle.wav --snr 10
+    python benchmark.py dsp --check              # vérifications du conditionnement audio
+
+Chaque configuration de traduction tourne dans un processus neuf (mémoire mesurée sans interférence).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import psutil
+
+CONFIG_FILE = "config.json"
+
+SAMPLE_SENTENCES = {
+    "en": [
+        "Good morning everyone and welcome to this conference.",
+        "Today we are going to talk about live speech translation.",
+        "Please turn off your phones during the session.",
+        "The next talk will start in fifteen minutes in room B.",
+        "We will take questions at the end of the presentation.",
+        "Thank you all for coming, and have a great day.",
+    ],
+    "fr": [
+        "Bonjour à tous et bienvenue à cette conférence.",
+        "Aujourd'hui nous allons parler de traduction vocale en direct.",
+        "Merci d'éteindre vos téléphones pendant la séance.",
+        "La prochaine présentation commence dans quinze minutes en salle B.",
+        "Les questions seront prises à la fin de la présentation.",
+        "Merci à tous d'être venus, et bonne journée.",
+    ],
+}
+
+
+def load_defaults():
+    defaults = {"spoken_language": "en", "target_language": "fr", "use_gpu": False, "model_name": "small",
+                "sample_rate": 16000, "chunk_duration": 2, "volume_threshold": 0.01}
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                defaults.update(json.load(f))
+        except Exception as e:
+            print(f"⚠️ Config ignorée: {e}")
+    return defaults
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _rss_mb(process):
+    return process.memory_info().rss / 1024 ** 2
+
+
+# ----------------------
+# Traduction
+# ----------------------
+def _bench_translator(model_name, backend, beam_size, sentences, runs, threads):
+    """Exécuté dans un processus dédié"""
+    from inference import set_torch_threads
+    from translation_engines import TranslationSettings, create_engine
+    set_torch_threads(threads)
+    process = psutil.Process()
+    rss_before = _rss_mb(process)
+    started = time.perf_counter()
+    engine = create_engine(model_name, "cpu", backend, TranslationSettings(beam_size=beam_size))
+    load_s = time.perf_counter() - started
+    if engine.backend != backend:
+        return {"backend": backend, "beam": beam_size, "error": f"indisponible (fallback {engine.backend})"}
+
+    for sentence in sentences[:2]:
+        engine.translate(sentence)  # warmup
+    latencies = []
+    chars = 0
+    for _ in range(runs):
+        for sentence in sentences:
+            t0 = time.perf_counter()
+            output = engine.translate(sentence)
+            latencies.append(time.perf_counter() - t0)
+            chars += len(sentence)
+    cpu = process.cpu_times()
+    return {
+        "backend": backend,
+        "beam": beam_size,
+        "load_s": round(load_s, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "chars_per_s": round(chars / sum(latencies), 1),
+        "cpu_s": round(cpu.user + cpu.system, 2),
+        "rss_delta_mb": round(_rss_mb(process) - rss_before, 1),
+        "sample": output
+    }
+
+
+def bench_translate(args):
+    from inference import translator_model_name
+    model_name = translator_model_name(args.spoken, args.target)
+    if args.text_file:
+        with open(args.text_file, encoding="utf-8") as f:
+            sentences = [line.strip() for line in f if line.strip()]
+    else:
+        sentences = SAMPLE_SENTENCES.get(args.spoken, SAMPLE_SENTENCES["en"])
+
+    print(f"🧪 {model_name} : {len(sentences)} phrases x {args.runs} passes")
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for backend in args.backends.split(","):
+        for beam_size in (int(b) for b in args.beams.split(",")):
+            with ctx.Pool(1) as pool:
+                try:
+                    result = pool.apply(_bench_translator,
+                                        (model_name, backend, beam_size, sentences, args.runs, args.threads))
+                except Exception as e:
+                    result = {"backend": backend, "beam": beam_size, "error": str(e)}
+            results.append(result)
+            if "error" in result:
+                print(f"⚠️ {backend:<12} beam {beam_size}: {result['error']}")
+            else:
+                print(f"⏱️ {backend:<12} beam {beam_size}: p50 {result['p50_ms']} ms | p95 {result['p95_ms']} ms | "
+                      f"{result['chars_per_s']} car/s | CPU {result['cpu_s']} s | "
+                      f"+{result['rss_delta_mb']} MB | chargement {result['load_s']} s", flush=True)
+                print(f"   → {result['sample']}")
+    return results
+
+
+# ----------------------
+# Conditionnement audio (DSP)
+# ----------------------
+# Surcharges de config par variante : chaque étage seul, puis la chaîne complète
+DSP_VARIANTS = {
+    "raw": None,
+    "highpass": {"noise_reduction": 0, "agc_target_rms": 0},
+    "denoise": {"highpass_hz": 0, "agc_target_rms": 0},
+    "agc": {"highpass_hz": 0, "noise_reduction": 0},
+    "full": {},
+}
+
+
+def _rms(audio):
+    return float(np.sqrt(np.mean(np.square(audio)))) if len(audio) else 0.0
+
+
+def room_noise(length, sample_rate, seed=0):
+    """Bruit de salle synthétique : ronflement de ventilation (basses fréquences) et souffle"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(length) / sample_rate
+    rumble = sum(np.sin(2 * np.pi * f * t + rng.uniform(0, 2 * np.pi)) / (i + 1)
+                 for i, f in enumerate((30, 50, 100, 150)))
+    hiss = rng.standard_normal(length)
+    noise = rumble / _rms(rumble) + 0.5 * hiss / _rms(hiss)
+    return (noise / _rms(noise)).astype(np.float32)
+
+
+def _dsp_audio(args, sample_rate):
+    if not args.audio:
+        # Sans enregistrement : coût CPU seulement, sur un signal synthétique
+        t = np.arange(int(sample_rate * args.seconds)) / sample_rate
+        return (0.1 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 0.3 * t) > 0)).astype(np.float32)
+    from whisper import load_audio
+    return np.concatenate([load_audio(path, sr=sample_rate) for path in args.audio]).astype(np.float32)
+
+
+def _condition_chunks(chunks, conditioner):
+    """Chunks conditionnés, niveau avant AGC et temps par chunk (ms)"""
+    processed, levels, timings = [], [], []
+    for chunk in chunks:
+        t0 = time.perf_counter()
+        if conditioner is None:
+            out, level = chunk, _rms(chunk)
+        else:
+            out, level = conditioner.process(chunk), conditioner.level
+        timings.append((time.perf_counter() - t0) * 1000)
+        processed.append(out)
+        levels.append(level)
+    return processed, levels, timings
+
+
+def _decode_chunks(model, chunks, levels, language, volume_threshold):
+    """Décodage Whisper des chunks qui passent le seuil de parole, comme dans audio_loop"""
+    from inference import transcribe_audio
+    decoded, latencies, fallbacks, logprobs, texts = 0, [], 0, [], []
+    for chunk, level in zip(chunks, levels):
+        if level <= volume_threshold:
+            continue
+        t0 = time.perf_counter()
+        result = transcribe_audio(model, chunk, language)
+        latencies.append(time.perf_counter() - t0)
+        decoded += 1
+        for segment in result.get("segments", []):
+            # Température > 0 : le décodage glouton a été rejeté puis relancé
+            fallbacks += segment.get("temperature", 0.0) > 0
+            logprobs.append(segment.get("avg_logprob", 0.0))
+        texts.append(result.get("text", "").strip())
+    return {
+        "decoded": decoded,
+        "skipped": len(chunks) - decoded,
+        "decode_s": round(sum(latencies), 2),
+        "decode_p50_ms": round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        "fallbacks": int(fallbacks),
+        "avg_logprob": round(sum(logprobs) / len(logprobs), 3) if logprobs else None,
+        "sample": " ".join(t for t in texts if t)[:160]
+    }
+
+
+def check_dsp(sample_rate):
+    """Vérifications rapides des étages DSP sur signaux synthétiques"""
+    from audio_conditioning import AudioConditioner, SpectralSubtractor
+    rng = np.random.default_rng(0)
+    t = np.arange(sample_rate * 2) / sample_rate
+    tone = (0.07 * np.sqrt(2) * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+    checks = []
+
+    # Reconstruction exacte sans soustraction, quel que soit le découpage en blocs (retard d'un hop)
+    subtractor = SpectralSubtractor(sample_rate, strength=0)
+    signal = (0.1 * rng.standard_normal(sample_rate * 3)).astype(np.float32)
+    pieces, start = [], 0
+    for size in (100, 300, 5000, 7, 20000, len(signal)):
+        pieces.append(subtractor.process(signal[start:start + size]).copy())
+        start += size
+    output = np.concatenate(pieces)
+    error = float(np.abs(output[subtractor.hop:] - signal[:len(output) - subtractor.hop]).max())
+    checks.append(("reconstruction", error < 1e-5, error))
+
+    # Voix soutenue en début de session : pas apprise comme du bruit
+    conditioner = AudioConditioner(sample_rate, agc_target_rms=0)
+    conditioner.process(tone)
+    checks.append(("sustained_voice_kept", conditioner.level > 0.9 * _rms(tone), conditioner.level))
+
+    # Bruit stationnaire atténué une fois la fenêtre de minimum remplie
+    noise = 0.02 * room_noise(sample_rate * 8, sample_rate)
+    for i in range(0, len(noise), len(t)):
+        conditioner.process(noise[i:i + len(t)])
+    checks.append(("stationary_noise_reduced", conditioner.level < 0.8 * _rms(noise), conditioner.level))
+    conditioner.process(tone)
+    checks.append(("voice_after_noise_kept", conditioner.level > 0.9 * _rms(tone), conditioner.level))
+
+    # Passe-haut : ronflement à 30 Hz
+    highpass = AudioConditioner(sample_rate, noise_reduction=0, agc_target_rms=0)
+    rumble = (0.05 * np.sin(2 * np.pi * 30 * t)).astype(np.float32)
+    highpass.process(rumble)
+    checks.append(("highpass_rumble", highpass.level < 0.3 * _rms(rumble), highpass.level))
+
+    # AGC : orateur faible ramené vers la cible, silences non amplifiés
+    agc = AudioConditioner(sample_rate, highpass_hz=0, noise_reduction=0)
+    quiet = (0.1 * tone * (np.sin(2 * np.pi * 0.5 * t) > 0)).astype(np.float32)
+    for _ in range(5):
+        output = agc.process(quiet)
+    voiced = np.sin(2 * np.pi * 0.5 * t[:len(output)]) > 0
+    checks.append(("agc_quiet_talker", _rms(output[voiced]) > 0.5 * agc.agc.target_rms, _rms(output[voiced])))
+
+    results = []
+    for name, ok, value in checks:
+        print(f"{'✅' if ok else '❌'} {name}: {value:.4g}")
+        results.append({"check": name, "ok": bool(ok), "value": float(value)})
+    return results
+
+
+def bench_dsp(args):
+    from audio_conditioning import AudioConditioner, SCIPY_AVAILABLE
+    defaults = load_defaults()
+    if args.check:
+        return check_dsp(defaults["sample_rate"])
+    sample_rate = defaults["sample_rate"]
+    audio = _dsp_audio(args, sample_rate)
+    if args.snr is not None:
+        audio = audio + room_noise(len(audio), sample_rate) * (_rms(audio) / 10 ** (args.snr / 20))
+    chunk_samples = int(args.chunk * sample_rate)
+    chunks = [audio[i:i + chunk_samples] for i in range(0, len(audio), chunk_samples)]
+    audio_s = len(audio) / sample_rate
+    print(f"🧪 {audio_s:.0f} s d'audio en chunks de {args.chunk} s"
+          + (f", bruit de salle à {args.snr} dB SNR" if args.snr is not None else "")
+          + ("" if SCIPY_AVAILABLE else " (SciPy absent : passe-haut dans le domaine fréquentiel)"))
+
+    model = None
+    decode_variants = args.decode.split(",") if args.decode and args.audio else []
+    if decode_variants:
+        from inference import load_whisper_model, set_torch_threads
+        set_torch_threads(args.threads)
+        model = load_whisper_model(args.model, "cpu")
+        model.transcribe(chunks[0], language=args.language, fp16=False)  # warmup
+
+    results = []
+    for name in args.variants.split(","):
+        overrides = DSP_VARIANTS[name]
+        conditioner = None if overrides is None else AudioConditioner.from_config({**defaults, **overrides}, sample_rate)
+        process = psutil.Process()
+        cpu_before = process.cpu_times()
+        processed, levels, timings = _condition_chunks(chunks, conditioner)
+        cpu_after = process.cpu_times()
+        cpu_s = (cpu_after.user + cpu_after.system) - (cpu_before.user + cpu_before.system)
+        result = {
+            "variant": name,
+            "p50_ms": round(percentile(timings, 0.5), 3),
+            "p95_ms": round(percentile(timings, 0.95), 3),
+            "ms_per_audio_s": round(sum(timings) / audio_s, 3),
+            "cpu_s": round(cpu_s, 3),
+            "speech_chunks": sum(level > defaults["volume_threshold"] for level in levels)
+        }
+        print(f"⏱️ {name:<9}: p50 {result['p50_ms']} ms/chunk | p95 {result['p95_ms']} ms | "
+              f"{result['ms_per_audio_s']} ms par s d'audio | {result['speech_chunks']}/{len(chunks)} chunks "
+              f"au-dessus de volume_threshold", flush=True)
+        if model is not None and name in decode_variants:
+            result.update(_decode_chunks(model, processed, levels, args.language, defaults["volume_threshold"]))
+            print(f"   🗣️ {result['decoded']} chunks décodés en {result['decode_s']} s "
+                  f"(p50 {result['decode_p50_ms']} ms) | {result['fallbacks']} fallback(s) de température | "
+                  f"avg_logprob {result['avg_logprob']}")
+            print(f"   → {result['sample']}")
+        results.append(result)
+    return results
+
+
+# ----------------------
+# CLI
+# ----------------------
+def main():
+    defaults = load_defaults()
+    parser = argparse.ArgumentParser(description="Benchmarks Live Translation")
+    parser.add_argument("--json", default=None, help="fichier de résultats JSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    translate = subparsers.add_parser("translate", help="moteurs de traduction MarianMT")
+    translate.add_argument("--backends", default="torch,torch-int8,ctranslate2,onnx")
+    translate.add_argument("--beams", default="1,4", help="largeurs de beam à comparer (1 = greedy)")
+    translate.add_argument("--spoken", default=defaults["spoken_language"])
+    translate.add_argument("--target", default=defaults["target_language"])
+    translate.add_argument("--runs", type=int, default=5)
+    translate.add_argument("--threads", type=int, default=0, help="threads torch (0 = défaut)")
+    translate.add_argument("--text-file", default=None, help="une phrase par ligne")
+    translate.set_defaults(func=bench_translate)
+
+    dsp = subparsers.add_parser("dsp", help="conditionnement audio (passe-haut, réduction de bruit, AGC)")
+    dsp.add_argument("--audio", nargs="*", default=[], help="enregistrements (sans : signal synthétique, CPU seul)")
+    dsp.add_argument("--snr", type=float, default=None, help="ajoute un bruit de salle synthétique à ce SNR (dB)")
+    dsp.add_argument("--variants", default=",".join(DSP_VARIANTS))
+    dsp.add_argument("--decode", default="raw,full", help="variantes décodées par Whisper (vide = CPU seul)")
+    dsp.add_argument("--model", default=defaults["model_name"])
+    dsp.add_argument("--language", default=None if defaults["spoken_language"] == "auto" else defaults["spoken_language"])
+    dsp.add_argument("--chunk", type=float, default=defaults["chunk_duration"])
+    dsp.add_argument("--seconds", type=float, default=60, help="durée du signal synthétique")
+    dsp.add_argument("--threads", type=int, default=0, help="threads torch (0 = défaut)")
+    dsp.add_argument("--check", action="store_true", help="vérifie les étages sur signaux synthétiques")
+    dsp.set_defaults(func=bench_dsp)
+
+    args = parser.parse_args()
+    results = args.func(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"command": args.command, "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"💾 Résultats écrits dans {args.json}")
+    return all(result.get("ok", True) for result in results)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -86,6 +86,22 @@ def install_dependencies():
     
     return run_command("npm install", "Installation des dépendances npm", cwd=frontend_dir)
 
+def build_project():
+    """Exporte le front en fichiers statiques (output: export)"""
+    return run_command("npm run build", "Build Next.js (export statique)", cwd="live-translation-front")
+
+def precompress_build():
+    """Génère les variantes .gz/.br servies par le backend"""
+    try:
+        from static_front import precompress_directory, BROTLI_AVAILABLE
+    except ImportError as e:
+        print(f"⚠️ Précompression ignorée: {e}")
+        return True
+    count = precompress_directory()
+    encodings = "gzip + brotli" if BROTLI_AVAILABLE else "gzip (installez 'brotli' pour .br)"
+    print(f"🗜️ {count} fichier(s) précompressé(s) ({encodings})")
+    return True
+
 def verify_build():
     """Vérifie que le build a réussi"""
     out_dir = Path("live-translation-front/out")
@@ -120,7 +136,15 @@ def main():
     if not install_dependencies():
         return False
     
-    print("\n🎉 Installation terminée avec succès!")
+    if not build_project():
+        return False
+    
+    if not verify_build():
+        return False
+    
+    precompress_build()
+    
+    print("\n🎉 Build terminé avec succès!")
     
     return True
 
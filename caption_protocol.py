@@ -0,0 +1,223 @@
+"""
+Protocole de sous-titres v2
+- Segments identifiés + numéros de séquence
+- Mises à jour delta (ajout / remplacement de suffixe)
+- Encodage MessagePack négocié à la connexion, JSON en fallback
+"""
+
+import json
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+PROTOCOL_VERSION = 2
+
+# Opérations delta (clés courtes pour limiter la taille sur le fil)
+OP_SET = "s"             # texte complet du segment
+OP_APPEND = "a"          # ajout à la fin du texte actuel
+OP_REPLACE_SUFFIX = "r"  # remplace le texte à partir de la position "p"
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+
+ROOM_LEGACY = "captions:legacy"
+ROOM_JSON = "captions:json"
+ROOM_MSGPACK = "captions:msgpack"
+
+# Nombre de segments conservés pour resynchroniser un client
+HISTORY_SIZE = 20
+
+
+# ----------------------
+# Delta
+# ----------------------
+def compute_delta(old: str, new: str):
+    """Retourne (op, position, texte) pour passer de old à new, ou None si inchangé"""
+    if old == new:
+        return None
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    if prefix == 0:
+        return OP_SET, 0, new
+    if prefix == len(old):
+        return OP_APPEND, prefix, new[prefix:]
+    return OP_REPLACE_SUFFIX, prefix, new[prefix:]
+
+
+def apply_delta(text: str, message: dict) -> str:
+    """Applique un message delta à un texte (utilisé par les clients Python et le load-test)"""
+    op = message["op"]
+    if op == OP_SET:
+        return message["t"]
+    if op == OP_APPEND:
+        return text + message["t"]
+    if op == OP_REPLACE_SUFFIX:
+        return text[:message["p"]] + message["t"]
+    raise ValueError(f"Opération inconnue: {op}")
+
+
+# ----------------------
+# Encodage
+# ----------------------
+def encode_message(message: dict, encoding: str):
+    """dict pour JSON (sérialisé par Socket.IO), bytes pour MessagePack"""
+    if encoding == ENCODING_MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    return message
+
+
+def decode_message(payload):
+    if isinstance(payload, (bytes, bytearray)):
+        return msgpack.unpackb(payload, raw=False)
+    if isinstance(payload, str):
+        return json.loads(payload)
+    return payload
+
+
+def negotiate_encoding(environ, auth=None):
+    """
+    Lit la version et l'encodage demandés par le client (auth Socket.IO ou query string).
+    Retourne None pour un client legacy (événement 'translation' en JSON texte complet).
+    """
+    params = {}
+    if environ:
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        params.update({k: v[0] for k, v in query.items() if v})
+    if isinstance(auth, dict):
+        params.update({k: str(v) for k, v in auth.items()})
+
+    try:
+        version = int(params.get("caption_protocol", 0))
+    except ValueError:
+        version = 0
+    if version < PROTOCOL_VERSION:
+        return None
+
+    requested = [e.strip() for e in params.get("encoding", ENCODING_JSON).split(",")]
+    if ENCODING_MSGPACK in requested and MSGPACK_AVAILABLE:
+        return ENCODING_MSGPACK
+    return ENCODING_JSON
+
+
+# ----------------------
+# Flux de sous-titres
+# ----------------------
+class CaptionStream:
+    """État des segments côté serveur et génération des messages delta"""
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.history_size = history_size
+        self.segments = OrderedDict()  # seg_id -> {"text": str, "final": bool}
+        self.seq = 0
+        self._next_segment_id = 1
+
+    def new_segment(self) -> int:
+        seg_id = self._next_segment_id
+        self._next_segment_id += 1
+        return seg_id
+
+    def update(self, seg_id: int, text: str, final: bool = False, **extra):
+        """Met à jour un segment et retourne le message à diffuser (None si rien n'a changé)"""
+        previous = self.segments.get(seg_id)
+        old_text = previous["text"] if previous else ""
+        delta = compute_delta(old_text, text)
+        if delta is None:
+            if previous is None or previous["final"] == final:
+                return None
+            delta = (OP_APPEND, len(text), "")
+        if previous is None:
+            delta = (OP_SET, 0, text)
+
+        self.segments[seg_id] = {"text": text, "final": final}
+        self.segments.move_to_end(seg_id)
+        while len(self.segments) > self.history_size:
+            self.segments.popitem(last=False)
+
+        op, position, chunk = delta
+        self.seq += 1
+        message = {"v": PROTOCOL_VERSION, "seq": self.seq, "seg": seg_id, "op": op, "t": chunk}
+        if op == OP_REPLACE_SUFFIX:
+            message["p"] = position
+        if final:
+            message["f"] = 1
+        message.update(extra)
+        return message
+
+    def get_text(self, seg_id: int) -> str:
+        segment = self.segments.get(seg_id)
+        return segment["text"] if segment else ""
+
+    def snapshot(self):
+        """Messages complets des derniers segments, pour un client qui (re)joint le flux"""
+        return [
+            {"v": PROTOCOL_VERSION, "seq": self.seq, "seg": seg_id, "op": OP_SET,
+             "t": segment["text"], **({"f": 1} if segment["final"] else {})}
+            for seg_id, segment in self.segments.items()
+        ]
+
+
+class CaptionBroadcaster:
+    """Diffuse un CaptionStream aux clients selon l'encodage négocié"""
+
+    def __init__(self, sio, stream=None):
+        self.sio = sio
+        self.stream = stream or CaptionStream()
+        self.client_encodings = {}
+
+    async def register(self, sid, environ, auth=None):
+        encoding = negotiate_encoding(environ, auth)
+        self.client_encodings[sid] = encoding
+        if encoding is None:
+            await self.sio.enter_room(sid, ROOM_LEGACY)
+            return None
+        await self.sio.enter_room(sid, ROOM_MSGPACK if encoding == ENCODING_MSGPACK else ROOM_JSON)
+        await self.sio.emit('caption_protocol', {'version': PROTOCOL_VERSION, 'encoding': encoding}, room=sid)
+        await self.send_snapshot(sid)
+        return encoding
+
+    def unregister(self, sid):
+        self.client_encodings.pop(sid, None)
+
+    async def send_snapshot(self, sid):
+        encoding = self.client_encodings.get(sid)
+        if encoding is None:
+            return
+        for message in self.stream.snapshot():
+            await self.sio.emit('caption', encode_message(message, encoding), room=sid)
+
+    def new_segment(self) -> int:
+        return self.stream.new_segment()
+
+    async def _emit_caption(self, message):
+        # Encodé une seule fois par format, quel que soit le nombre de clients
+        await self.sio.emit('caption', message, room=ROOM_JSON)
+        if MSGPACK_AVAILABLE:
+            await self.sio.emit('caption', encode_message(message, ENCODING_MSGPACK), room=ROOM_MSGPACK)
+
+    async def publish(self, seg_id: int, text: str, final: bool = False, **extra):
+        message = self.stream.update(seg_id, text, final=final, **extra)
+        if message is None:
+            return None
+        await self._emit_caption(message)
+        # Clients legacy : texte complet, 'translation_partial' pendant la génération puis 'translation'
+        event = 'translation' if final else 'translation_partial'
+        await self.sio.emit(event, {'text': text, 'segment_id': seg_id, **extra}, room=ROOM_LEGACY)
+        return message
+
+    async def correct(self, seg_id: int, text: str, **extra):
+        """Remplace le texte d'un segment déjà finalisé (correction du modèle principal)"""
+        message = self.stream.update(seg_id, text, final=True, **extra)
+        if message is None:
+            return None
+        await self._emit_caption(message)
+        # Événement distinct pour les clients legacy, qui ajouteraient sinon une nouvelle ligne
+        await self.sio.emit('translation_correction', {'text': text, 'segment_id': seg_id, **extra}, room=ROOM_LEGACY)
+        return message
@@ -0,0 +1,201 @@
+"""
+Chargement des modèles et appels d'inférence (Whisper + MarianMT)
+Partagé par le serveur (main.py) et les processus workers : aucun état global ici.
+"""
+
+import threading
+import time
+
+import whisper
+
+from language_detection import choose_transcription_language, detect_language, is_auto
+
+
+# ----------------------
+# Détection GPU
+# ----------------------
+def detect_gpu_device(force_mps=False):
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return "cuda"
+        elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+            if force_mps:
+                print("⚠️ MPS forcé (peut causer des erreurs avec Whisper)")
+                return "mps"
+            else:
+                print("⚠️ MPS détecté mais désactivé pour Whisper (problèmes de compatibilité)")
+                return "cpu"
+        else:
+            return "cpu"
+    except ImportError:
+        return "cpu"
+
+
+def describe_device(device):
+    print(f"🔍 GPU détecté: {device.upper()}")
+    if device == "cuda":
+        try:
+            import torch
+            print(f"   - Nom: {torch.cuda.get_device_name(0)}")
+            print(f"   - Mémoire: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
+        except Exception:
+            pass
+    elif device == "mps":
+        print("   - Metal Performance Shaders (Mac)")
+
+
+def set_torch_threads(num_threads):
+    """Limite les thread pools torch (utile quand plusieurs processus se partagent les cœurs)"""
+    if not num_threads:
+        return
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(1)
+    except Exception:
+        pass
+
+
+# ----------------------
+# Whisper
+# ----------------------
+def load_whisper_model(model_name, device="cpu", mmap_weights=False, precision="fp32"):
+    if device == "cpu" and (mmap_weights or precision != "fp32"):
+        try:
+            from memory_policy import load_whisper_lean
+            model = load_whisper_lean(model_name, precision)
+            print(f"💻 Whisper loaded on CPU (mmap safetensors, {precision})")
+            return model
+        except Exception as e:
+            print(f"⚠️ Chargement économe de Whisper impossible: {e}\nFallback au chargement standard")
+    if device != "cpu":
+        try:
+            model = whisper.load_model(model_name, device=device)
+            print(f"✅ Whisper loaded on {device}")
+            return model
+        except Exception as e:
+            print(f"⚠️ Impossible de charger Whisper sur {device}: {e}\nFallback to CPU")
+            return whisper.load_model(model_name, device="cpu")
+    model = whisper.load_model(model_name, device="cpu")
+    print("💻 Whisper loaded on CPU")
+    return model
+
+
+def transcribe_audio(model, audio, language, candidates=None, session_language=None, min_confidence=0.0,
+                     **decode_options):
+    """
+    language=None/"auto" : détection explicite (avec probabilité) puis transcription dans la langue détectée,
+    ou dans session_language si la détection est sous min_confidence.
+    result["language"] : langue détectée ; result["transcribed_language"] : langue imposée au décodage.
+    decode_options : options supplémentaires de model.transcribe (beam_size, initial_prompt...)
+    """
+    detected, probability = None, None
+    if is_auto(language):
+        detected, probability = detect_language(model, audio, candidates)
+        language = choose_transcription_language(detected, probability, session_language, min_confidence)
+    result = model.transcribe(audio, task="transcribe", language=language, fp16=False, **decode_options)
+    if probability is not None:
+        result["language"] = detected
+        result["language_probability"] = probability
+    result["transcribed_language"] = language
+    return result
+
+
+def summarize_result(result):
+    """Version compacte (et picklable) d'un résultat Whisper"""
+    return {
+        "text": result.get("text", "").strip(),
+        "language": result.get("language"),
+        "language_probability": result.get("language_probability"),
+        "transcribed_language": result.get("transcribed_language"),
+        "segments": [
+            {k: segment.get(k) for k in ("start", "end", "text", "avg_logprob", "compression_ratio", "no_speech_prob")}
+            for segment in result.get("segments", [])
+        ]
+    }
+
+
+# ----------------------
+# MarianMT translator
+# ----------------------
+def translator_model_name(spoken_language, target_language):
+    return f"Helsinki-NLP/opus-mt-{spoken_language}-{target_language}"
+
+
+def load_translator(spoken_language, target_language, device="cpu", mmap_weights=False, precision="auto",
+                    backend="auto", settings=None):
+    """Retourne un moteur de traduction (translation_engines), ou None si le modèle n'est pas disponible"""
+    from translation_engines import create_engine
+    model_name = translator_model_name(spoken_language, target_language)
+    try:
+        translator = create_engine(model_name, device, backend, settings, mmap_weights, precision)
+        print(f"✅ Translator loaded: {model_name} on {device} ({translator.backend}; {translator.backend_reason})")
+        return translator
+    except Exception as e:
+        print(f"⚠️ Translator not available: {e}")
+        return None
+
+
+class TranslatorRouter:
+    """
+    Un traducteur MarianMT par langue source (chargé à la demande) vers la langue cible.
+    Sans paire disponible, translate() renvoie None (l'appelant affiche la transcription brute) ;
+    un chargement échoué est retenté après LOAD_RETRY_SECONDS.
+    """
+
+    LOAD_RETRY_SECONDS = 300
+
+    def __init__(self, target_language, device="cpu", mmap_weights=False, precision="auto",
+                 backend="auto", settings=None):
+        self.target_language = target_language
+        self.device = device
+        self.mmap_weights = mmap_weights
+        self.precision = precision
+        self.backend = backend
+        self.settings = settings
+        self.translators = {}
+        self.failures = {}  # langue -> instant du dernier échec de chargement
+        # get() est appelé depuis les threads de l'executor : un seul chargement à la fois
+        self._lock = threading.Lock()
+
+    def unavailable(self, source_language) -> bool:
+        """Échec de chargement récent (ne déclenche aucun chargement)"""
+        failed_at = self.failures.get(source_language)
+        return failed_at is not None and time.monotonic() - failed_at < self.LOAD_RETRY_SECONDS
+
+    def get(self, source_language):
+        with self._lock:
+            if source_language not in self.translators and not self.unavailable(source_language):
+                translator = load_translator(
+                    source_language, self.target_language, self.device, self.mmap_weights, self.precision,
+                    self.backend, self.settings)
+                if translator is None:
+                    self.failures[source_language] = time.monotonic()
+                else:
+                    self.failures.pop(source_language, None)
+                    self.translators[source_language] = translator
+            return self.translators.get(source_language)
+
+    def translate(self, text: str, source_language: str):
+        """Traduction, ou None si aucun traducteur n'est disponible pour cette langue"""
+        if source_language == self.target_language:
+            return text
+        translator = self.get(source_language)
+        if translator is None:
+            return None
+        return translator.translate(text)
+
+    def stream(self, text: str, source_language: str):
+        """Traduction diffusée mot par mot (voir TranslatorEngine.stream) ; rien sans traducteur"""
+        if source_language == self.target_language:
+            yield text
+            return
+        translator = self.get(source_language)
+        if translator is None:
+            return
+        yield from translator.stream(text)
+
+    @property
+    def available(self):
+        return bool(self.translators)
@@ -0,0 +1,392 @@
+"""
+Workers d'inférence multi-processus
+- Transcription (Whisper) et traduction (MarianMT) dans des processus séparés
+- Audio transmis via multiprocessing.shared_memory (pas de tableaux picklés)
+- Canal de résultats léger vers le processus ASGI
+- Supervision : un worker planté est redémarré et ses jobs sont relancés
+"""
+
+import asyncio
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+KIND_TRANSCRIBE = "transcribe"
+KIND_TRANSLATE = "translate"
+
+MAX_SEGMENT_SECONDS = 30   # fenêtre maximale de Whisper
+SEGMENT_MARGIN_SECONDS = 1.0  # un chunk dépasse chunk_duration d'au plus un bloc du micro
+MAX_RETRIES = 1
+RESTART_BACKOFF = 2.0      # délai avant le premier redémarrage, doublé à chaque échec consécutif
+MAX_RESTART_BACKOFF = 60.0
+MAX_START_FAILURES = 5     # morts consécutives sans avoir été prêt : le pool est désactivé
+PARKED_INTERVAL = 10.0     # supervision espacée quand le pipeline est à l'arrêt
+
+
+# ----------------------
+# Mémoire partagée audio
+# ----------------------
+class SharedAudioBuffer:
+    """Slots float32 de taille fixe dans un bloc de mémoire partagée"""
+
+    def __init__(self, slots, slot_samples, name=None):
+        self.slots = slots
+        self.slot_samples = slot_samples
+        self.owner = name is None
+        size = slots * slot_samples * np.dtype(np.float32).itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.array = np.ndarray((slots, slot_samples), dtype=np.float32, buffer=self.shm.buf)
+        self._free = list(range(slots))
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def acquire(self):
+        with self._lock:
+            return self._free.pop() if self._free else None
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    def write(self, slot, audio):
+        length = len(audio)
+        if length > self.slot_samples:
+            raise ValueError(f"Segment audio trop long pour la mémoire partagée "
+                             f"({length} échantillons, max {self.slot_samples})")
+        self.array[slot, :length] = audio
+        return length
+
+    def view(self, slot, length):
+        return self.array[slot, :length]
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# ----------------------
+# Processus worker
+# ----------------------
+def worker_main(kind, worker_id, task_queue, result_conn, shm_name, slots, slot_samples, options):
+    from inference import (TranslatorRouter, load_whisper_model, set_torch_threads,
+                           summarize_result, transcribe_audio)
+    from language_detection import is_auto
+
+    set_torch_threads(options.get("threads"))
+    audio_buffer = None
+    if kind == KIND_TRANSCRIBE:
+        audio_buffer = SharedAudioBuffer(slots, slot_samples, name=shm_name)
+        engine = load_whisper_model(options["model_name"], options["device"],
+                                    options.get("mmap_weights", False), options.get("precision", "fp32"))
+    else:
+        from translation_engines import TranslationSettings
+        engine = TranslatorRouter(options["target_language"], options["translator_device"],
+                                  options.get("mmap_weights", False), options.get("translator_precision", "auto"),
+                                  options.get("translator_backend", "auto"),
+                                  TranslationSettings(**options.get("translator_settings", {})))
+        if not is_auto(options["spoken_language"]):
+            engine.get(options["spoken_language"])
+    result_conn.send(("ready", kind, worker_id, None, engine is not None))
+
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            job_id, payload = task
+            try:
+                if kind == KIND_TRANSCRIBE:
+                    slot, length, language, session_language = payload
+                    audio = audio_buffer.view(slot, length)
+                    result = summarize_result(transcribe_audio(engine, audio, language, options.get("language_candidates"),
+                                                               session_language, options.get("language_min_confidence", 0.0)))
+                else:
+                    text, source_language = payload
+                    result = engine.translate(text, source_language)
+                result_conn.send(("result", kind, worker_id, job_id, result))
+            except Exception as e:
+                result_conn.send(("error", kind, worker_id, job_id, str(e)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if audio_buffer:
+            audio_buffer.close()
+
+
+class _Worker:
+    def __init__(self, kind, worker_id):
+        self.kind = kind
+        self.worker_id = worker_id
+        self.process = None
+        self.task_queue = None
+        # Un pipe de résultats par worker : un crash ne peut pas bloquer le canal des autres
+        self.result_conn = None
+        self.in_flight = set()
+        self.ready = False
+        self.restarts = 0
+        self.failures = 0       # morts consécutives sans avoir été prêt
+        self.restart_at = None  # redémarrage planifié (backoff)
+        self.started_at = 0.0
+
+
+# ----------------------
+# Pool côté serveur
+# ----------------------
+class InferenceWorkerPool:
+    def __init__(self, options, transcribe_workers=1, translate_workers=1, threads_per_worker=0,
+                 sample_rate=16000, slots=None, segment_seconds=MAX_SEGMENT_SECONDS):
+        self.options = dict(options)
+        if not threads_per_worker:
+            total = max(1, transcribe_workers + translate_workers)
+            threads_per_worker = max(1, (os.cpu_count() or 1) // total)
+        self.options["threads"] = threads_per_worker
+        self.ctx = mp.get_context("spawn")
+        # Slots dimensionnés sur la durée des chunks : un segment plus long est refusé, jamais tronqué
+        slot_samples = int(sample_rate * (min(segment_seconds, MAX_SEGMENT_SECONDS) + SEGMENT_MARGIN_SECONDS))
+        self.audio_buffer = SharedAudioBuffer(slots or max(4, transcribe_workers * 4), slot_samples)
+        self.slot_available = None
+        self.workers = {
+            KIND_TRANSCRIBE: [_Worker(KIND_TRANSCRIBE, i) for i in range(transcribe_workers)],
+            KIND_TRANSLATE: [_Worker(KIND_TRANSLATE, i) for i in range(translate_workers)],
+        }
+        self.jobs = {}  # job_id -> dict(kind, payload, future, worker, retries)
+        self._job_ids = itertools.count(1)
+        self.loop = None
+        self.running = False
+        self.parked = False
+        self.disabled = None  # raison de la désactivation (workers qui ne démarrent pas)
+        self._reader = None
+
+    # --- Cycle de vie ---
+    def start(self, loop=None):
+        self.loop = loop or asyncio.get_running_loop()
+        self.slot_available = asyncio.Condition()
+        self.running = True
+        for workers in self.workers.values():
+            for worker in workers:
+                self._spawn(worker)
+        self._reader = threading.Thread(target=self._read_results, name="inference-results", daemon=True)
+        self._reader.start()
+        print(f"🧵 Workers d'inférence démarrés: "
+              f"{len(self.workers[KIND_TRANSCRIBE])} transcription, {len(self.workers[KIND_TRANSLATE])} traduction, "
+              f"{self.options['threads']} thread(s) torch chacun")
+
+    def stop(self, timeout=5.0):
+        if not self.running:
+            return
+        self.running = False
+        for workers in self.workers.values():
+            for worker in workers:
+                try:
+                    worker.task_queue.put(None)
+                except Exception:
+                    pass
+        deadline = time.monotonic() + timeout
+        for workers in self.workers.values():
+            for worker in workers:
+                worker.process.join(max(0.0, deadline - time.monotonic()))
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        for job in self.jobs.values():
+            if not job["future"].done():
+                job["future"].cancel()
+        self.jobs.clear()
+        self.audio_buffer.close()
+        print("🧵 Workers d'inférence arrêtés")
+
+    def park(self, parked=True):
+        """Pipeline inactif : les workers restent chargés (bloqués sur leur file), supervision espacée"""
+        self.parked = parked
+
+    def _spawn(self, worker):
+        # Pipe et file de l'ancien processus : fermés pour ne pas fuir de descripteurs à chaque redémarrage
+        if worker.result_conn is not None:
+            worker.result_conn.close()
+        if worker.task_queue is not None:
+            worker.task_queue.close()
+            worker.task_queue.cancel_join_thread()
+        worker.task_queue = self.ctx.Queue()
+        reader, writer = self.ctx.Pipe(duplex=False)
+        worker.result_conn = reader
+        worker.ready = False
+        worker.started_at = time.monotonic()
+        worker.process = self.ctx.Process(
+            target=worker_main,
+            args=(worker.kind, worker.worker_id, worker.task_queue, writer,
+                  self.audio_buffer.name, self.audio_buffer.slots, self.audio_buffer.slot_samples, self.options),
+            name=f"{worker.kind}-worker-{worker.worker_id}",
+            daemon=True
+        )
+        worker.process.start()
+        writer.close()
+
+    async def supervise(self, interval=1.0):
+        """
+        Redémarre les workers morts (backoff exponentiel) et relance leurs jobs en cours.
+        Après MAX_START_FAILURES morts consécutives sans être prêt (modèle impossible à charger...),
+        le pool est désactivé.
+        """
+        while self.running:
+            await asyncio.sleep(PARKED_INTERVAL if self.parked else interval)
+            for workers in self.workers.values():
+                for worker in workers:
+                    if not self.running or worker.process.is_alive():
+                        continue
+                    if worker.restart_at is None:
+                        worker.failures = 1 if worker.ready else worker.failures + 1
+                        worker.ready = False
+                        if worker.failures > MAX_START_FAILURES:
+                            await self._disable(f"worker {worker.kind}#{worker.worker_id} "
+                                                f"arrêté {worker.failures} fois sans démarrer")
+                            return
+                        delay = min(RESTART_BACKOFF * 2 ** (worker.failures - 1), MAX_RESTART_BACKOFF)
+                        worker.restart_at = time.monotonic() + delay
+                        print(f"⚠️ Worker {worker.kind}#{worker.worker_id} arrêté "
+                              f"(code {worker.process.exitcode}), redémarrage dans {delay:.0f} s")
+                    if time.monotonic() < worker.restart_at:
+                        continue
+                    worker.restart_at = None
+                    worker.restarts += 1
+                    print(f"🔄 Redémarrage #{worker.restarts} du worker {worker.kind}#{worker.worker_id}")
+                    orphans = list(worker.in_flight)
+                    worker.in_flight.clear()
+                    self._spawn(worker)
+                    for job_id in orphans:
+                        self._retry(job_id)
+
+    async def _disable(self, reason):
+        self.disabled = reason
+        print(f"❌ Workers d'inférence désactivés: {reason}")
+        for job_id in list(self.jobs):
+            self._finish(job_id, error=RuntimeError(f"Workers d'inférence désactivés ({reason})"))
+        await asyncio.get_running_loop().run_in_executor(None, self.stop)
+
+    def _retry(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if job["retries"] >= MAX_RETRIES:
+            self._finish(job_id, error=RuntimeError(f"Worker {job['kind']} planté pendant le job {job_id}"))
+            return
+        job["retries"] += 1
+        self._dispatch(job_id)
+
+    # --- Soumission ---
+    def _pick_worker(self, kind):
+        return min(self.workers[kind], key=lambda w: (not w.process.is_alive(), len(w.in_flight)))
+
+    def _dispatch(self, job_id):
+        job = self.jobs[job_id]
+        worker = self._pick_worker(job["kind"])
+        job["worker"] = worker
+        worker.in_flight.add(job_id)
+        worker.task_queue.put((job_id, job["payload"]))
+
+    def _submit(self, kind, payload):
+        if self.disabled:
+            raise RuntimeError(f"Workers d'inférence désactivés ({self.disabled})")
+        job_id = next(self._job_ids)
+        future = self.loop.create_future()
+        self.jobs[job_id] = {"kind": kind, "payload": payload, "future": future,
+                             "worker": None, "retries": 0}
+        self._dispatch(job_id)
+        return future
+
+    async def _acquire_slot(self):
+        async with self.slot_available:
+            while True:
+                slot = self.audio_buffer.acquire()
+                if slot is not None:
+                    return slot
+                await self.slot_available.wait()
+
+    async def _release_slot(self, slot):
+        self.audio_buffer.release(slot)
+        async with self.slot_available:
+            self.slot_available.notify()
+
+    async def transcribe(self, audio, language, session_language=None):
+        if self.disabled:
+            raise RuntimeError(f"Workers d'inférence désactivés ({self.disabled})")
+        slot = await self._acquire_slot()
+        try:
+            length = self.audio_buffer.write(slot, audio)
+            return await self._submit(KIND_TRANSCRIBE, (slot, length, language, session_language))
+        finally:
+            await self._release_slot(slot)
+
+    async def translate(self, text, source_language):
+        return await self._submit(KIND_TRANSLATE, (text, source_language))
+
+    # --- Résultats ---
+    def _read_results(self):
+        while self.running:
+            # La liste est relue à chaque tour : un worker redémarré a un nouveau pipe
+            conns = [w.result_conn for workers in self.workers.values() for w in workers if w.result_conn]
+            try:
+                ready = connection.wait(conns, timeout=0.5)
+            except OSError:
+                continue
+            for conn in ready:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    # Worker mort : la supervision le remplacera
+                    self._drop_conn(conn)
+                    continue
+                try:
+                    self.loop.call_soon_threadsafe(self._on_message, message)
+                except RuntimeError:
+                    return
+
+    def _drop_conn(self, conn):
+        for workers in self.workers.values():
+            for worker in workers:
+                if worker.result_conn is conn:
+                    worker.result_conn = None
+        conn.close()
+
+    def _on_message(self, message):
+        status, kind, worker_id, job_id, value = message
+        worker = self.workers[kind][worker_id]
+        if status == "ready":
+            worker.ready = True
+            print(f"✅ Worker {kind}#{worker_id} prêt" + ("" if value else " (modèle indisponible)"))
+            return
+        worker.in_flight.discard(job_id)
+        if status == "error":
+            self._finish(job_id, error=RuntimeError(value))
+        else:
+            self._finish(job_id, result=value)
+
+    def _finish(self, job_id, result=None, error=None):
+        job = self.jobs.pop(job_id, None)
+        if job is None or job["future"].done():
+            return
+        if error is not None:
+            job["future"].set_exception(error)
+        else:
+            job["future"].set_result(result)
+
+    def status(self):
+        status = {
+            kind: [{"id": w.worker_id, "alive": w.process.is_alive() if w.process else False,
+                    "ready": w.ready, "in_flight": len(w.in_flight), "restarts": w.restarts}
+                   for w in workers]
+            for kind, workers in self.workers.items()
+        }
+        status["disabled"] = self.disabled
+        return status
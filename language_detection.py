@@ -0,0 +1,106 @@
+"""
+Détection automatique de la langue parlée ("spoken_language": "auto")
+- La détection Whisper (passe encodeur supplémentaire) n'est faite que quand c'est nécessaire :
+  premier segment de parole de la session, re-vérification périodique, ou sortie peu fiable
+- Entre-temps, la langue mise en cache est passée directement à model.transcribe
+"""
+
+import time
+
+AUTO_LANGUAGE = "auto"
+
+DEFAULT_RECHECK_SECONDS = 60.0
+DEFAULT_MIN_CONFIDENCE = 0.6
+DEFAULT_LOW_LOGPROB = -1.0
+
+
+def is_auto(language):
+    return not language or language == AUTO_LANGUAGE
+
+
+def detect_language(model, audio, candidates=None):
+    """Retourne (langue, probabilité) à partir du mel du segment (un passage encodeur)"""
+    import whisper
+    n_mels = getattr(model.dims, "n_mels", 80)
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=n_mels).to(model.device)
+    _, probs = model.detect_language(mel)
+    if candidates:
+        restricted = {lang: probs.get(lang, 0.0) for lang in candidates}
+        total = sum(restricted.values()) or 1.0
+        probs = {lang: p / total for lang, p in restricted.items()}
+    language = max(probs, key=probs.get)
+    return language, float(probs[language])
+
+
+def choose_transcription_language(detected, probability, session_language=None, min_confidence=0.0):
+    """
+    Langue imposée à Whisper après une détection : si une langue de session est établie et que la
+    détection est peu fiable, on garde la langue de session (sinon la transcription serait dans
+    une langue que SessionLanguageDetector n'adopte pas, et partirait vers le mauvais traducteur).
+    """
+    if session_language and probability < min_confidence:
+        return session_language
+    return detected
+
+
+class SessionLanguageDetector:
+    """Cache de la langue détectée pour la session de traduction en cours"""
+
+    def __init__(self, recheck_seconds=DEFAULT_RECHECK_SECONDS, min_confidence=DEFAULT_MIN_CONFIDENCE,
+                 low_logprob=DEFAULT_LOW_LOGPROB):
+        self.recheck_seconds = recheck_seconds
+        self.min_confidence = min_confidence
+        self.low_logprob = low_logprob
+        self.reset()
+
+    def reset(self):
+        self.language = None
+        self.confidence = 0.0
+        self.decided_at = 0.0
+        self.recheck = True
+        self.detections = 0
+        self.switches = 0
+
+    def language_for_chunk(self, now=None):
+        """Langue à imposer à Whisper, ou None pour déclencher une détection sur ce chunk"""
+        now = time.monotonic() if now is None else now
+        if self.language is None or self.recheck or now - self.decided_at >= self.recheck_seconds:
+            return None
+        return self.language
+
+    def observe(self, result, now=None):
+        """
+        Met à jour le cache à partir d'un résultat de transcription.
+        Retourne la nouvelle langue si elle a changé, sinon None.
+        """
+        now = time.monotonic() if now is None else now
+        changed = None
+        probability = result.get("language_probability")
+        if probability is not None and result.get("language"):
+            self.detections += 1
+            language = result["language"]
+            if language != self.language and (self.language is None or probability >= self.min_confidence):
+                if self.language is not None:
+                    self.switches += 1
+                self.language = language
+                changed = language
+            if language == self.language:
+                self.confidence = probability
+            self.decided_at = now
+            self.recheck = probability < self.min_confidence
+            return changed
+
+        # Chunk transcrit avec la langue en cache : sortie peu fiable -> re-détection au prochain chunk
+        segments = result.get("segments") or []
+        logprobs = [s["avg_logprob"] for s in segments if s.get("avg_logprob") is not None]
+        if logprobs and sum(logprobs) / len(logprobs) < self.low_logprob:
+            self.recheck = True
+        return changed
+
+    def status(self):
+        return {
+            "language": self.language,
+            "confidence": round(self.confidence, 3),
+            "detections": self.detections,
+            "switches": self.switches
+        }
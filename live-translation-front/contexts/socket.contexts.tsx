@@ -1,7 +1,13 @@
 import React from "react";
 import { io } from "socket.io-client";
 
-export const socket = io("http://localhost:8000");
+// Servi par le backend : même origine. En dev (next dev sur :3000) : backend sur :8000
+const SOCKET_URL =
+  typeof window !== "undefined" && window.location.port !== "3000"
+    ? window.location.origin
+    : "http://localhost:8000";
+
+export const socket = io(SOCKET_URL);
 export const SocketContext = React.createContext(socket);
 
 socket.on("connect_error", (err) => {
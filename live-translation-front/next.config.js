@@ -1,5 +1,10 @@
 /** @type {import('next').NextConfig} */
 const nextConfig = {
+  // Export statique servi directement par le backend FastAPI (pas de Node au runtime)
+  output: "export",
+  images: {
+    unoptimized: true,
+  },
   devIndicators: false,
   eslint: {
     ignoreDuringBuilds: true,
@@ -4,6 +4,7 @@ import { SocketContext } from "../../contexts/socket.contexts";
 interface CaptionItem {
   text: string;
   timestamp: number;
+  segmentId?: number;
   isRemoving?: boolean;
 }
 
@@ -13,6 +14,8 @@ export default function CaptionsPage() {
   const [isConnected, setIsConnected] = useState(false);
   const containerRef = useRef<HTMLDivElement>(null);
   const timeoutRefs = useRef<Map<number, NodeJS.Timeout>>(new Map());
+  // Segments déjà affichés : les mises à jour partielles remplacent leur texte
+  const segmentRefs = useRef<Set<number>>(new Set());
 
   // Fonction pour faire défiler vers le bas
   const scrollToBottom = () => {
@@ -22,7 +25,7 @@ export default function CaptionsPage() {
   };
 
   // Fonction pour supprimer un sous-titre après 5 secondes
-  const removeCaption = (timestamp: number) => {
+  const removeCaption = (timestamp: number, segmentId?: number) => {
     // D'abord marquer comme en cours de suppression pour l'animation
     setCaptions((prev) =>
       prev.map((caption) =>
@@ -37,6 +40,10 @@ export default function CaptionsPage() {
       setCaptions((prev) =>
         prev.filter((caption) => caption.timestamp !== timestamp)
       );
+      // Segment expiré : on l'oublie pour que l'ensemble ne grossisse pas toute la session
+      if (segmentId !== undefined) {
+        segmentRefs.current.delete(segmentId);
+      }
     }, 500);
 
     // Nettoyer le timeout
@@ -61,11 +68,28 @@ export default function CaptionsPage() {
       setIsConnected(false);
     });
 
-    socket.on("translation", (data: { text: string }) => {
+    const showCaption = (data: { text: string; segment_id?: number }) => {
+      if (
+        data.segment_id !== undefined &&
+        segmentRefs.current.has(data.segment_id)
+      ) {
+        setCaptions((prev) =>
+          prev.map((caption) =>
+            caption.segmentId === data.segment_id
+              ? { ...caption, text: data.text }
+              : caption
+          )
+        );
+        return;
+      }
+      if (data.segment_id !== undefined) {
+        segmentRefs.current.add(data.segment_id);
+      }
       const timestamp = Date.now();
       const newCaption: CaptionItem = {
         text: data.text,
         timestamp: timestamp,
+        segmentId: data.segment_id,
       };
 
       setCaptions((prev) => {
@@ -76,14 +100,34 @@ export default function CaptionsPage() {
 
       // Programmer la suppression après 10 secondes
       const timeout = setTimeout(() => {
-        removeCaption(timestamp);
+        removeCaption(timestamp, data.segment_id);
       }, 10000);
 
       timeoutRefs.current.set(timestamp, timeout);
-    });
+    };
+
+    // Traduction diffusée mot par mot, puis texte final du même segment
+    socket.on("translation_partial", showCaption);
+    socket.on("translation", showCaption);
+
+    // Correction du modèle principal : remplace le texte provisoire du même segment
+    socket.on(
+      "translation_correction",
+      (data: { text: string; segment_id: number }) => {
+        setCaptions((prev) =>
+          prev.map((caption) =>
+            caption.segmentId === data.segment_id
+              ? { ...caption, text: data.text }
+              : caption
+          )
+        );
+      }
+    );
 
     return () => {
       socket.off("translation");
+      socket.off("translation_partial");
+      socket.off("translation_correction");
       socket.off("connect");
       socket.off("disconnect");
 
@@ -92,6 +136,7 @@ export default function CaptionsPage() {
         clearTimeout(timeout);
       });
       timeoutRefs.current.clear();
+      segmentRefs.current.clear();
     };
   }, [socket]);
 
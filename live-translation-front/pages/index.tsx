@@ -79,6 +79,10 @@ export default function IndexPage() {
     });
   }, [selectedSpokenLanguage]);
   const spokenLanguages = [
+    {
+      key: "auto",
+      label: "🌐 Détection automatique",
+    },
     {
       key: "fr",
       label: "🇫🇷 Français",
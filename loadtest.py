@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Test de charge Socket.IO (100% local)
+- Serveur synthétique : même AsyncServer / CaptionBroadcaster que main.py, un générateur de
+  sous-titres remplace Whisper et MarianMT
+- N clients simulés : panneaux de contrôle (ping, update_config) et afficheurs de sous-titres
+  (legacy, v2 JSON, v2 MessagePack)
+- Mesures par palier de N : latence émission -> réception (percentiles), messages perdus,
+  CPU et mémoire du serveur
+
+Usage :
+    python loadtest.py --clients 10,50,100,200 --duration 20
+    python loadtest.py serve --port 8100        # serveur synthétique seul
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+
+from caption_protocol import (CaptionBroadcaster, ENCODING_JSON, ENCODING_MSGPACK, MSGPACK_AVAILABLE,
+                              PROTOCOL_VERSION, apply_delta, decode_message)
+
+DEFAULT_PORT = 8100
+DEFAULT_DURATION = 20
+DEFAULT_RATE = 1.0          # segments finalisés par seconde
+DEFAULT_PARTIALS = 3        # mises à jour partielles avant le texte final
+DEFAULT_CONTROL_RATIO = 0.05
+DEFAULT_MIX = "legacy:1,json:1,msgpack:1"
+CONNECT_CONCURRENCY = 20
+
+SAMPLE_SENTENCES = [
+    "Bonjour à tous et bienvenue à cette conférence sur la traduction en direct.",
+    "Nous allons parler de reconnaissance vocale et de sous-titrage automatique.",
+    "Les questions seront prises à la fin de la présentation.",
+    "Merci de couper le son de vos téléphones pendant la séance.",
+    "La prochaine session commence dans quinze minutes dans la salle B.",
+]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+# ----------------------
+# Serveur synthétique
+# ----------------------
+def create_synthetic_app(rate=DEFAULT_RATE, partials=DEFAULT_PARTIALS, logs_per_segment=3):
+    """AsyncServer configuré comme main.py ; les sous-titres viennent d'un générateur"""
+    import socketio
+    from fastapi import FastAPI
+
+    sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+    app = FastAPI()
+    app_sio = socketio.ASGIApp(sio, app)
+    captions = CaptionBroadcaster(sio)
+    config = {"volume_threshold": 0.01, "chunk_duration": 2, "spoken_language": "fr", "target_language": "en"}
+    counters = {"published": 0, "connected": 0}
+    # Même écriture disque que save_config() de main.py, sans toucher au config.json réel
+    config_file = os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "config.json")
+
+    # Handlers recopiés de main.py (logs compris) : chaque log est diffusé à tous les clients,
+    # c'est ce fan-out contrôle x afficheurs que le test doit mesurer
+    async def send_log(message):
+        print(message, flush=True)
+        await sio.emit('logs', {'message': message})
+
+    def save_config(config):
+        try:
+            with open(config_file, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=2, ensure_ascii=False)
+            print(f"💾 Configuration sauvegardée dans {config_file}")
+        except Exception as e:
+            print(f"❌ Erreur lors de la sauvegarde: {e}")
+
+    @sio.event
+    async def connect(sid, environ, auth=None):
+        counters["connected"] += 1
+        print(f"✅ Client connecté: {sid}")
+        await send_log(f"✅ Nouveau client connecté: {sid}")
+        await sio.emit('config', config, room=sid)
+        encoding = await captions.register(sid, environ, auth)
+        if encoding:
+            await send_log(f"📦 Protocole sous-titres v2 négocié ({encoding}) pour {sid}")
+
+    @sio.event
+    async def disconnect(sid):
+        counters["connected"] -= 1
+        print(f"❌ Client déconnecté: {sid}")
+        captions.unregister(sid)
+        await send_log(f"❌ Client déconnecté: {sid}")
+
+    @sio.event
+    async def ping(sid, data):
+        timestamp = data.get('timestamp', 0)
+        await sio.emit('pong', {'timestamp': timestamp}, room=sid)
+        await send_log(f"🏓 Ping reçu de {sid}, pong envoyé")
+
+    @sio.event
+    async def update_config(sid, data):
+        updated = False
+        for key in ['volume_threshold','chunk_duration','sample_rate','model_name','use_gpu','spoken_language','target_language']:
+            if key in data:
+                config[key] = data[key]
+                updated = True
+                await send_log(f"🔊 {key} mis à jour: {data[key]}")
+        if updated:
+            save_config(config)
+            await send_log("💾 Configuration sauvegardée")
+
+    @sio.event
+    async def caption_resync(sid, data=None):
+        await captions.send_snapshot(sid)
+
+    async def generate():
+        interval = 1.0 / rate / (partials + 1)
+        for sentence in itertools.cycle(SAMPLE_SENTENCES):
+            words = sentence.split()
+            seg_id = captions.new_segment()
+            for step in range(1, partials + 1):
+                partial = " ".join(words[:max(1, len(words) * step // (partials + 1))])
+                await captions.publish(seg_id, partial, ts=time.time())
+                counters["published"] += 1
+                await asyncio.sleep(interval)
+            for i in range(logs_per_segment):
+                await send_log(f"⏳ Chunk synthétique #{seg_id} ({i + 1}/{logs_per_segment})")
+            await captions.publish(seg_id, sentence, final=True, ts=time.time())
+            counters["published"] += 1
+            await asyncio.sleep(interval)
+
+    @app.on_event("startup")
+    async def start_generator():
+        asyncio.create_task(generate())
+
+    @app.get("/loadtest/stats")
+    async def stats():
+        return {"pid": os.getpid(), **counters}
+
+    return app_sio
+
+
+def serve(host, port, rate, partials):
+    import uvicorn
+    print(f"🧪 Serveur synthétique sur http://{host}:{port} ({rate} segment/s, {partials} partiels)")
+    uvicorn.run(create_synthetic_app(rate, partials), host=host, port=port, log_level="warning",
+                access_log=False, loop="asyncio")
+
+
+# ----------------------
+# Clients simulés
+# ----------------------
+class ViewerClient:
+    """Page /captions : encoding None = client legacy (événement 'translation')"""
+
+    def __init__(self, url, encoding=None):
+        import socketio
+        self.url = url
+        self.encoding = encoding
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.latencies = []
+        self.received = 0
+        self.dropped = 0
+        self.last_seq = None
+        self.last_segment = None
+        self.texts = {}
+        self.sio.on('caption', self.on_caption)
+        self.sio.on('translation', self.on_translation)
+        self.sio.on('translation_partial', self._record)
+
+    async def connect(self):
+        auth = None
+        if self.encoding:
+            auth = {"caption_protocol": PROTOCOL_VERSION, "encoding": self.encoding}
+        await self.sio.connect(self.url, auth=auth, transports=["websocket"])
+
+    async def on_caption(self, payload):
+        message = decode_message(payload)
+        seq = message["seq"]
+        # Les messages d'un snapshot partagent le même seq : seul un saut compte comme perte
+        if self.last_seq is not None and seq > self.last_seq + 1:
+            self.dropped += seq - self.last_seq - 1
+        self.last_seq = seq if self.last_seq is None else max(self.last_seq, seq)
+        self.texts[message["seg"]] = apply_delta(self.texts.get(message["seg"], ""), message)
+        await self._record(message)
+
+    async def on_translation(self, data):
+        segment = data.get("segment_id")
+        if segment is not None:
+            if self.last_segment is not None and segment > self.last_segment + 1:
+                self.dropped += segment - self.last_segment - 1
+            self.last_segment = segment
+        await self._record(data)
+
+    async def _record(self, message):
+        self.received += 1
+        sent_at = message.get("ts")
+        if sent_at is not None:
+            self.latencies.append(time.time() - sent_at)
+
+    def reset(self):
+        self.latencies = []
+        self.received = 0
+        self.dropped = 0
+
+    async def run(self, stop):
+        await stop.wait()
+
+
+class ControlClient:
+    """Panneau de contrôle : ping périodique et changements de config"""
+
+    def __init__(self, url, ping_interval=2.0, config_interval=10.0):
+        import socketio
+        self.url = url
+        self.ping_interval = ping_interval
+        self.config_interval = config_interval
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.rtts = []
+        self.logs = 0
+        self.sio.on('pong', self.on_pong)
+        self.sio.on('logs', self.on_log)
+
+    async def connect(self):
+        await self.sio.connect(self.url, transports=["websocket"])
+
+    async def on_pong(self, data):
+        self.rtts.append(time.time() - data.get('timestamp', 0) / 1000)
+
+    async def on_log(self, data):
+        self.logs += 1
+
+    def reset(self):
+        self.rtts = []
+        self.logs = 0
+
+    async def run(self, stop):
+        last_config = time.monotonic() + random.uniform(0, self.config_interval)
+        while not stop.is_set():
+            # Même format que le front : timestamp en millisecondes
+            await self.sio.emit('ping', {'timestamp': time.time() * 1000})
+            if time.monotonic() - last_config >= self.config_interval:
+                await self.sio.emit('update_config', {'volume_threshold': round(random.uniform(0.005, 0.02), 4)})
+                last_config = time.monotonic()
+            try:
+                await asyncio.wait_for(stop.wait(), self.ping_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+# ----------------------
+# Mesure du serveur
+# ----------------------
+class ServerSampler:
+    """CPU (%) et RSS du processus serveur, échantillonnés dans un thread"""
+
+    def __init__(self, pid, interval=0.5):
+        self.process = psutil.Process(pid) if pid else None
+        self.interval = interval
+        self.cpu = []
+        self.rss = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.process is None:
+            return
+        self.cpu, self.rss = [], []
+        self._stop.clear()
+        self.process.cpu_percent(None)
+        self._thread = threading.Thread(target=self._run, name="loadtest-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.cpu.append(self.process.cpu_percent(None))
+                self.rss.append(self.process.memory_info().rss / 1024 ** 2)
+            except psutil.Error:
+                break
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if not self.cpu:
+            return {}
+        return {
+            "cpu_avg": round(sum(self.cpu) / len(self.cpu), 1),
+            "cpu_max": round(max(self.cpu), 1),
+            "rss_mb": round(self.rss[-1], 1),
+            "rss_max_mb": round(max(self.rss), 1)
+        }
+
+
+# ----------------------
+# Paliers de charge
+# ----------------------
+def parse_mix(mix):
+    """'legacy:1,json:1,msgpack:1' -> liste pondérée d'encodages (None = legacy)"""
+    weighted = []
+    for item in mix.split(","):
+        name, _, weight = item.partition(":")
+        name = name.strip()
+        encoding = None if name == "legacy" else name
+        if encoding == ENCODING_MSGPACK and not MSGPACK_AVAILABLE:
+            print("⚠️ msgpack non installé : clients MessagePack remplacés par JSON")
+            encoding = ENCODING_JSON
+        weighted += [encoding] * int(weight or 1)
+    return weighted
+
+
+async def connect_all(clients):
+    semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+    async def connect(client):
+        async with semaphore:
+            try:
+                await client.connect()
+                return True
+            except Exception as e:
+                print(f"⚠️ Connexion refusée: {e}")
+                return False
+
+    results = await asyncio.gather(*(connect(c) for c in clients))
+    return [c for c, ok in zip(clients, results) if ok]
+
+
+async def run_step(url, count, duration, control_ratio, encodings, sampler, warmup=2.0):
+    controls = max(1, round(count * control_ratio)) if control_ratio else 0
+    clients = [ControlClient(url) for _ in range(controls)]
+    clients += [ViewerClient(url, encodings[i % len(encodings)]) for i in range(count - controls)]
+
+    started = time.monotonic()
+    connected = await connect_all(clients)
+    connect_time = time.monotonic() - started
+
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(c.run(stop)) for c in connected]
+    await asyncio.sleep(warmup)
+    for client in connected:
+        client.reset()
+    sampler.start()
+    await asyncio.sleep(duration)
+    server = sampler.stop()
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    viewers = [c for c in connected if isinstance(c, ViewerClient)]
+    panels = [c for c in connected if isinstance(c, ControlClient)]
+    latencies = [l for v in viewers for l in v.latencies]
+    rtts = [r for p in panels for r in p.rtts]
+    result = {
+        "clients": count,
+        "connected": len(connected),
+        "connect_s": round(connect_time, 2),
+        "received": sum(v.received for v in viewers),
+        "dropped": sum(v.dropped for v in viewers),
+        "latency_ms": {name: round(percentile(latencies, q) * 1000, 1) if latencies else None
+                       for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "latency_max_ms": round(max(latencies) * 1000, 1) if latencies else None,
+        "ping_p95_ms": round(percentile(rtts, 0.95) * 1000, 1) if rtts else None,
+        "server": server
+    }
+    await asyncio.gather(*(c.sio.disconnect() for c in connected), return_exceptions=True)
+    await asyncio.sleep(1.0)
+    return result
+
+
+def print_result(result):
+    latency = result["latency_ms"]
+    server = result["server"] or {}
+    print(f"👥 {result['connected']:>5}/{result['clients']:<5} "
+          f"latence p50 {latency['p50']} ms | p95 {latency['p95']} ms | p99 {latency['p99']} ms | "
+          f"perdus {result['dropped']}/{result['received'] + result['dropped']} | "
+          f"ping p95 {result['ping_p95_ms']} ms | "
+          f"CPU {server.get('cpu_avg', '?')}% (max {server.get('cpu_max', '?')}%) | "
+          f"RSS {server.get('rss_mb', '?')} MB", flush=True)
+
+
+async def wait_for_server(url, timeout=30.0):
+    import urllib.request
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/loadtest/stats", timeout=1) as response:
+                return json.load(response)
+        except Exception:
+            await asyncio.sleep(0.3)
+    raise RuntimeError(f"Serveur synthétique injoignable sur {url}")
+
+
+async def run_load_test(args):
+    encodings = parse_mix(args.mix)
+    steps = [int(n) for n in args.clients.split(",")]
+    server_process = None
+    url = args.url
+    pid = args.server_pid
+    if url is None:
+        url = f"http://127.0.0.1:{args.port}"
+        cmd = [sys.executable, os.path.abspath(__file__), "serve", "--port", str(args.port),
+               "--rate", str(args.rate), "--partials", str(args.partials)]
+        # Les logs du serveur sont écrits comme dans main.py, mais pas dans ce terminal
+        server_process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+        pid = server_process.pid
+        await wait_for_server(url)
+    elif pid is None:
+        try:
+            pid = (await wait_for_server(url, timeout=5)).get("pid")
+        except RuntimeError:
+            print("⚠️ Serveur non synthétique : CPU/mémoire non mesurés (--server-pid pour les activer)")
+
+    sampler = ServerSampler(pid)
+    results = []
+    try:
+        for count in steps:
+            print(f"🧪 Palier {count} clients ({args.duration}s)...", flush=True)
+            result = await run_step(url, count, args.duration, args.control_ratio, encodings, sampler)
+            print_result(result)
+            results.append(result)
+    finally:
+        if server_process:
+            server_process.terminate()
+            server_process.wait()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "rate": args.rate, "partials": args.partials, "mix": args.mix,
+                       "steps": results}, f, indent=2)
+        print(f"💾 Résultats écrits dans {args.json}")
+    return results
+
+
+# ----------------------
+# CLI
+# ----------------------
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        parser = argparse.ArgumentParser(description="Serveur Socket.IO synthétique (sans modèles)")
+        parser.add_argument("serve")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+        parser.add_argument("--rate", type=float, default=DEFAULT_RATE)
+        parser.add_argument("--partials", type=int, default=DEFAULT_PARTIALS)
+        args = parser.parse_args()
+        serve(args.host, args.port, args.rate, args.partials)
+        return True
+
+    parser = argparse.ArgumentParser(description="Test de charge Socket.IO (clients de sous-titres simulés)")
+    parser.add_argument("--clients", default="10,50,100", help="paliers de clients, ex. 10,50,100,200")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="secondes mesurées par palier")
+    parser.add_argument("--control-ratio", type=float, default=DEFAULT_CONTROL_RATIO,
+                        help="part de panneaux de contrôle (ping + update_config)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="répartition des afficheurs (legacy, json, msgpack)")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="segments finalisés par seconde")
+    parser.add_argument("--partials", type=int, default=DEFAULT_PARTIALS, help="mises à jour partielles par segment")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port du serveur synthétique lancé")
+    parser.add_argument("--url", default=None, help="serveur existant (sinon un serveur synthétique est lancé)")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID du serveur existant à mesurer")
+    parser.add_argument("--json", default=None, help="fichier de résultats JSON")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_load_test(args))
+    except KeyboardInterrupt:
+        print("\n🛑 Test de charge interrompu")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
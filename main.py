@@ -1,29 +1,38 @@
 # full script with M2M100 integration
-import whisper
 import sounddevice as sd
 import numpy as np
-import queue
 import sys
 import asyncio
 import socketio
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 import uvicorn
 import json
 import os
-import subprocess
-import time
 import webbrowser
-import platform
 import signal
-import psutil
 from pathlib import Path
+from caption_protocol import CaptionBroadcaster
+from text_segmentation import SentenceSegmenter, TranslationCache, translate_sentences_async, stream_sentences_async
+from inference import detect_gpu_device, describe_device, load_whisper_model, transcribe_audio, TranslatorRouter
+from language_detection import SessionLanguageDetector, is_auto
+from transcript_filter import TranscriptFilter
+from speculative import SpeculativeVerifier
+from translation_engines import TranslationSettings, translator_precision
+from inference_workers import InferenceWorkerPool
+from remote_inference import RemoteInferencePool, RemoteInferenceUnavailable
+from static_front import StaticFrontend, mount_frontend
+from profiling import LoopLagMonitor, ProfileSession, ChunkTracer
+from memory_policy import IdleUnloader, memory_report, release_memory
+from pipeline_state import CapturePipeline
+from audio_conditioning import AudioConditioner
 
 # ----------------------
 # CONFIG
 # ----------------------
 CONFIG_FILE = "config.json"
-FRONT_URL = "http://localhost:3000"
-FRONT_DIR = "live-translation-front"
+SERVER_PORT = 8000
+FRONT_URL = f"http://localhost:{SERVER_PORT}"
 
 DEFAULT_CONFIG = {
     "model_name": "small",
@@ -34,19 +43,48 @@ DEFAULT_CONFIG = {
     "use_gpu": False,
     "force_mps": False,
     "spoken_language": "en",
-    "target_language": "fr"
+    "target_language": "fr",
+    "sentence_segmentation": True,
+    "sentence_max_wait": 6.0,
+    "sentence_pause": 3.0,
+    "sentence_max_chars": 220,
+    "inference_processes": False,
+    "transcribe_workers": 1,
+    "translate_workers": 1,
+    "worker_threads": 0,
+    "inference_nodes": [],
+    "remote_fallback_local": True,
+    "loop_lag_threshold_ms": 100,
+    "mmap_weights": False,
+    "cpu_weights_precision": "fp32",
+    "translation_precision": "auto",
+    "idle_unload_minutes": 0,
+    "language_candidates": [],
+    "language_recheck_seconds": 60,
+    "language_min_confidence": 0.6,
+    "language_low_logprob": -1.0,
+    "transcript_filter": True,
+    "filter_no_speech_prob": 0.6,
+    "filter_logprob": -1.0,
+    "filter_compression_ratio": 2.4,
+    "filter_phrases": [],
+    "draft_model_name": "",
+    "draft_agreement": 0.9,
+    "draft_skip_logprob": -0.2,
+    "translator_backend": "auto",
+    "translator_beam_size": 1,
+    "translator_length_ratio": 1.5,
+    "translator_length_margin": 10,
+    "translation_streaming": True,
+    "pipeline_armed_minutes": 10,
+    "audio_conditioning": False,
+    "highpass_hz": 100,
+    "noise_reduction": 1.0,
+    "noise_gain_floor": 0.1,
+    "agc_target_rms": 0.1,
+    "agc_max_gain": 10.0
 }
 
-def kill_process_tree(proc):
-    try:
-        parent = psutil.Process(proc.pid)
-        children = parent.children(recursive=True)
-        for child in children:
-            child.kill()
-        parent.kill()
-    except Exception as e:
-        print(f"❌ Erreur en tuant le process: {e}")
-
 def load_config():
     config = DEFAULT_CONFIG.copy()
     if os.path.exists(CONFIG_FILE):
@@ -80,87 +118,174 @@ USE_GPU = config.get("use_gpu")
 FORCE_MPS = config.get("force_mps")
 SPOKEN_LANGUAGE = config.get("spoken_language")
 TARGET_LANGUAGE = config.get("target_language")
+SENTENCE_SEGMENTATION = config.get("sentence_segmentation")
+INFERENCE_PROCESSES = config.get("inference_processes")
+INFERENCE_NODES = config.get("inference_nodes") or []
+REMOTE_FALLBACK_LOCAL = config.get("remote_fallback_local")
+MMAP_WEIGHTS = config.get("mmap_weights")
+CPU_WEIGHTS_PRECISION = config.get("cpu_weights_precision")
+TRANSLATOR_PRECISION = translator_precision(config)
+IDLE_UNLOAD_MINUTES = config.get("idle_unload_minutes")
+LANGUAGE_CANDIDATES = config.get("language_candidates") or None
+LANGUAGE_MIN_CONFIDENCE = config.get("language_min_confidence")
+TRANSCRIPT_FILTER = config.get("transcript_filter")
+# Transcription spéculative : petit modèle local pour l'affichage immédiat, model_name pour les corrections
+DRAFT_MODEL_NAME = config.get("draft_model_name") or None
+TRANSLATOR_BACKEND = config.get("translator_backend")
+TRANSLATION_SETTINGS = TranslationSettings.from_config(config)
+TRANSLATION_STREAMING = config.get("translation_streaming")
 
 # État
-TRANSCRIPTION_ACTIVE = False
-AUDIO_LOOP_RUNNING = False
 audio_task = None
-audio_queue = queue.Queue()
-
-# ----------------------
-# Détection GPU
-# ----------------------
-def detect_gpu_device():
-    try:
-        import torch
-        if torch.cuda.is_available():
-            return "cuda"
-        elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
-            if FORCE_MPS:
-                print("⚠️ MPS forcé (peut causer des erreurs avec Whisper)")
-                return "mps"
-            else:
-                print("⚠️ MPS détecté mais désactivé pour Whisper (problèmes de compatibilité)")
-                return "cpu"
-        else:
-            return "cpu"
-    except ImportError:
-        return "cpu"
+# Créés au démarrage du serveur, dans son event loop (Python < 3.10 les lie à la boucle courante)
+audio_queue = None
+# Un seul chunk traité à la fois ; l'arrêt (draining) attend la fin du chunk en cours
+chunk_lock = None
+segmenter = SentenceSegmenter(
+    max_wait=config.get("sentence_max_wait"),
+    # La pause doit couvrir l'intervalle normal entre deux chunks
+    pause=max(config.get("sentence_pause"), CHUNK_DURATION * 1.5),
+    max_chars=config.get("sentence_max_chars")
+)
+translation_cache = TranslationCache()
+# Filtre des hallucinations / répétitions avant traduction
+transcript_filter = TranscriptFilter(
+    no_speech_prob=config.get("filter_no_speech_prob"),
+    logprob=config.get("filter_logprob"),
+    compression_ratio=config.get("filter_compression_ratio"),
+    extra_phrases=config.get("filter_phrases")
+)
+# Passe-haut, réduction de bruit et AGC entre la capture et l'inférence
+audio_conditioner = AudioConditioner.from_config(config, SAMPLE_RATE) if config.get("audio_conditioning") else None
+# Langue parlée "auto" : détection mise en cache pour la session, re-vérifiée périodiquement
+language_detector = SessionLanguageDetector(
+    recheck_seconds=config.get("language_recheck_seconds"),
+    min_confidence=config.get("language_min_confidence"),
+    low_logprob=config.get("language_low_logprob")
+)
 
 # ----------------------
 # INIT Whisper
 # ----------------------
-print(f"Loading Whisper model '{MODEL_NAME}'...")
-gpu_device = detect_gpu_device()
-print(f"🔍 GPU détecté: {gpu_device.upper()}")
+gpu_device = detect_gpu_device(FORCE_MPS)
+describe_device(gpu_device)
+whisper_device = gpu_device if USE_GPU else "cpu"
+translator_device = "cuda" if gpu_device == "cuda" else "cpu"
 
-if gpu_device == "cuda":
-    try:
-        import torch
-        print(f"   - Nom: {torch.cuda.get_device_name(0)}")
-        print(f"   - Mémoire: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.1f} GB")
-    except Exception:
-        pass
-elif gpu_device == "mps":
-    print("   - Metal Performance Shaders (Mac)")
+model = None
+draft_model = None
 
-if USE_GPU and gpu_device != "cpu":
-    try:
-        model = whisper.load_model(MODEL_NAME, device=gpu_device)
-        print(f"✅ Whisper loaded on {gpu_device}")
-    except Exception as e:
-        print(f"⚠️ Impossible de charger Whisper sur {gpu_device}: {e}\nFallback to CPU")
-        model = whisper.load_model(MODEL_NAME, device="cpu")
-else:
-    model = whisper.load_model(MODEL_NAME, device="cpu")
-    print("💻 Whisper loaded on CPU")
+def create_translator_router():
+    return TranslatorRouter(TARGET_LANGUAGE, translator_device, MMAP_WEIGHTS, TRANSLATOR_PRECISION,
+                            TRANSLATOR_BACKEND, TRANSLATION_SETTINGS)
 
-# ----------------------
-# MarianMT translator
-# ----------------------
-translator_enabled = False
-translator_device = "cuda" if gpu_device == "cuda" else "cpu"
-translator_model_name = f"Helsinki-NLP/opus-mt-{SPOKEN_LANGUAGE}-{TARGET_LANGUAGE}"
+translators = create_translator_router()
+worker_pool = None
+remote_pool = RemoteInferencePool(INFERENCE_NODES) if INFERENCE_NODES else None
 
-try:
-    from transformers import MarianMTModel, MarianTokenizer
-    translator_tokenizer = MarianTokenizer.from_pretrained(translator_model_name)
-    translator_model = MarianMTModel.from_pretrained(translator_model_name).to(translator_device)
+if INFERENCE_NODES and not REMOTE_FALLBACK_LOCAL:
+    # Inférence 100% distante : aucun modèle chargé sur la machine de capture
     translator_enabled = True
-    print(f"✅ Translator loaded: {translator_model_name} on {translator_device}")
-except Exception as e:
-    print(f"⚠️ Translator not available: {e}")
+elif INFERENCE_PROCESSES:
+    # Les modèles sont chargés dans les workers (créés au démarrage du serveur),
+    # pas dans le processus Socket.IO
+    translator_enabled = True
+else:
     translator_enabled = False
 
-def translate_sync(text: str) -> str:
+# Modèles chargés sur cette machine : dans ce processus ou dans les workers
+LOCAL_MODELS = not INFERENCE_PROCESSES and (not INFERENCE_NODES or REMOTE_FALLBACK_LOCAL)
+WORKER_MODELS = INFERENCE_PROCESSES and (not INFERENCE_NODES or REMOTE_FALLBACK_LOCAL)
+
+def load_local_models():
+    global model, translator_enabled
+    print(f"Loading Whisper model '{MODEL_NAME}'...")
+    model = load_whisper_model(MODEL_NAME, whisper_device, MMAP_WEIGHTS, CPU_WEIGHTS_PRECISION)
+
+    # ----------------------
+    # MarianMT translator (langue auto : chargé à la première détection)
+    # ----------------------
+    if is_auto(SPOKEN_LANGUAGE):
+        translator_enabled = True
+    else:
+        translator_enabled = translators.get(SPOKEN_LANGUAGE) is not None
+    print(f"🧠 Mémoire: {memory_report(include_children=False)['rss_mb']} MB RSS")
+
+def load_draft_model():
+    global draft_model
+    print(f"Loading draft Whisper model '{DRAFT_MODEL_NAME}'...")
+    draft_model = load_whisper_model(DRAFT_MODEL_NAME, whisper_device, MMAP_WEIGHTS, CPU_WEIGHTS_PRECISION)
+
+if LOCAL_MODELS:
+    load_local_models()
+
+def translate_sync(text: str, source_language: str):
+    """Traduction locale, ou None sans traducteur (la transcription brute est alors affichée)"""
     if not translator_enabled:
-        return "[TRANSLATOR NOT AVAILABLE]"
-    try:
-        inputs = translator_tokenizer(text, return_tensors="pt", truncation=True, max_length=512).to(translator_device)
-        translated_tokens = translator_model.generate(**inputs, max_length=512)
-        return translator_tokenizer.decode(translated_tokens[0], skip_special_tokens=True)
-    except Exception as e:
-        return f"[TRANSLATION ERROR: {e}]"
+        return None
+    return translators.translate(text, source_language)
+
+async def run_transcription(audio_data, language, session_language=None):
+    """session_language : langue gardée si la détection (language=None) est sous language_min_confidence"""
+    if remote_pool:
+        try:
+            return await remote_pool.transcribe(audio_data, language, LANGUAGE_CANDIDATES,
+                                                session_language, LANGUAGE_MIN_CONFIDENCE)
+        except RemoteInferenceUnavailable as e:
+            if not REMOTE_FALLBACK_LOCAL:
+                raise
+            print(f"⚠️ Inférence distante indisponible ({e}), fallback local")
+    if worker_pool:
+        return await worker_pool.transcribe(audio_data, language, session_language)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, transcribe_audio, model, audio_data, language, LANGUAGE_CANDIDATES,
+                                      session_language, LANGUAGE_MIN_CONFIDENCE)
+
+async def run_draft_transcription(audio_data, language, session_language=None):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, transcribe_audio, draft_model, audio_data, language, LANGUAGE_CANDIDATES,
+                                      session_language, LANGUAGE_MIN_CONFIDENCE)
+
+async def run_translation(text, source_language):
+    if remote_pool:
+        try:
+            return await remote_pool.translate(text, source_language)
+        except RemoteInferenceUnavailable as e:
+            if not REMOTE_FALLBACK_LOCAL:
+                raise
+            print(f"⚠️ Traduction distante indisponible ({e}), fallback local")
+    if worker_pool:
+        return await worker_pool.translate(text, source_language)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, translate_sync, text, source_language)
+
+async def stream_translation(text, source_language):
+    """
+    Traduction cumulée au fil des mots (traducteur local, génération sur un thread).
+    Workers et nœuds distants : une seule mise à jour, la traduction complète.
+    """
+    if not TRANSLATION_STREAMING or remote_pool or worker_pool:
+        yield await run_translation(text, source_language)
+        return
+    loop = asyncio.get_running_loop()
+    updates = asyncio.Queue()
+
+    def produce():
+        try:
+            for partial in translators.stream(text, source_language):
+                loop.call_soon_threadsafe(updates.put_nowait, partial)
+        finally:
+            loop.call_soon_threadsafe(updates.put_nowait, None)
+
+    producer = loop.run_in_executor(None, produce)
+    while (partial := await updates.get()) is not None:
+        yield partial
+    await producer
+
+def current_source_language():
+    if is_auto(SPOKEN_LANGUAGE):
+        return language_detector.language
+    return SPOKEN_LANGUAGE
 
 # ----------------------
 # SOCKET.IO
@@ -168,11 +293,24 @@ def translate_sync(text: str) -> str:
 sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
 app = FastAPI()
 app_sio = socketio.ASGIApp(sio, app)
+captions = CaptionBroadcaster(sio)
 
 # ----------------------
-# Event loop global pour callback
+# Diagnostic (lag de la boucle, profils, traces par chunk)
 # ----------------------
-MAIN_LOOP = asyncio.get_event_loop()
+def on_loop_stall(stall):
+    message = f"🐢 Event loop bloquée {stall['duration_ms']:.0f} ms par {stall['culprit']}"
+    print(message, flush=True)
+    asyncio.create_task(sio.emit('logs', {'message': message}))
+
+lag_monitor = LoopLagMonitor(threshold=config.get("loop_lag_threshold_ms") / 1000, on_stall=on_loop_stall)
+profile_session = ProfileSession()
+chunk_tracer = ChunkTracer()
+
+# ----------------------
+# Event loop global pour callback (fixé au démarrage du serveur)
+# ----------------------
+MAIN_LOOP = None
 
 # ----------------------
 # Fonctions utilitaires
@@ -181,7 +319,28 @@ def callback(indata, frames, time, status):
     if status:
         # ✅ Planifier la coroutine dans l'event loop principal
         asyncio.run_coroutine_threadsafe(send_log(f"⚠️ Audio status: {status}"), MAIN_LOOP)
-    audio_queue.put(indata.copy())
+    MAIN_LOOP.call_soon_threadsafe(audio_queue.put_nowait, indata.copy())
+
+def open_input_stream(device):
+    # Flux ouvert mais non démarré : le pipeline le met en pause / reprise
+    return sd.InputStream(samplerate=SAMPLE_RATE, channels=1, callback=callback, device=device)
+
+def park_inference(parked):
+    # Hors capture, workers et nœuds restent chargés mais leur supervision est espacée
+    for pool in (worker_pool, remote_pool):
+        if pool:
+            pool.park(parked)
+
+def on_pipeline_change(previous, state):
+    print(f"🎛️ Pipeline: {previous} → {state}", flush=True)
+    park_inference(state != "active")
+
+# stopped / armed (micro ouvert en pause, reprise rapide) / active / draining
+pipeline = CapturePipeline(
+    open_input_stream,
+    armed_seconds=(config.get("pipeline_armed_minutes") or 0) * 60,
+    on_change=on_pipeline_change
+)
 
 def validate_microphone_id(mic_id):
     try:
@@ -190,8 +349,8 @@ def validate_microphone_id(mic_id):
     except Exception:
         return False
 
-def has_speech(audio):
-    rms = np.sqrt(np.mean(np.square(audio)))
+def has_speech(audio, level=None):
+    rms = np.sqrt(np.mean(np.square(audio))) if level is None else level
     return rms > VOLUME_THRESHOLD
 
 async def send_log(message: str):
@@ -209,62 +368,109 @@ def get_available_microphones():
         print(f"Erreur lors de la récupération des microphones: {e}")
         return []
 
+def translation_unavailable(source_language):
+    """Pas de traducteur, ou paire absente pour la langue détectée (échec de chargement récent)"""
+    if not (translator_enabled and source_language):
+        return True
+    return not (worker_pool or remote_pool) and translators.unavailable(source_language)
+
+async def translate_caption(text, source_language):
+    """Texte à afficher : la traduction, ou la transcription brute sans traducteur"""
+    if translation_unavailable(source_language):
+        await send_log("⚠️ Traduction locale non disponible — envoi de la transcription brute")
+        return text
+    await send_log("🔁 Traduction via MarianMT en cours...")
+    translate = lambda sentence: run_translation(sentence, source_language)
+    try:
+        translated_text = await translate_sentences_async(text, translate, translation_cache, source_language)
+    except Exception as e:
+        translated_text = f"[TRANSLATION ERROR: {e}]"
+    await send_log(f"💬 Original ({source_language}): {text}")
+    await send_log(f"💬 Traduction ({TARGET_LANGUAGE}): {translated_text}")
+    return translated_text
+
+async def publish_caption(seg_id, text, source_language, **extra):
+    """Publie la traduction d'un segment mot par mot (translation_partial), puis le texte final"""
+    if translation_unavailable(source_language):
+        await send_log("⚠️ Traduction locale non disponible — envoi de la transcription brute")
+        await captions.publish(seg_id, text, final=True, **extra)
+        return
+    await send_log("🔁 Traduction via MarianMT en cours...")
+    stream = lambda sentence: stream_translation(sentence, source_language)
+    translated_text = ""
+    try:
+        async for partial in stream_sentences_async(text, stream, translation_cache, source_language):
+            translated_text = partial
+            await captions.publish(seg_id, translated_text)
+    except Exception as e:
+        translated_text = f"[TRANSLATION ERROR: {e}]"
+    await send_log(f"💬 Original ({source_language}): {text}")
+    await send_log(f"💬 Traduction ({TARGET_LANGUAGE}): {translated_text}")
+    await captions.publish(seg_id, translated_text, final=True, **extra)
+
+async def emit_sentences(sentences, source_language=None):
+    source_language = source_language or current_source_language()
+    for sentence in sentences:
+        await publish_caption(captions.new_segment(), sentence, source_language)
+
+# ----------------------
+# Transcription spéculative (brouillon + correction)
+# ----------------------
+async def emit_provisional(audio_data, result, text, filter_context=None, source_language=None):
+    """Un segment par chunk : affiché tout de suite, re-décodé ensuite par le modèle principal"""
+    source_language = source_language or current_source_language()
+    seg_id = captions.new_segment()
+    await publish_caption(seg_id, text, source_language, provisional=1)
+    verifier.submit(seg_id, audio_data, result, text, source_language or result.get("language"), filter_context)
+
+def prepare_verified_text(result, filter_context):
+    """Texte du modèle principal filtré comme le brouillon (même historique de dédoublonnage)"""
+    if not TRANSCRIPT_FILTER:
+        return result.get("text", "").strip()
+    text, _ = transcript_filter.apply(result, context=filter_context or [])
+    return text
+
+async def apply_correction(seg_id, text, result, language):
+    await send_log(f"✏️ Correction du segment #{seg_id} ({MODEL_NAME}): {text}")
+    await captions.correct(seg_id, await translate_caption(text, language or result.get("language")))
+
+verifier = SpeculativeVerifier(
+    run_transcription,
+    apply_correction,
+    prepare=prepare_verified_text,
+    agreement=config.get("draft_agreement"),
+    skip_logprob=config.get("draft_skip_logprob")
+)
+
 # ----------------------
 # Loop audio principale
 # ----------------------
 async def audio_loop():
-    global TRANSCRIPTION_ACTIVE, AUDIO_LOOP_RUNNING
-    buffer = np.zeros((0, 1), dtype=np.float32)
-    AUDIO_LOOP_RUNNING = True
-    print("🎙️ Boucle audio démarrée, en attente du microphone...")
+    """Parquée (sans CPU) hors capture ; découpe les blocs du micro en chunks de CHUNK_DURATION"""
+    blocks, samples = [], 0
+    print("🎙️ Boucle audio démarrée")
     try:
-        while SELECTED_MICROPHONE_ID is None:
-            await asyncio.sleep(1)
-        print(f"🎙️ Utilisation du microphone ID {SELECTED_MICROPHONE_ID}")
-        with sd.InputStream(
-            samplerate=SAMPLE_RATE,
-            channels=1,
-            callback=callback,
-            device=SELECTED_MICROPHONE_ID
-        ):
-            print("🎙️ Micro OK ! Prêt à traduire...")
-            while True:
-                try: data = audio_queue.get(timeout=0.1)
-                except queue.Empty:
-                    await asyncio.sleep(0.01)
-                    continue
-                buffer = np.concatenate([buffer, data])
-                duration = len(buffer) / SAMPLE_RATE
-                if duration >= CHUNK_DURATION:
-                    audio_data = buffer.flatten()
-                    if not has_speech(audio_data):
-                        if TRANSCRIPTION_ACTIVE:
-                            await send_log("🔇 Silence détecté, chunk ignoré")
-                        buffer = np.zeros((0,1), dtype=np.float32)
-                        continue
-                    if TRANSCRIPTION_ACTIVE:
-                        await send_log("⏳ Processing chunk (transcription)...")
-                        try:
-                            result = model.transcribe(audio_data, task="transcribe", language=SPOKEN_LANGUAGE, fp16=False)
-                            source_text = result.get("text", "").strip()
-                        except Exception as e:
-                            await send_log(f"❌ Whisper transcription error: {e}")
-                            source_text = ""
-                        if source_text:
-                            await send_log(f"📝 Transcription ({SPOKEN_LANGUAGE}): {source_text}")
-                            if translator_enabled:
-                                await send_log("🔁 Traduction via M2M100 en cours...")
-                                loop = asyncio.get_running_loop()
-                                translated_text = await loop.run_in_executor(None, translate_sync, source_text)
-                                await send_log(f"💬 Original ({SPOKEN_LANGUAGE}): {source_text}")
-                                await send_log(f"💬 Traduction ({TARGET_LANGUAGE}): {translated_text}")
-                                await sio.emit('translation', {'text': translated_text})
-                            else:
-                                await send_log("⚠️ Traduction locale non disponible — envoi de la transcription brute")
-                                await sio.emit('translation', {'text': source_text})
-                        else:
-                            await send_log("⚠️ Pas de texte extrait par Whisper pour ce chunk")
-                    buffer = np.zeros((0,1), dtype=np.float32)
+        while True:
+            if not pipeline.is_active:
+                blocks, samples = [], 0
+                await pipeline.wait_active()
+                continue
+            try: data = await asyncio.wait_for(audio_queue.get(), timeout=0.25)
+            except asyncio.TimeoutError:
+                await emit_sentences(segmenter.poll())
+                continue
+            if data is None:
+                # Réveil demandé par l'arrêt (draining)
+                continue
+            blocks.append(data)
+            samples += len(data)
+            if samples < CHUNK_DURATION * SAMPLE_RATE:
+                continue
+            audio_data = np.concatenate(blocks).flatten()
+            blocks, samples = [], 0
+            async with chunk_lock:
+                if pipeline.is_active:
+                    await process_chunk(audio_data)
     except asyncio.CancelledError:
         print("🎙️ Boucle audio annulée")
         raise
@@ -272,20 +478,98 @@ async def audio_loop():
         print(f"❌ Erreur dans la boucle audio: {e}")
     finally:
         print("🎙️ Boucle audio arrêtée")
-        AUDIO_LOOP_RUNNING = False
+
+async def process_chunk(audio_data):
+    trace = chunk_tracer.start()
+    level = None
+    if audio_conditioner:
+        with trace.stage("condition"):
+            audio_data = audio_conditioner.process(audio_data)
+        # Niveau après passe-haut et réduction de bruit, avant AGC
+        level = audio_conditioner.level
+    with trace.stage("vad"):
+        speech = has_speech(audio_data, level)
+    if not speech:
+        await send_log("🔇 Silence détecté, chunk ignoré")
+        with trace.stage("translate"):
+            await emit_sentences(segmenter.mark_pause())
+        trace.finish("silence")
+        return
+    await send_log("⏳ Processing chunk (transcription)...")
+    language, session_language = SPOKEN_LANGUAGE, None
+    if is_auto(SPOKEN_LANGUAGE):
+        language = language_detector.language_for_chunk()
+        session_language = language_detector.language
+    try:
+        with trace.stage("transcribe"):
+            if DRAFT_MODEL_NAME:
+                result = await run_draft_transcription(audio_data, language, session_language)
+            else:
+                result = await run_transcription(audio_data, language, session_language)
+        source_text = result.get("text", "").strip()
+    except Exception as e:
+        await send_log(f"❌ Whisper transcription error: {e}")
+        result, source_text = {}, ""
+    if is_auto(SPOKEN_LANGUAGE) and result:
+        previous = language_detector.language
+        changed = language_detector.observe(result)
+        if changed:
+            # Les phrases en attente appartiennent à l'ancienne langue
+            await emit_sentences(segmenter.flush(), previous)
+            await send_log(f"🌐 Langue détectée: {changed} "
+                           f"(p={language_detector.confidence:.2f})")
+    filter_context = None
+    if TRANSCRIPT_FILTER and source_text:
+        with trace.stage("filter"):
+            filter_context = transcript_filter.context()
+            source_text, reasons = transcript_filter.apply(result)
+        if reasons:
+            await send_log(f"🧹 Filtré ({', '.join(reasons)})"
+                           + (f", conservé: {source_text}" if source_text else ""))
+    if source_text:
+        # Langue dans laquelle Whisper a décodé ce chunk : c'est elle qui choisit le traducteur
+        chunk_language = result.get("transcribed_language") or current_source_language()
+        await send_log(f"📝 Transcription ({chunk_language or '?'}): {source_text}")
+        with trace.stage("translate"):
+            if DRAFT_MODEL_NAME:
+                await emit_provisional(audio_data, result, source_text, filter_context, chunk_language)
+            elif SENTENCE_SEGMENTATION:
+                await emit_sentences(segmenter.feed(source_text), chunk_language)
+            else:
+                await emit_sentences([source_text], chunk_language)
+    else:
+        await send_log("⚠️ Pas de texte exploitable pour ce chunk")
+        # Pas de nouveau texte : la règle de pause (sentence_pause) peut libérer la phrase en attente
+        await emit_sentences(segmenter.poll())
+    trace.finish("text" if source_text else "empty")
+    if profile_session.busy:
+        # Détail par chunk diffusé seulement pendant un profilage (sinon : GET /debug/traces)
+        await send_log(f"⏱️ Chunk #{trace.chunk_id}: {trace.summary()}")
+
+async def drain_pipeline():
+    # Réveille la boucle audio si elle attend un bloc, puis attend la fin du chunk en cours
+    audio_queue.put_nowait(None)
+    async with chunk_lock:
+        while not audio_queue.empty():
+            audio_queue.get_nowait()
+        await emit_sentences(segmenter.flush())
 
 # ----------------------
 # SOCKET.IO EVENTS (inchangés)
 # ----------------------
 @sio.event
-async def connect(sid, environ):
+async def connect(sid, environ, auth=None):
     print(f"✅ Client connecté: {sid}")
     await send_log(f"✅ Nouveau client connecté: {sid}")
     await sio.emit('config', config, room=sid)
+    encoding = await captions.register(sid, environ, auth)
+    if encoding:
+        await send_log(f"📦 Protocole sous-titres v2 négocié ({encoding}) pour {sid}")
 
 @sio.event
 async def disconnect(sid):
     print(f"❌ Client déconnecté: {sid}")
+    captions.unregister(sid)
     await send_log(f"❌ Client déconnecté: {sid}")
 
 @sio.event
@@ -294,6 +578,24 @@ async def ping(sid, data):
     await sio.emit('pong', {'timestamp': timestamp}, room=sid)
     await send_log(f"🏓 Ping reçu de {sid}, pong envoyé")
 
+@sio.event
+async def caption_resync(sid, data=None):
+    # Le client a détecté un trou dans les numéros de séquence
+    await captions.send_snapshot(sid)
+
+@sio.event
+async def start_profile(sid, data=None):
+    data = data or {}
+    if profile_session.busy:
+        await sio.emit('profile_result', {'error': 'Profiling already running'}, room=sid)
+        return
+    seconds = data.get('seconds', 10)
+    mode = data.get('mode', 'sample')
+    await send_log(f"🔬 Profilage ({mode}) pendant {seconds}s...")
+    result = await profile_session.capture(seconds, mode)
+    await sio.emit('profile_result', result, room=sid)
+    await send_log("🔬 Profilage terminé")
+
 @sio.event
 async def get_microphones(sid):
     await send_log("🎤 Récupération de la liste des microphones...")
@@ -312,6 +614,11 @@ async def set_microphone(sid, data):
     config["selected_microphone_id"] = mic_id
     save_config(config)
     await send_log(f"🎤 Microphone sélectionné ID: {mic_id}, config sauvegardée")
+    if audio_conditioner:
+        # Autre micro, autre bruit de fond
+        audio_conditioner.reset(keep_profile=False)
+    # Pré-ouverture du nouveau micro (pris en compte au prochain démarrage si la capture est active)
+    await arm_pipeline()
 
 @sio.event
 async def update_config(sid, data):
@@ -327,64 +634,240 @@ async def update_config(sid, data):
         save_config(config)
         await send_log("💾 Configuration sauvegardée")
 
+async def arm_pipeline():
+    """Micro ouvert en pause et modèles chauds : le prochain start_translation est quasi immédiat"""
+    if SELECTED_MICROPHONE_ID is None or not pipeline.armed_seconds or pipeline.is_active:
+        return
+    try:
+        await ensure_models_loaded()
+        await pipeline.arm(SELECTED_MICROPHONE_ID)
+        await send_log(f"🎙️ Micro ID {SELECTED_MICROPHONE_ID} prêt (en pause)")
+    except Exception as e:
+        await send_log(f"⚠️ Impossible de préparer le micro: {e}")
+
+@sio.event
+async def arm_translation(sid, data=None):
+    await arm_pipeline()
+    await sio.emit('translation_status', {'active': pipeline.is_active, 'state': pipeline.state}, room=sid)
+
 @sio.event
 async def start_translation(sid):
-    global TRANSCRIPTION_ACTIVE, audio_task
+    global audio_task
     if SELECTED_MICROPHONE_ID is None:
         await send_log("❌ Aucun microphone sélectionné")
         await sio.emit('translation_status', {'active': False, 'error': 'No microphone selected'}, room=sid)
         return
-    TRANSCRIPTION_ACTIVE = True
+    await ensure_models_loaded()
+    language_detector.reset()
+    transcript_filter.reset()
+    if audio_conditioner:
+        audio_conditioner.reset()
     if audio_task is None or audio_task.done():
         audio_task = asyncio.create_task(audio_loop())
-    await send_log("🎤 Transcription démarrée")
-    await sio.emit('translation_status', {'active': True, 'message': 'Transcription started'}, room=sid)
+    try:
+        await pipeline.activate(SELECTED_MICROPHONE_ID)
+    except Exception as e:
+        await send_log(f"❌ Ouverture du micro impossible: {e}")
+        await sio.emit('translation_status', {'active': False, 'error': str(e)}, room=sid)
+        return
+    await send_log(f"🎤 Transcription démarrée ({pipeline.last_resume_ms} ms)")
+    await sio.emit('translation_status', {'active': True, 'state': pipeline.state,
+                                          'message': 'Transcription started'}, room=sid)
 
 @sio.event
 async def stop_translation(sid):
-    global TRANSCRIPTION_ACTIVE, AUDIO_LOOP_RUNNING, audio_task
     print("⏹️ Arrêt de la transcription demandé...")
-    TRANSCRIPTION_ACTIVE = False
-    AUDIO_LOOP_RUNNING = False
-    if audio_task and not audio_task.done():
-        audio_task.cancel()
-        try: await audio_task
-        except asyncio.CancelledError: pass
-    while not audio_queue.empty():
-        try: audio_queue.get_nowait()
-        except queue.Empty: break
+    # active -> draining (fin du chunk en cours, phrases en attente) -> armed / stopped
+    await pipeline.deactivate(drain_pipeline)
+    # Pas de correction après l'arrêt pour des sous-titres déjà affichés
+    verifier.clear()
     await send_log("⏹️ Transcription arrêtée")
-    await sio.emit('translation_status', {'active': False, 'message': 'Transcription stopped'})
+    await sio.emit('translation_status', {'active': False, 'state': pipeline.state,
+                                          'message': 'Transcription stopped'})
+
+# ----------------------
+# Workers d'inférence
+# ----------------------
+def create_worker_pool():
+    return InferenceWorkerPool(
+        {
+            "model_name": MODEL_NAME,
+            "device": whisper_device,
+            "spoken_language": SPOKEN_LANGUAGE,
+            "target_language": TARGET_LANGUAGE,
+            "translator_device": translator_device,
+            "mmap_weights": MMAP_WEIGHTS,
+            "precision": CPU_WEIGHTS_PRECISION,
+            "translator_precision": TRANSLATOR_PRECISION,
+            "language_candidates": LANGUAGE_CANDIDATES,
+            "language_min_confidence": LANGUAGE_MIN_CONFIDENCE,
+            "translator_backend": TRANSLATOR_BACKEND,
+            "translator_settings": TRANSLATION_SETTINGS.as_dict()
+        },
+        transcribe_workers=config.get("transcribe_workers"),
+        translate_workers=config.get("translate_workers"),
+        threads_per_worker=config.get("worker_threads"),
+        sample_rate=SAMPLE_RATE,
+        segment_seconds=CHUNK_DURATION
+    )
+
+@app.on_event("startup")
+async def start_workers():
+    global worker_pool, MAIN_LOOP, audio_queue, chunk_lock
+    MAIN_LOOP = asyncio.get_running_loop()
+    audio_queue = asyncio.Queue()
+    chunk_lock = asyncio.Lock()
+    lag_monitor.start(asyncio.get_running_loop())
+    if WORKER_MODELS:
+        worker_pool = create_worker_pool()
+        worker_pool.start(asyncio.get_running_loop())
+        asyncio.create_task(worker_pool.supervise())
+    if remote_pool:
+        remote_pool.start()
+        asyncio.create_task(remote_pool.supervise())
+    if DRAFT_MODEL_NAME:
+        # Chargé ici et non à l'import : les workers (spawn) ré-importent ce module
+        await asyncio.get_running_loop().run_in_executor(None, load_draft_model)
+        asyncio.create_task(verifier.run())
+    if IDLE_UNLOAD_MINUTES:
+        asyncio.create_task(idle_unloader.run())
+    park_inference(not pipeline.is_active)
+    asyncio.create_task(arm_pipeline())
+
+@app.on_event("shutdown")
+async def stop_workers():
+    lag_monitor.stop()
+    pipeline.shutdown()
+    if worker_pool:
+        worker_pool.stop()
+    if remote_pool:
+        remote_pool.stop()
+
+# ----------------------
+# Politique mémoire (déchargement sur inactivité)
+# ----------------------
+def models_loaded():
+    return model is not None or worker_pool is not None or draft_model is not None
+
+async def unload_models():
+    global model, draft_model, translators, worker_pool
+    loop = asyncio.get_running_loop()
+    if WORKER_MODELS and worker_pool:
+        pool, worker_pool = worker_pool, None
+        await loop.run_in_executor(None, pool.stop)
+    verifier.clear()
+    model = None
+    draft_model = None
+    translators = create_translator_router()
+    translation_cache.clear()
+    release_memory()
+    await send_log(f"💤 Modèles déchargés après {IDLE_UNLOAD_MINUTES} min d'inactivité "
+                   f"({memory_report()['total_rss_mb']} MB RSS)")
+
+async def ensure_models_loaded():
+    global worker_pool
+    idle_unloader.touch()
+    missing_main = (WORKER_MODELS and worker_pool is None) or (LOCAL_MODELS and model is None)
+    missing_draft = DRAFT_MODEL_NAME and draft_model is None
+    if not (missing_main or missing_draft):
+        return
+    await send_log("⏳ Rechargement des modèles...")
+    loop = asyncio.get_running_loop()
+    if missing_main and WORKER_MODELS:
+        worker_pool = create_worker_pool()
+        worker_pool.start(loop)
+        worker_pool.park(not pipeline.is_active)
+        asyncio.create_task(worker_pool.supervise())
+    elif missing_main:
+        await loop.run_in_executor(None, load_local_models)
+    if missing_draft:
+        await loop.run_in_executor(None, load_draft_model)
+    await send_log("✅ Modèles rechargés")
+
+idle_unloader = IdleUnloader(
+    (IDLE_UNLOAD_MINUTES or 0) * 60,
+    is_idle=lambda: not pipeline.is_active,
+    is_loaded=models_loaded,
+    unload=unload_models
+)
 
 # ----------------------
 # ROUTES HTTP
 # ----------------------
+frontend = StaticFrontend()
+
 @app.get("/")
-async def root():
+async def root(request: Request):
+    if frontend.available:
+        return frontend.response(request, "")
     return {"status": "ok", "message": "Socket.IO STT server running"}
 
+@app.get("/status")
+async def status():
+    return {"status": "ok", "message": "Socket.IO STT server running"}
+
+@app.get("/inference/status")
+async def inference_status():
+    return {
+        "workers": worker_pool.status() if worker_pool else None,
+        "nodes": remote_pool.status() if remote_pool else None,
+        "speculative": {"draft_model": DRAFT_MODEL_NAME, **verifier.status()} if DRAFT_MODEL_NAME else None
+    }
+
+@app.get("/debug/pipeline")
+async def debug_pipeline():
+    return {**pipeline.status(), "audio_loop": audio_task is not None and not audio_task.done(),
+            "queued_blocks": audio_queue.qsize() if audio_queue else 0}
+
+@app.get("/debug/conditioning")
+async def debug_conditioning():
+    return {"enabled": audio_conditioner is not None, **(audio_conditioner.status() if audio_conditioner else {})}
+
+@app.get("/debug/language")
+async def debug_language():
+    return {"spoken_language": SPOKEN_LANGUAGE, "candidates": LANGUAGE_CANDIDATES, **language_detector.status()}
+
+@app.get("/debug/filter")
+async def debug_filter():
+    return {"enabled": TRANSCRIPT_FILTER, **transcript_filter.status()}
+
+@app.get("/debug/loop")
+async def debug_loop():
+    return lag_monitor.status()
+
+@app.get("/debug/memory")
+async def debug_memory():
+    return {"models_loaded": models_loaded(), **memory_report()}
+
+@app.get("/debug/traces")
+async def debug_traces(limit: int = 20):
+    return {"stages": chunk_tracer.stats(), "recent": list(chunk_tracer.records)[-limit:]}
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(seconds: float = 10, mode: str = "sample"):
+    if profile_session.busy:
+        return PlainTextResponse("Profiling already running", status_code=409)
+    result = await profile_session.capture(seconds, mode)
+    return result["output"]
+
+# Front Next.js exporté : route catch-all, déclarée après toutes les routes de l'API
+mount_frontend(app, frontend)
+
 # ----------------------
 # Lancer le serveur
 # ----------------------
 if __name__ == "__main__":
-    print("🚀 Lancement du front Next.js...")
-    if platform.system() == "Windows":
-        npm_cmd = "npm.cmd run dev"
-        next_process = subprocess.Popen(npm_cmd, cwd=FRONT_DIR, shell=True)
-    else:
-        next_process = subprocess.Popen(["npm","run","dev"], cwd=FRONT_DIR, preexec_fn=os.setsid)
-
     def shutdown_handler(sig, frame):
-        print("\n🛑 Arrêt en cours... (backend + Next.js)")
-        kill_process_tree(next_process)
+        print("\n🛑 Arrêt en cours...")
+        if worker_pool:
+            worker_pool.stop()
         sys.exit(0)
 
     signal.signal(signal.SIGINT, shutdown_handler)
     signal.signal(signal.SIGTERM, shutdown_handler)
 
-    print("⏳ Attente du front (3s)...")
-    time.sleep(3)
-    print(f"🌍 Ouverture du navigateur sur {FRONT_URL}")
-    webbrowser.open(FRONT_URL)
+    if frontend.available:
+        print(f"🌍 Ouverture du navigateur sur {FRONT_URL}")
+        webbrowser.open(FRONT_URL)
 
-    uvicorn.run(app_sio, host="0.0.0.0", port=8000, log_level="info", access_log=False, loop="asyncio")
+    uvicorn.run(app_sio, host="0.0.0.0", port=SERVER_PORT, log_level="info", access_log=False, loop="asyncio")
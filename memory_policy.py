@@ -0,0 +1,308 @@
+"""
+Mode économe en mémoire
+- Poids chargés depuis des fichiers safetensors mappés en mémoire (mmap copy-on-write) :
+  plusieurs processus / instances partagent les mêmes pages
+- Stockage CPU réduit : bf16 (Whisper : calcul en fp32 avec conversion à la volée), int8 dynamique (MarianMT)
+- Déchargement des modèles après une période d'inactivité
+- Rapport RSS courant / pic (processus + workers)
+"""
+
+import asyncio
+import gc
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+import psutil
+
+WEIGHTS_CACHE_DIR = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "live-translation" / "weights"
+
+PRECISIONS = ("fp32", "bf16", "int8")
+HEADER_ALIGNMENT = 64
+
+
+# ----------------------
+# Safetensors mmap (lecture zéro-copie)
+# ----------------------
+def _dtype_tables():
+    import torch
+    to_name = {
+        torch.float32: "F32", torch.float16: "F16", torch.bfloat16: "BF16", torch.float64: "F64",
+        torch.int64: "I64", torch.int32: "I32", torch.int16: "I16", torch.int8: "I8",
+        torch.uint8: "U8", torch.bool: "BOOL"
+    }
+    return to_name, {v: k for k, v in to_name.items()}
+
+
+def save_safetensors(state_dict, path, metadata=None):
+    """
+    Écrit un fichier safetensors en dédupliquant les tenseurs partagés (poids liés).
+    Les tenseurs sont triés par taille d'élément décroissante pour garder des offsets alignés.
+    """
+    import torch
+    to_name, _ = _dtype_tables()
+    aliases = {}
+    unique = {}
+    seen = {}
+    for key, tensor in state_dict.items():
+        identity = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape))
+        if tensor.numel() and identity in seen:
+            aliases[key] = seen[identity]
+            continue
+        seen[identity] = key
+        unique[key] = tensor.detach().contiguous().cpu()
+
+    ordered = sorted(unique.items(), key=lambda kv: -kv[1].element_size())
+    header = {}
+    offset = 0
+    for key, tensor in ordered:
+        size = tensor.numel() * tensor.element_size()
+        header[key] = {"dtype": to_name[tensor.dtype], "shape": list(tensor.shape), "data_offsets": [offset, offset + size]}
+        offset += size
+    meta = dict(metadata or {})
+    if aliases:
+        meta["aliases"] = json.dumps(aliases)
+    header["__metadata__"] = meta
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    padding = (-(8 + len(header_bytes))) % HEADER_ALIGNMENT
+    header_bytes += b" " * padding
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for _, tensor in ordered:
+            if tensor.numel():
+                f.write(tensor.reshape(-1).view(torch.uint8).numpy())
+    os.replace(tmp_path, path)
+
+
+def load_safetensors_mmap(path):
+    """
+    Retourne (state_dict, metadata) dont les tenseurs pointent directement dans le fichier mappé.
+    ACCESS_COPY : les pages restent partagées entre processus tant qu'elles ne sont pas modifiées.
+    """
+    import torch
+    _, from_name = _dtype_tables()
+    with open(path, "rb") as f:
+        header_len = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_len))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    base = 8 + header_len
+    metadata = header.pop("__metadata__", {}) or {}
+    state_dict = {}
+    for key, info in header.items():
+        dtype = from_name[info["dtype"]]
+        start, end = info["data_offsets"]
+        count = (end - start) // torch.empty(0, dtype=dtype).element_size()
+        if count:
+            tensor = torch.frombuffer(mapped, dtype=dtype, count=count, offset=base + start)
+        else:
+            tensor = torch.empty(0, dtype=dtype)
+        state_dict[key] = tensor.view(info["shape"])
+    for alias, target in json.loads(metadata.get("aliases", "{}")).items():
+        state_dict[alias] = state_dict[target]
+    return state_dict, metadata
+
+
+def _instantiate_empty(factory):
+    """Construit le modèle sans allouer de poids (device meta) ; à défaut, sur CPU"""
+    import torch
+    try:
+        with torch.device("meta"):
+            return factory()
+    except Exception:
+        return factory()
+
+
+def _has_meta_tensors(model):
+    return any(t.is_meta for t in list(model.parameters()) + list(model.buffers()))
+
+
+def _cache_path(kind, name, precision):
+    safe_name = name.replace("/", "--").replace("\\", "--").replace(":", "")
+    return WEIGHTS_CACHE_DIR / f"{kind}-{safe_name}-{precision}.safetensors"
+
+
+# ----------------------
+# Whisper
+# ----------------------
+def _whisper_storage_dtype(key, tensor, precision):
+    import torch
+    if not tensor.is_floating_point():
+        return tensor.dtype
+    # Les Linear / Conv1d de Whisper convertissent leurs poids vers le dtype de l'entrée :
+    # on peut stocker en bf16 et calculer en fp32. LayerNorm et embeddings restent en fp32.
+    if precision != "fp32" and key.endswith(".weight") and tensor.dim() >= 2 and "token_embedding" not in key:
+        return torch.bfloat16
+    return torch.float32
+
+
+def load_whisper_lean(model_name, precision="fp32"):
+    """Whisper CPU depuis un cache safetensors mappé (créé au premier lancement)"""
+    import torch
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+
+    storage = "bf16" if precision in ("bf16", "int8") else "fp32"
+    path = _cache_path("whisper", model_name, storage)
+    if not path.exists():
+        print(f"🗜️ Conversion de Whisper '{model_name}' en safetensors ({storage})...")
+        if model_name in whisper._MODELS:
+            default = os.path.join(os.path.expanduser("~"), ".cache")
+            root = os.path.join(os.getenv("XDG_CACHE_HOME", default), "whisper")
+            checkpoint_file = whisper._download(whisper._MODELS[model_name], root, False)
+        else:
+            checkpoint_file = model_name
+        checkpoint = torch.load(checkpoint_file, map_location="cpu", weights_only=True)
+        state = {k: v.to(_whisper_storage_dtype(k, v, storage)) for k, v in checkpoint["model_state_dict"].items()}
+        save_safetensors(state, path, {"dims": json.dumps(checkpoint["dims"])})
+        del checkpoint, state
+        gc.collect()
+
+    state_dict, metadata = load_safetensors_mmap(path)
+    dims = ModelDimensions(**json.loads(metadata["dims"]))
+    model = _instantiate_empty(lambda: Whisper(dims))
+    model.load_state_dict(state_dict, assign=True)
+
+    # Buffers non persistants (absents du fichier) recréés sur CPU
+    n_ctx = dims.n_text_ctx
+    model.decoder.register_buffer("mask", torch.empty(n_ctx, n_ctx).fill_(-float("inf")).triu_(1), persistent=False)
+    all_heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+    all_heads[dims.n_text_layer // 2:] = True
+    model.register_buffer("alignment_heads", all_heads.to_sparse(), persistent=False)
+    if model_name in whisper._ALIGNMENT_HEADS:
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[model_name])
+
+    if _has_meta_tensors(model):
+        raise RuntimeError("poids manquants après chargement mmap")
+    model.eval()
+    return model
+
+
+# ----------------------
+# MarianMT
+# ----------------------
+def load_marian_lean(model_name, precision="fp32", mmap_weights=True):
+    """MarianMT CPU : mmap fp32/bf16 partagé, ou quantification dynamique int8"""
+    import torch
+    from transformers import MarianConfig, MarianMTModel
+
+    if precision == "int8":
+        model = MarianMTModel.from_pretrained(model_name, low_cpu_mem_usage=True)
+        model.eval()
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    dtype = torch.bfloat16 if precision == "bf16" else torch.float32
+    if not mmap_weights:
+        return MarianMTModel.from_pretrained(model_name, torch_dtype=dtype, low_cpu_mem_usage=True).eval()
+
+    path = _cache_path("marian", model_name, precision)
+    if not path.exists():
+        print(f"🗜️ Conversion de {model_name} en safetensors ({precision})...")
+        model = MarianMTModel.from_pretrained(model_name, low_cpu_mem_usage=True).to(dtype)
+        save_safetensors(model.state_dict(), path)
+        del model
+        gc.collect()
+
+    state_dict, _ = load_safetensors_mmap(path)
+    config = MarianConfig.from_pretrained(model_name)
+    model = _instantiate_empty(lambda: MarianMTModel(config))
+    model.load_state_dict(state_dict, assign=True, strict=False)
+    model.tie_weights()
+    if _has_meta_tensors(model):
+        raise RuntimeError("poids manquants après chargement mmap")
+    return model.eval()
+
+
+# ----------------------
+# Rapport mémoire
+# ----------------------
+def _peak_rss(process):
+    try:
+        if sys.platform == "win32":
+            return process.memory_info().peak_wset
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+
+def _mb(value):
+    return round(value / 1024 ** 2, 1) if value is not None else None
+
+
+def memory_report(include_children=True):
+    """RSS courant, pic, et PSS/USS quand disponibles (Linux) pour voir les pages partagées"""
+    process = psutil.Process()
+    info = process.memory_info()
+    report = {"rss_mb": _mb(info.rss), "peak_rss_mb": _mb(_peak_rss(process))}
+    try:
+        full = process.memory_full_info()
+        report["uss_mb"] = _mb(full.uss)
+        if hasattr(full, "pss"):
+            report["pss_mb"] = _mb(full.pss)
+    except Exception:
+        pass
+    if include_children:
+        children = []
+        for child in process.children(recursive=True):
+            try:
+                children.append({"pid": child.pid, "name": child.name(), "rss_mb": _mb(child.memory_info().rss)})
+            except psutil.Error:
+                continue
+        report["children"] = children
+        report["total_rss_mb"] = round(report["rss_mb"] + sum(c["rss_mb"] for c in children), 1)
+    return report
+
+
+def release_memory():
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+    if sys.platform.startswith("linux"):
+        try:
+            import ctypes
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except Exception:
+            pass
+
+
+# ----------------------
+# Déchargement sur inactivité
+# ----------------------
+class IdleUnloader:
+    """Appelle unload() quand is_idle() reste vrai plus de idle_seconds"""
+
+    def __init__(self, idle_seconds, is_idle, is_loaded, unload, check_interval=30.0):
+        self.idle_seconds = idle_seconds
+        self.is_idle = is_idle
+        self.is_loaded = is_loaded
+        self.unload = unload
+        self.check_interval = min(check_interval, max(idle_seconds / 4, 1.0))
+        self.last_activity = time.monotonic()
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            if not self.is_idle():
+                self.touch()
+                continue
+            if self.is_loaded() and time.monotonic() - self.last_activity >= self.idle_seconds:
+                await self.unload()
+                self.touch()
@@ -0,0 +1,187 @@
+"""
+Machine d'état du pipeline de capture
+- stopped  : aucun flux audio ouvert, boucle audio parquée (aucune consommation CPU)
+- armed    : périphérique ouvert mais flux en pause, modèles chauds : reprise en quelques ms
+- active   : capture et traitement des chunks
+- draining : flux en pause, fin du chunk en cours et vidage des phrases en attente
+Sans reprise pendant armed_seconds, le périphérique est libéré (armed -> stopped).
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+STOPPED = "stopped"
+ARMED = "armed"
+ACTIVE = "active"
+DRAINING = "draining"
+
+DEFAULT_ARMED_SECONDS = 600
+
+
+class CapturePipeline:
+    """
+    open_stream(device) -> flux non démarré (ex: sd.InputStream) exposant start(), stop() et close().
+    Les appels au périphérique passent par un thread dédié : l'executor par défaut peut être
+    occupé par une transcription, ce qui retarderait la reprise.
+    """
+
+    def __init__(self, open_stream, armed_seconds=DEFAULT_ARMED_SECONDS, on_change=None):
+        self.open_stream = open_stream
+        self.armed_seconds = armed_seconds
+        self.on_change = on_change
+        self.state = STOPPED
+        self.stream = None
+        self.device = None
+        self.armed_until = None
+        self.last_resume_ms = None
+        self.transitions = {STOPPED: 0, ARMED: 0, ACTIVE: 0, DRAINING: 0}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-device")
+        # Créés à la première utilisation, dans l'event loop du serveur
+        self._lock = None
+        self._active = None
+        self._release_task = None
+
+    @property
+    def is_active(self):
+        return self.state == ACTIVE
+
+    def _primitives(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+            self._active = asyncio.Event()
+        return self._lock
+
+    async def _device_call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        self.transitions[state] += 1
+        if state == ACTIVE:
+            self._active.set()
+        else:
+            self._active.clear()
+        if self.on_change:
+            self.on_change(previous, state)
+
+    # --- Transitions ---
+    async def arm(self, device):
+        """Ouvre le périphérique sans démarrer la capture (stopped -> armed)"""
+        async with self._primitives():
+            await self._arm(device)
+
+    async def _arm(self, device):
+        if self.stream is not None and self.device != device:
+            await self._close()
+        if self.stream is None:
+            self.stream = await self._device_call(self.open_stream, device)
+            self.device = device
+        if self.state != ACTIVE:
+            self._set_state(ARMED)
+            self._schedule_release()
+
+    async def activate(self, device):
+        """armed -> active (reprise rapide) ; depuis stopped, ouvre d'abord le périphérique"""
+        async with self._primitives():
+            if self.state == ACTIVE and self.device == device:
+                return
+            started = time.perf_counter()
+            await self._arm(device)
+            try:
+                await self._device_call(self.stream.start)
+            except Exception:
+                # Flux inutilisable : on libère le périphérique, la prochaine reprise le rouvrira
+                await self._close()
+                raise
+            self._cancel_release()
+            self._set_state(ACTIVE)
+            self.last_resume_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    async def deactivate(self, drain=None):
+        """active -> draining -> armed (ou stopped si armed_seconds vaut 0)"""
+        async with self._primitives():
+            if self.state != ACTIVE:
+                return False
+            self._set_state(DRAINING)
+            paused = True
+            try:
+                await self._device_call(self.stream.stop)
+            except Exception as e:
+                # Périphérique débranché, etc. : il sera rouvert à la prochaine reprise
+                print(f"⚠️ Pause du flux audio impossible: {e}")
+                paused = False
+            try:
+                if drain:
+                    await drain()
+            finally:
+                if paused and self.armed_seconds > 0:
+                    self._set_state(ARMED)
+                    self._schedule_release()
+                else:
+                    await self._close()
+            return True
+
+    async def release(self):
+        """Libère le périphérique (armed -> stopped)"""
+        async with self._primitives():
+            if self.state in (ARMED, STOPPED):
+                await self._close()
+
+    async def _close(self):
+        self._cancel_release()
+        stream, self.stream = self.stream, None
+        self.device = None
+        if stream is not None:
+            try:
+                await self._device_call(stream.close)
+            except Exception as e:
+                print(f"⚠️ Fermeture du flux audio: {e}")
+        self._set_state(STOPPED)
+
+    # --- Libération différée ---
+    def _schedule_release(self):
+        self._cancel_release()
+        if self.armed_seconds > 0:
+            self.armed_until = time.monotonic() + self.armed_seconds
+            self._release_task = asyncio.create_task(self._release_later())
+
+    def _cancel_release(self):
+        self.armed_until = None
+        if self._release_task and not self._release_task.done() \
+                and self._release_task is not asyncio.current_task():
+            self._release_task.cancel()
+        self._release_task = None
+
+    async def _release_later(self):
+        await asyncio.sleep(self.armed_seconds)
+        async with self._lock:
+            if self.state == ARMED:
+                print(f"💤 Micro libéré après {self.armed_seconds / 60:.0f} min sans transcription")
+                await self._close()
+
+    async def wait_active(self):
+        """Bloque (sans CPU) tant que la capture n'est pas active"""
+        self._primitives()
+        await self._active.wait()
+
+    def shutdown(self):
+        if self.stream is not None:
+            try:
+                self.stream.close()
+            except Exception:
+                pass
+            self.stream = None
+        self._executor.shutdown(wait=False)
+
+    def status(self):
+        return {
+            "state": self.state,
+            "device": self.device,
+            "armed_seconds_left": round(max(0.0, self.armed_until - time.monotonic()), 1)
+            if self.armed_until else None,
+            "last_resume_ms": self.last_resume_ms,
+            "transitions": dict(self.transitions)
+        }
@@ -0,0 +1,266 @@
+"""
+Outils de diagnostic embarqués (sans outil externe ni redémarrage)
+- Moniteur de lag de l'event loop : signale les callbacks qui bloquent la boucle et nomme la coroutine
+- Capture de profil à la demande (échantillonnage multi-thread ou cProfile) pendant N secondes
+- Traces par chunk des étapes de audio_loop
+"""
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+DEFAULT_LAG_THRESHOLD = 0.1     # secondes
+DEFAULT_SAMPLE_INTERVAL = 0.005  # 200 Hz
+MAX_PROFILE_SECONDS = 120
+TRACE_HISTORY = 200
+
+
+def _describe_frame(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _stack(frame, limit=64):
+    """Pile racine -> feuille"""
+    stack = []
+    while frame is not None and len(stack) < limit:
+        stack.append(_describe_frame(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+# ----------------------
+# Lag de l'event loop
+# ----------------------
+class LoopLagMonitor:
+    """
+    Un battement est planifié dans la boucle ; un thread watchdog vérifie qu'il arrive à l'heure.
+    En cas de retard, la pile du thread de la boucle est capturée pour nommer le coupable.
+    """
+
+    def __init__(self, threshold=DEFAULT_LAG_THRESHOLD, interval=None, on_stall=None, history=50):
+        self.threshold = threshold
+        self.interval = interval or max(threshold / 2, 0.01)
+        self.on_stall = on_stall
+        self.stalls = deque(maxlen=history)
+        self.max_lag = 0.0
+        self.loop = None
+        self.loop_thread_id = None
+        self.last_beat = time.monotonic()
+        self.running = False
+        self._current = None
+        self._task = None
+        self._watchdog = None
+
+    def start(self, loop=None):
+        self.loop = loop or asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.running = True
+        self.last_beat = time.monotonic()
+        self._task = self.loop.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self.running = False
+        if self._task:
+            self._task.cancel()
+
+    async def _heartbeat(self):
+        while self.running:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - expected
+            self.max_lag = max(self.max_lag, lag)
+            self.last_beat = time.monotonic()
+            if self._current is not None:
+                stall = self._current
+                self._current = None
+                stall["duration_ms"] = round(max(lag, stall["duration_ms"] / 1000) * 1000, 1)
+                self.stalls.append(stall)
+                if self.on_stall:
+                    self.on_stall(stall)
+
+    def _watch(self):
+        while self.running:
+            time.sleep(self.interval)
+            blocked = time.monotonic() - self.last_beat - self.interval
+            if blocked < self.threshold or self._current is not None:
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = _stack(frame) if frame else []
+            self._current = {
+                "at": time.time(),
+                "duration_ms": round(blocked * 1000, 1),
+                "culprit": self._culprit(stack),
+                "stack": stack[-12:]
+            }
+
+    @staticmethod
+    def _culprit(stack):
+        # Le frame le plus profond qui n'appartient pas à asyncio / à la stdlib de la boucle
+        for entry in reversed(stack):
+            if not any(part in entry for part in ("base_events.py", "events.py", "selector_events.py",
+                                                  "runners.py", "threading.py")):
+                return entry
+        return stack[-1] if stack else "inconnu"
+
+    def status(self):
+        return {
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": list(self.stalls)
+        }
+
+
+# ----------------------
+# Profilage à la demande
+# ----------------------
+class SamplingProfiler:
+    """Échantillonne la pile de tous les threads (boucle, exécuteurs, capture audio)"""
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self.total = 0
+
+    def run(self, seconds):
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                thread_name = names.get(thread_id) or str(thread_id)
+                self.samples[";".join([thread_name] + _stack(frame))] += 1
+            self.total += 1
+            time.sleep(self.interval)
+            if self.total % 100 == 0:
+                names = {t.ident: t.name for t in threading.enumerate()}
+        return self
+
+    def collapsed(self):
+        """Format "pile;repliée count" (flamegraph.pl, speedscope, inferno)"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+class ProfileSession:
+    """Une seule capture à la fois ; résultat texte (collapsed ou pstats)"""
+
+    def __init__(self):
+        # Créé à la première capture, dans l'event loop du serveur (la session est construite à l'import)
+        self.lock = None
+        self.last_result = None
+
+    @property
+    def busy(self):
+        return self.lock is not None and self.lock.locked()
+
+    async def capture(self, seconds, mode="sample"):
+        seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            started = time.time()
+            if mode == "cprofile":
+                output = await self._cprofile(seconds)
+            else:
+                loop = asyncio.get_running_loop()
+                profiler = await loop.run_in_executor(None, SamplingProfiler().run, seconds)
+                output = profiler.collapsed()
+            self.last_result = {"mode": mode, "seconds": seconds, "started_at": started, "output": output}
+            return self.last_result
+
+    @staticmethod
+    async def _cprofile(seconds):
+        # cProfile ne couvre que le thread courant : ici, celui de l'event loop
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(60)
+        return stream.getvalue()
+
+
+# ----------------------
+# Traces par chunk
+# ----------------------
+class ChunkTrace:
+    def __init__(self, tracer, chunk_id):
+        self.tracer = tracer
+        self.chunk_id = chunk_id
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.outcome = None
+
+    def stage(self, name):
+        return _StageTimer(self, name)
+
+    def finish(self, outcome="ok"):
+        self.outcome = outcome
+        record = {
+            "chunk": self.chunk_id,
+            "outcome": outcome,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": {k: round(v * 1000, 1) for k, v in self.stages.items()}
+        }
+        self.tracer.records.append(record)
+        return record
+
+    def summary(self):
+        parts = [f"{name} {duration * 1000:.0f} ms" for name, duration in self.stages.items()]
+        return ", ".join(parts)
+
+
+class _StageTimer:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.trace.stages[self.name] = self.trace.stages.get(self.name, 0.0) + elapsed
+        return False
+
+
+class ChunkTracer:
+    def __init__(self, history=TRACE_HISTORY):
+        self.records = deque(maxlen=history)
+        self._next_id = 0
+
+    def start(self):
+        self._next_id += 1
+        return ChunkTrace(self, self._next_id)
+
+    def stats(self):
+        """Percentiles par étape sur l'historique"""
+        per_stage = defaultdict(list)
+        for record in self.records:
+            per_stage["total"].append(record["total_ms"])
+            for stage, value in record["stages"].items():
+                per_stage[stage].append(value)
+        result = {}
+        for stage, values in per_stage.items():
+            values.sort()
+            result[stage] = {
+                "count": len(values),
+                "p50_ms": values[len(values) // 2],
+                "p95_ms": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max_ms": values[-1]
+            }
+        return result
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Inférence distante sur le réseau local
+- Un nœud d'inférence (Whisper + MarianMT) écoute en TCP : python remote_inference.py --port 9100
+  (127.0.0.1 par défaut ; sur le réseau : --host 0.0.0.0 avec un jeton partagé)
+- Le serveur de capture (main.py) lui envoie les segments audio via un protocole à trames
+- Répartition de charge entre plusieurs nœuds, health checks, fallback sur l'inférence locale
+
+Format d'une trame : en-tête ">BIII" (type, job_id, taille meta, taille data),
+puis meta (JSON UTF-8), puis data (octets bruts, ex: audio float32).
+La première trame d'une connexion doit être HELLO avec la version du protocole et le jeton
+(variable d'environnement LIVE_TRANSLATION_INFERENCE_TOKEN) ; sinon le nœud ferme la connexion.
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import struct
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PROTOCOL_VERSION = 1
+DEFAULT_PORT = 9100
+DEFAULT_HOST = "127.0.0.1"
+# Hors de config.json : la config est envoyée à tous les clients Socket.IO
+TOKEN_ENV = "LIVE_TRANSLATION_INFERENCE_TOKEN"
+CONFIG_FILE = "config.json"
+
+HEADER = struct.Struct(">BIII")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+MSG_HELLO = 1
+MSG_PING = 2
+MSG_PONG = 3
+MSG_TRANSCRIBE = 4
+MSG_TRANSLATE = 5
+MSG_RESULT = 6
+MSG_ERROR = 7
+
+HEALTH_INTERVAL = 2.0      # secondes entre deux pings
+HEALTH_TIMEOUT = 3.0       # au-delà, le nœud est considéré indisponible
+PARKED_INTERVAL = 15.0     # health checks espacés quand le pipeline est à l'arrêt
+REQUEST_TIMEOUT = 30.0
+RECONNECT_DELAY = 5.0
+
+
+class RemoteInferenceUnavailable(Exception):
+    """Aucun nœud d'inférence n'a pu traiter la requête"""
+
+
+class HandshakeRejected(Exception):
+    """HELLO refusé : version du protocole ou jeton incorrect"""
+
+
+# ----------------------
+# Trames
+# ----------------------
+def encode_frame(msg_type, job_id=0, meta=None, data=b""):
+    meta_bytes = json.dumps(meta or {}, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(msg_type, job_id, len(meta_bytes), len(data)) + meta_bytes + data
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(HEADER.size)
+    msg_type, job_id, meta_len, data_len = HEADER.unpack(header)
+    if meta_len + data_len > MAX_FRAME_SIZE:
+        raise ValueError(f"Trame trop grande ({meta_len + data_len} octets)")
+    meta = json.loads(await reader.readexactly(meta_len)) if meta_len else {}
+    data = await reader.readexactly(data_len) if data_len else b""
+    return msg_type, job_id, meta, data
+
+
+def parse_address(address):
+    """'host:port', '192.168.1.20:9100' ou IPv6 '[::1]:9100'"""
+    host, _, port = address.rpartition(":")
+    return host.strip("[]") or DEFAULT_HOST, int(port)
+
+
+# ----------------------
+# Nœud d'inférence
+# ----------------------
+class InferenceNode:
+    def __init__(self, model_name, device, spoken_language, target_language, threads=0,
+                 mmap_weights=False, precision="fp32", translator_backend="auto", translation_settings=None,
+                 token="", translation_precision="auto"):
+        from inference import TranslatorRouter, load_whisper_model, set_torch_threads
+        from language_detection import is_auto
+        from translation_engines import translator_precision
+        set_torch_threads(threads)
+        self.token = token or ""
+        self.model_name = model_name
+        self.spoken_language = spoken_language
+        self.target_language = target_language
+        self.model = load_whisper_model(model_name, device, mmap_weights, precision)
+        translator_device = "cuda" if device == "cuda" else "cpu"
+        self.translators = TranslatorRouter(target_language, translator_device, mmap_weights,
+                                            translator_precision({"translation_precision": translation_precision,
+                                                                  "cpu_weights_precision": precision}),
+                                            translator_backend, translation_settings)
+        if not is_auto(spoken_language):
+            self.translators.get(spoken_language)
+        # Un seul job à la fois : torch utilise déjà tous les threads alloués
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.in_flight = 0
+        self.served = 0
+
+    def info(self):
+        return {
+            "version": PROTOCOL_VERSION,
+            "model": self.model_name,
+            "spoken_language": self.spoken_language,
+            "target_language": self.target_language,
+            "translator": self.translators.available,
+            "in_flight": self.in_flight,
+            "served": self.served
+        }
+
+    def _transcribe(self, audio, language, candidates=None, session_language=None, min_confidence=0.0):
+        from inference import summarize_result, transcribe_audio
+        return summarize_result(transcribe_audio(self.model, audio, language, candidates,
+                                                 session_language, min_confidence))
+
+    def _translate(self, text, source_language):
+        return self.translators.translate(text, source_language or self.spoken_language)
+
+    async def _process(self, msg_type, job_id, meta, data, writer, write_lock):
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        try:
+            if msg_type == MSG_TRANSCRIBE:
+                audio = np.frombuffer(data, dtype=np.float32)
+                result = await loop.run_in_executor(self.executor, self._transcribe, audio,
+                                                    meta.get("language"), meta.get("candidates"),
+                                                    meta.get("session_language"), meta.get("min_confidence", 0.0))
+            else:
+                text = await loop.run_in_executor(self.executor, self._translate,
+                                                  meta.get("text", ""), meta.get("source_language"))
+                result = {"text": text}
+            frame = encode_frame(MSG_RESULT, job_id, result)
+        except Exception as e:
+            frame = encode_frame(MSG_ERROR, job_id, {"error": str(e)})
+        finally:
+            self.in_flight -= 1
+            self.served += 1
+        async with write_lock:
+            writer.write(frame)
+            await writer.drain()
+
+    def check_hello(self, msg_type, meta):
+        if msg_type != MSG_HELLO:
+            raise HandshakeRejected("HELLO attendu en première trame")
+        if meta.get("version") != PROTOCOL_VERSION:
+            raise HandshakeRejected(f"version du protocole {meta.get('version')} (nœud : {PROTOCOL_VERSION})")
+        if not hmac.compare_digest(str(meta.get("token") or "").encode(), self.token.encode()):
+            raise HandshakeRejected("jeton invalide")
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        write_lock = asyncio.Lock()
+        tasks = set()
+        accepted = False
+        try:
+            msg_type, job_id, meta, _ = await read_frame(reader)
+            try:
+                self.check_hello(msg_type, meta)
+            except HandshakeRejected as e:
+                print(f"⛔ Connexion refusée ({peer}): {e}")
+                writer.write(encode_frame(MSG_ERROR, job_id, {"error": f"connexion refusée: {e}", "rejected": True}))
+                await writer.drain()
+                return
+            accepted = True
+            print(f"🔌 Serveur de capture connecté: {peer}")
+            writer.write(encode_frame(MSG_HELLO, job_id, self.info()))
+            await writer.drain()
+            while True:
+                msg_type, job_id, meta, data = await read_frame(reader)
+                if msg_type in (MSG_HELLO, MSG_PING):
+                    if msg_type == MSG_HELLO:
+                        self.check_hello(msg_type, meta)
+                    reply = MSG_HELLO if msg_type == MSG_HELLO else MSG_PONG
+                    async with write_lock:
+                        writer.write(encode_frame(reply, job_id, self.info()))
+                        await writer.drain()
+                elif msg_type in (MSG_TRANSCRIBE, MSG_TRANSLATE):
+                    task = asyncio.create_task(self._process(msg_type, job_id, meta, data, writer, write_lock))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except HandshakeRejected as e:
+            print(f"⛔ Connexion fermée ({peer}): {e}")
+        except Exception as e:
+            print(f"❌ Erreur nœud d'inférence ({peer}): {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            if accepted:
+                print(f"🔌 Serveur de capture déconnecté: {peer}")
+
+
+async def serve_node(host, port, node):
+    server = await asyncio.start_server(node.handle_client, host, port)
+    print(f"🧠 Nœud d'inférence prêt sur {host}:{port}")
+    if not node.token and host not in ("127.0.0.1", "localhost", "::1"):
+        print(f"⚠️ Nœud accessible sur le réseau sans jeton : définissez {TOKEN_ENV}")
+    async with server:
+        await server.serve_forever()
+
+
+# ----------------------
+# Client (côté main.py)
+# ----------------------
+class _NodeConnection:
+    def __init__(self, address):
+        self.address = address
+        self.host, self.port = parse_address(address)
+        self.reader = None
+        self.writer = None
+        # Créé à la connexion, dans l'event loop du serveur (le pool est construit à l'import)
+        self.write_lock = None
+        self.pending = {}   # job_id -> future
+        self.healthy = False
+        self.info = {}
+        self.last_pong = 0.0
+        self.latency = None
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.reader_task = None
+
+    @property
+    def load(self):
+        return len(self.pending)
+
+
+class RemoteInferencePool:
+    """Répartit transcriptions et traductions sur les nœuds d'inférence disponibles"""
+
+    def __init__(self, addresses, request_timeout=REQUEST_TIMEOUT, token=None):
+        self.nodes = [_NodeConnection(address) for address in addresses]
+        self.request_timeout = request_timeout
+        self.token = os.getenv(TOKEN_ENV, "") if token is None else token
+        self.job_id = 0
+        self.running = False
+        self.parked = False
+
+    # --- Cycle de vie ---
+    def start(self, loop=None):
+        self.running = True
+        print(f"🌐 Nœuds d'inférence distants: {', '.join(n.address for n in self.nodes)}")
+
+    def stop(self):
+        self.running = False
+        for node in self.nodes:
+            self._disconnect(node, "arrêt")
+
+    def park(self, parked=True):
+        """Pipeline inactif : connexions conservées, health checks espacés"""
+        self.parked = parked
+
+    async def supervise(self, interval=HEALTH_INTERVAL):
+        """Connexion, reconnexion et health checks (ping) des nœuds"""
+        while self.running:
+            await asyncio.gather(*(self._check(node) for node in self.nodes), return_exceptions=True)
+            await asyncio.sleep(PARKED_INTERVAL if self.parked else interval)
+
+    async def _check(self, node):
+        if node.writer is None:
+            if time.monotonic() < node.next_attempt:
+                return
+            await self._connect(node)
+            return
+        try:
+            started = time.monotonic()
+            node.info = await self._request(node, MSG_PING, timeout=HEALTH_TIMEOUT)
+            node.latency = time.monotonic() - started
+            node.last_pong = time.monotonic()
+            if not node.healthy:
+                print(f"✅ Nœud {node.address} de nouveau disponible")
+            node.healthy = True
+        except Exception as e:
+            self._disconnect(node, f"health check: {e}")
+
+    async def _connect(self, node):
+        node.write_lock = asyncio.Lock()
+        try:
+            node.reader, node.writer = await asyncio.wait_for(
+                asyncio.open_connection(node.host, node.port), timeout=HEALTH_TIMEOUT)
+            node.reader_task = asyncio.create_task(self._read_loop(node))
+            node.info = await self._request(node, MSG_HELLO, {"version": PROTOCOL_VERSION, "token": self.token},
+                                            timeout=HEALTH_TIMEOUT)
+            if node.info.get("version") != PROTOCOL_VERSION:
+                raise HandshakeRejected(f"version du protocole {node.info.get('version')} (attendue : {PROTOCOL_VERSION})")
+            node.healthy = True
+            node.failures = 0
+            node.last_pong = time.monotonic()
+            print(f"✅ Nœud {node.address} connecté (modèle {node.info.get('model')})")
+        except Exception as e:
+            node.failures += 1
+            if isinstance(e, HandshakeRejected):
+                print(f"⛔ Nœud {node.address}: {e}")
+            self._disconnect(node, f"connexion: {e}")
+
+    def _disconnect(self, node, reason):
+        if node.healthy:
+            print(f"⚠️ Nœud {node.address} indisponible ({reason})")
+        node.healthy = False
+        node.next_attempt = time.monotonic() + min(RECONNECT_DELAY * max(1, node.failures), 60)
+        if node.writer:
+            node.writer.close()
+        node.reader = node.writer = None
+        if node.reader_task and node.reader_task is not asyncio.current_task():
+            node.reader_task.cancel()
+        node.reader_task = None
+        for future in node.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Nœud {node.address} déconnecté"))
+        node.pending.clear()
+
+    async def _read_loop(self, node):
+        try:
+            while True:
+                msg_type, job_id, meta, data = await read_frame(node.reader)
+                future = node.pending.pop(job_id, None)
+                if future is None or future.done():
+                    continue
+                if msg_type == MSG_ERROR and meta.get("rejected"):
+                    future.set_exception(HandshakeRejected(meta.get("error")))
+                elif msg_type == MSG_ERROR:
+                    future.set_exception(RuntimeError(meta.get("error", "erreur distante")))
+                else:
+                    future.set_result(meta)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._disconnect(node, str(e) or type(e).__name__)
+
+    async def _request(self, node, msg_type, meta=None, data=b"", timeout=None):
+        self.job_id = (self.job_id + 1) % 0xFFFFFFFF
+        job_id = self.job_id
+        future = asyncio.get_running_loop().create_future()
+        node.pending[job_id] = future
+        try:
+            async with node.write_lock:
+                node.writer.write(encode_frame(msg_type, job_id, meta, data))
+                await node.writer.drain()
+            return await asyncio.wait_for(future, timeout or self.request_timeout)
+        finally:
+            node.pending.pop(job_id, None)
+
+    # --- Répartition ---
+    def _candidates(self):
+        healthy = [n for n in self.nodes if n.healthy and n.writer is not None]
+        return sorted(healthy, key=lambda n: (n.load, n.latency or 0.0))
+
+    async def _dispatch(self, msg_type, meta, data=b""):
+        errors = []
+        for node in self._candidates():
+            try:
+                return await self._request(node, msg_type, meta, data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                errors.append(f"{node.address}: {e}")
+                if not isinstance(e, RuntimeError):
+                    self._disconnect(node, str(e) or type(e).__name__)
+        raise RemoteInferenceUnavailable("; ".join(errors) or "aucun nœud disponible")
+
+    async def transcribe(self, audio, language, candidates=None, session_language=None, min_confidence=0.0):
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        meta = {"language": language}
+        if candidates:
+            meta["candidates"] = list(candidates)
+        if session_language:
+            meta["session_language"] = session_language
+            meta["min_confidence"] = min_confidence
+        return await self._dispatch(MSG_TRANSCRIBE, meta, audio.tobytes())
+
+    async def translate(self, text, source_language):
+        result = await self._dispatch(MSG_TRANSLATE, {"text": text, "source_language": source_language})
+        # None : pas de traducteur pour cette langue sur le nœud
+        return result.get("text")
+
+    def status(self):
+        return [
+            {"address": n.address, "healthy": n.healthy, "in_flight": n.load,
+             "latency_ms": round(n.latency * 1000, 1) if n.latency is not None else None,
+             "served": n.info.get("served"), "model": n.info.get("model")}
+            for n in self.nodes
+        ]
+
+
+# ----------------------
+# CLI
+# ----------------------
+def load_defaults():
+    defaults = {"model_name": "small", "spoken_language": "en", "target_language": "fr", "use_gpu": False,
+                "mmap_weights": False, "cpu_weights_precision": "fp32", "translator_backend": "auto"}
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                defaults.update(json.load(f))
+        except Exception as e:
+            print(f"⚠️ Config ignorée: {e}")
+    return defaults
+
+
+def spawn_local_nodes(count, base_port, extra_args, token=""):
+    """Lance plusieurs nœuds sur cette machine (tests de répartition sur une seule box)"""
+    processes = []
+    # Jeton transmis par l'environnement : il n'apparaît pas dans la ligne de commande (ps)
+    env = {**os.environ, TOKEN_ENV: token} if token else None
+    for i in range(count):
+        port = base_port + i
+        cmd = [sys.executable, os.path.abspath(__file__), "--port", str(port)] + extra_args
+        processes.append(subprocess.Popen(cmd, env=env))
+        print(f"🚀 Nœud local lancé sur le port {port}")
+    addresses = ", ".join(f'"127.0.0.1:{base_port + i}"' for i in range(count))
+    print(f"💡 Dans config.json : \"inference_nodes\": [{addresses}]")
+    try:
+        for proc in processes:
+            proc.wait()
+    except KeyboardInterrupt:
+        print("\n🛑 Arrêt des nœuds locaux")
+        for proc in processes:
+            proc.terminate()
+        for proc in processes:
+            proc.wait()
+
+
+def main():
+    defaults = load_defaults()
+    parser = argparse.ArgumentParser(description="Nœud d'inférence Live Translation (Whisper + MarianMT)")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="interface d'écoute (0.0.0.0 pour le réseau local, avec un jeton)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model", default=defaults["model_name"])
+    parser.add_argument("--device", default=None, help="cpu, cuda ou mps (auto si absent)")
+    parser.add_argument("--spoken", default=defaults["spoken_language"])
+    parser.add_argument("--target", default=defaults["target_language"])
+    parser.add_argument("--threads", type=int, default=0, help="threads torch (0 = défaut)")
+    parser.add_argument("--precision", default=defaults["cpu_weights_precision"], choices=("fp32", "bf16", "int8"),
+                        help="stockage des poids sur CPU")
+    parser.add_argument("--translation-precision", default=defaults.get("translation_precision", "auto"),
+                        choices=("auto", "fp32", "bf16", "int8"),
+                        help="précision de MarianMT (auto : int8 sur CPU sauf --precision bf16)")
+    parser.add_argument("--mmap", action="store_true", default=defaults["mmap_weights"],
+                        help="poids safetensors mappés (pages partagées entre nœuds locaux)")
+    parser.add_argument("--translator-backend", default=defaults["translator_backend"],
+                        choices=("auto", "torch", "torch-int8", "ctranslate2", "onnx"))
+    parser.add_argument("--beam-size", type=int, default=defaults.get("translator_beam_size", 1),
+                        help="beam de traduction (1 = greedy)")
+    parser.add_argument("--token", default=os.getenv(TOKEN_ENV, ""),
+                        help=f"jeton partagé exigé des clients (défaut : ${TOKEN_ENV})")
+    parser.add_argument("--spawn", type=int, default=0, help="lance N nœuds locaux sur des ports consécutifs")
+    args = parser.parse_args()
+
+    if args.spawn:
+        extra = ["--host", args.host, "--model", args.model, "--spoken", args.spoken,
+                 "--target", args.target, "--threads", str(args.threads), "--precision", args.precision,
+                 "--translation-precision", args.translation_precision, "--translator-backend", args.translator_backend, "--beam-size", str(args.beam_size)]
+        if args.mmap:
+            extra.append("--mmap")
+        if args.device:
+            extra += ["--device", args.device]
+        spawn_local_nodes(args.spawn, args.port, extra, args.token)
+        return True
+
+    device = args.device
+    if device is None:
+        from inference import detect_gpu_device
+        device = detect_gpu_device() if defaults.get("use_gpu") else "cpu"
+    from translation_engines import TranslationSettings
+    settings = TranslationSettings.from_config({**defaults, "translator_beam_size": args.beam_size})
+    node = InferenceNode(args.model, device, args.spoken, args.target, args.threads, args.mmap, args.precision,
+                         args.translator_backend, settings, args.token, args.translation_precision)
+    try:
+        asyncio.run(serve_node(args.host, args.port, node))
+    except KeyboardInterrupt:
+        print("\n🛑 Nœud d'inférence arrêté")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,114 @@
+"""
+Transcription spéculative à deux modèles
+- Un petit modèle ("draft", ex. tiny) produit des sous-titres provisoires immédiatement
+- Le modèle principal re-décode le même audio en arrière-plan ; si le texte diffère,
+  une correction remplace le sous-titre (et sa traduction) par identifiant de segment
+- Pas de correction quand les deux transcriptions concordent, ni de re-décodage
+  quand le brouillon est déjà très confiant
+"""
+
+import asyncio
+from difflib import SequenceMatcher
+
+from transcript_filter import normalize
+
+DEFAULT_AGREEMENT = 0.9
+DEFAULT_SKIP_LOGPROB = -0.2
+DEFAULT_MAX_PENDING = 4
+
+
+def texts_agree(a: str, b: str, threshold=DEFAULT_AGREEMENT) -> bool:
+    """Similarité au niveau des mots (casse et ponctuation ignorées)"""
+    words_a = normalize(a).replace(".", " ").split()
+    words_b = normalize(b).replace(".", " ").split()
+    if words_a == words_b:
+        return True
+    return SequenceMatcher(None, words_a, words_b).ratio() >= threshold
+
+
+def is_confident(result, min_logprob=DEFAULT_SKIP_LOGPROB) -> bool:
+    """Brouillon dont tous les segments ont un avg_logprob au-dessus du seuil"""
+    if min_logprob is None:
+        return False
+    logprobs = [s.get("avg_logprob") for s in result.get("segments") or []]
+    return bool(logprobs) and all(lp is not None and lp >= min_logprob for lp in logprobs)
+
+
+class SpeculativeVerifier:
+    """
+    File de re-décodage par le modèle principal.
+    verify(audio, language) -> résultat Whisper ; prepare(result, context) -> texte passé par le même
+    filtrage que le brouillon (context : état du filtre au moment du brouillon) ;
+    on_correction(seg_id, text, result, language) est appelé quand ce texte diffère du brouillon.
+    """
+
+    def __init__(self, verify, on_correction, prepare=None, agreement=DEFAULT_AGREEMENT,
+                 skip_logprob=DEFAULT_SKIP_LOGPROB, max_pending=DEFAULT_MAX_PENDING):
+        self.verify = verify
+        self.on_correction = on_correction
+        self.prepare = prepare or (lambda result, context: result.get("text", "").strip())
+        self.agreement = agreement
+        self.skip_logprob = skip_logprob
+        self.max_pending = max_pending
+        # Créée à la première utilisation, dans l'event loop du serveur (le vérificateur est construit à l'import)
+        self._queue = None
+        # Incrémenté par clear() : une vérification en cours lors d'un arrêt est ignorée
+        self.generation = 0
+        self.stats = {"submitted": 0, "confident": 0, "agreed": 0, "corrected": 0, "empty": 0,
+                      "backlog_dropped": 0, "discarded": 0, "errors": 0}
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        return self._queue
+
+    def submit(self, seg_id, audio, draft_result, draft_text, language, context=None):
+        self.stats["submitted"] += 1
+        if is_confident(draft_result, self.skip_logprob):
+            self.stats["confident"] += 1
+            return
+        if self.queue.full():
+            # Le modèle principal ne suit pas : le plus ancien sous-titre reste provisoire
+            self.queue.get_nowait()
+            self.stats["backlog_dropped"] += 1
+        self.queue.put_nowait((self.generation, seg_id, audio, draft_text, language, context))
+
+    def clear(self):
+        """Arrêt de la transcription : plus aucune correction pour les segments déjà émis"""
+        self.generation += 1
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.stats["discarded"] += 1
+
+    async def run(self):
+        while True:
+            generation, seg_id, audio, draft_text, language, context = await self.queue.get()
+            try:
+                result = await self.verify(audio, language)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ Vérification du segment #{seg_id} impossible: {e}")
+                continue
+            if generation != self.generation:
+                self.stats["discarded"] += 1
+                continue
+            text = self.prepare(result, context)
+            if not text:
+                # Tout filtré côté modèle principal : le brouillon reste affiché
+                self.stats["empty"] += 1
+                continue
+            if texts_agree(draft_text, text, self.agreement):
+                self.stats["agreed"] += 1
+                continue
+            self.stats["corrected"] += 1
+            try:
+                await self.on_correction(seg_id, text, result, language)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ Correction du segment #{seg_id} impossible: {e}")
+
+    def status(self):
+        return {"pending": self._queue.qsize() if self._queue else 0, **self.stats}
@@ -2,7 +2,7 @@
 """
 Script de démarrage complet du serveur Live Translation
 - Backend Python (Socket.IO)
-- Frontend Next.js
+- Frontend Next.js exporté, servi par le backend (pas de serveur Node)
 - Ouverture automatique des pages dans le navigateur
 Compatible Windows / macOS / Linux
 """
@@ -10,15 +10,12 @@ Compatible Windows / macOS / Linux
 import subprocess
 import sys
 import os
-import time
 import platform
 import signal
-from pathlib import Path
 
 # Configuration
-FRONTEND_PORT = 3000
 BACKEND_PORT = 8000
-FRONTEND_DIR = "live-translation-front"
+FRONTEND_BUILD = os.path.join("live-translation-front", "out", "index.html")
 BACKEND_SCRIPT = "main.py"
 
 # ==========================
@@ -39,6 +36,14 @@ def check_python_env():
     print("✅ Environnement virtuel trouvé")
     return True
 
+def check_frontend_build():
+    if not os.path.exists(FRONTEND_BUILD):
+        print("⚠️ Build du front non trouvé, seule l'API sera disponible")
+        print("💡 Exécutez d'abord: python build_nextjs.py")
+        return False
+    print("✅ Build du front trouvé")
+    return True
+
 # ==========================
 # Lancement des serveurs
 # ==========================
@@ -51,31 +56,6 @@ def start_backend():
     # On lance le backend en subprocess pour pouvoir le kill proprement
     return subprocess.Popen([python_cmd, BACKEND_SCRIPT])
 
-    """Démarre le frontend Next.js"""
-    print("🚀 Lancement du front Next.js...")
-
-    try:
-        if platform.system() == "Windows":
-            # Sur Windows, utiliser le npm.cmd
-            npm_cmd = "npm.cmd run start"
-            next_process = subprocess.Popen(
-                npm_cmd,
-                cwd=FRONTEND_DIR,
-                shell=True
-            )
-        else:
-            # macOS / Linux
-            next_process = subprocess.Popen(
-                ["npm", "run", "start"],
-                cwd=FRONTEND_DIR,
-                preexec_fn=os.setsid
-            )
-        print("✅ Serveur Next.js démarré")
-        return next_process
-    except FileNotFoundError:
-        print("❌ npm non trouvé. Assurez-vous qu'il est installé et dans votre PATH")
-        return None
-
 # ==========================
 # Kill propre des processus
 # ==========================
@@ -97,16 +77,17 @@ def main():
     # Vérifications préliminaires
     if not check_python_env():
         return False
+    check_frontend_build()
 
     # Affichage des URLs
     print("\n" + "=" * 50)
-    print(f"📱 Interface principale: http://localhost:{FRONTEND_PORT}")
-    print(f"🎬 Interface sous-titres: http://localhost:{FRONTEND_PORT}/captions")
+    print(f"📱 Interface principale: http://localhost:{BACKEND_PORT}")
+    print(f"🎬 Interface sous-titres: http://localhost:{BACKEND_PORT}/captions")
     print(f"🔌 Backend Socket.IO: http://localhost:{BACKEND_PORT}")
     print("=" * 50)
     print("💡 Appuyez sur Ctrl+C pour arrêter\n")
 
-    # Démarrage backend + frontend
+    # Démarrage du backend (qui sert aussi le front)
     backend_proc = start_backend()
 
     try:
@@ -0,0 +1,190 @@
+"""
+Service du front Next.js exporté (live-translation-front/out) directement par FastAPI
+- Variantes précompressées (.br / .gz) choisies selon Accept-Encoding
+- Cache long (immutable) pour les fichiers hashés de _next/static, revalidation pour le reste
+- ETags calculés une fois au démarrage, réponses 304 sur If-None-Match
+"""
+
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+FRONT_OUT_DIR = Path("live-translation-front") / "out"
+
+COMPRESSIBLE_EXTENSIONS = {".html", ".js", ".mjs", ".css", ".json", ".svg", ".txt", ".map", ".xml", ".ico", ".webmanifest"}
+MIN_COMPRESS_SIZE = 1024
+HASHED_PREFIX = "_next/static/"
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+
+# Ordre de préférence des encodages
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/javascript", ".mjs")
+mimetypes.add_type("text/css", ".css")
+
+
+# ----------------------
+# Négociation Accept-Encoding
+# ----------------------
+def parse_accept_encoding(header):
+    """'br;q=0, gzip;q=0.8, *' -> {"br": 0.0, "gzip": 0.8, "*": 1.0}"""
+    weights = {}
+    for item in header.split(","):
+        name, *params = item.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+    return weights
+
+
+def choose_encoding(header, available):
+    """Encodage disponible de plus haut q (q=0 : refusé) ; à égalité, l'ordre d'ENCODINGS"""
+    weights = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for candidate, _ in ENCODINGS:
+        if candidate not in available:
+            continue
+        q = weights.get(candidate, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = candidate, q
+    return best
+
+
+# ----------------------
+# Précompression (appelée par build_nextjs.py)
+# ----------------------
+def precompress_directory(out_dir=FRONT_OUT_DIR):
+    """Écrit les variantes .gz (et .br si brotli est installé) à côté des fichiers compressibles"""
+    out_dir = Path(out_dir)
+    count = 0
+    for path in out_dir.rglob("*"):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_EXTENSIONS:
+            continue
+        data = path.read_bytes()
+        if len(data) < MIN_COMPRESS_SIZE:
+            continue
+        gz_data = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(gz_data) < len(data):
+            path.with_name(path.name + ".gz").write_bytes(gz_data)
+        if BROTLI_AVAILABLE:
+            br_data = brotli.compress(data, quality=11)
+            if len(br_data) < len(data):
+                path.with_name(path.name + ".br").write_bytes(br_data)
+        count += 1
+    return count
+
+
+# ----------------------
+# Index des fichiers
+# ----------------------
+def _file_etag(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()[:20]
+
+
+class StaticFrontend:
+    def __init__(self, out_dir=FRONT_OUT_DIR):
+        self.out_dir = Path(out_dir)
+        self.files = {}
+        if self.available:
+            self._build_index()
+
+    @property
+    def available(self):
+        return (self.out_dir / "index.html").exists()
+
+    def _build_index(self):
+        for path in self.out_dir.rglob("*"):
+            if not path.is_file() or path.suffix in (".gz", ".br"):
+                continue
+            rel = path.relative_to(self.out_dir).as_posix()
+            etag = _file_etag(path)
+            variants = {}
+            for encoding, suffix in ENCODINGS:
+                compressed = path.with_name(path.name + suffix)
+                if compressed.exists():
+                    variants[encoding] = compressed
+            self.files[rel] = {
+                "path": path,
+                "etag": etag,
+                "media_type": mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+                "variants": variants,
+                "cache_control": CACHE_IMMUTABLE if rel.startswith(HASHED_PREFIX) else CACHE_REVALIDATE
+            }
+        print(f"🌐 Front statique indexé: {len(self.files)} fichier(s) depuis {self.out_dir}")
+
+    def resolve(self, url_path):
+        """Chemin d'URL -> entrée de l'index (routes Next.js exportées comprises)"""
+        rel = url_path.strip("/")
+        candidates = [rel] if rel else []
+        candidates += [f"{rel}.html" if rel else "index.html", f"{rel}/index.html".lstrip("/")]
+        for candidate in candidates:
+            entry = self.files.get(candidate)
+            if entry:
+                return entry
+        return None
+
+    def response(self, request, url_path):
+        from starlette.responses import FileResponse, Response
+
+        entry = self.resolve(url_path)
+        status_code = 200
+        if entry is None:
+            entry = self.files.get("404.html")
+            if entry is None:
+                return Response(status_code=404)
+            status_code = 404
+
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""), entry["variants"])
+        path = entry["variants"][encoding] if encoding else entry["path"]
+
+        etag = f'"{entry["etag"]}-{encoding}"' if encoding else f'"{entry["etag"]}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": entry["cache_control"],
+            "Vary": "Accept-Encoding"
+        }
+        if status_code == 200 and etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return FileResponse(path, status_code=status_code, media_type=entry["media_type"], headers=headers)
+
+
+def mount_frontend(app, frontend=None):
+    """Ajoute la route catch-all du front ; à appeler après les routes de l'API"""
+    frontend = frontend or StaticFrontend()
+    if not frontend.available:
+        print(f"⚠️ Build du front introuvable ({frontend.out_dir}) — lancez: python build_nextjs.py")
+        return frontend
+
+    from starlette.requests import Request
+
+    @app.get("/{url_path:path}", include_in_schema=False)
+    async def serve_frontend(request: Request, url_path: str = ""):
+        return frontend.response(request, url_path)
+
+    return frontend
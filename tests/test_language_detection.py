@@ -0,0 +1,43 @@
+import pytest
+
+from language_detection import SessionLanguageDetector, choose_transcription_language
+
+
+def test_low_confidence_keeps_session_language():
+    assert choose_transcription_language("fr", 0.4, "en", 0.6) == "en"
+
+
+def test_confident_detection_or_first_detection_is_used():
+    assert choose_transcription_language("fr", 0.9, "en", 0.6) == "fr"
+    assert choose_transcription_language("fr", 0.4, None, 0.6) == "fr"
+
+
+def test_low_confidence_recheck_routes_to_session_language():
+    detector = SessionLanguageDetector(recheck_seconds=60, min_confidence=0.6)
+    detector.observe({"language": "en", "language_probability": 0.95}, now=0.0)
+    # Re-vérification périodique : détection sur ce chunk
+    assert detector.language_for_chunk(now=61.0) is None
+    transcribed = choose_transcription_language("fr", 0.4, detector.language, detector.min_confidence)
+    result = {"language": "fr", "language_probability": 0.4, "transcribed_language": transcribed}
+    assert detector.observe(result, now=61.0) is None
+    # Transcription et traducteur dans la langue de session, nouvelle détection au prochain chunk
+    assert result["transcribed_language"] == detector.language == "en"
+    assert detector.language_for_chunk(now=62.0) is None
+
+
+def test_transcribe_audio_low_confidence_recheck(monkeypatch):
+    pytest.importorskip("whisper")
+    import inference
+
+    calls = []
+
+    class FakeModel:
+        def transcribe(self, audio, task, language, fp16):
+            calls.append(language)
+            return {"text": "hello", "language": language, "segments": []}
+
+    monkeypatch.setattr(inference, "detect_language", lambda model, audio, candidates=None: ("fr", 0.4))
+    result = inference.transcribe_audio(FakeModel(), None, None, session_language="en", min_confidence=0.6)
+    assert calls == ["en"]
+    assert result["language"] == "fr"
+    assert result["transcribed_language"] == "en"
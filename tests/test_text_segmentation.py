@@ -0,0 +1,40 @@
+from text_segmentation import SentenceSegmenter, TranslationCache, is_sentence_complete, split_sentences
+
+
+def test_abbreviations_and_initials_do_not_end_sentences():
+    assert split_sentences("Hello Mr. Smith. I met Dr. Who, e.g. yesterday! J. K. Rowling wrote it.") == [
+        "Hello Mr. Smith.", "I met Dr. Who, e.g. yesterday!", "J. K. Rowling wrote it."]
+    assert not is_sentence_complete("I met Mr.")
+
+
+def test_dotted_acronyms_do_not_end_sentences():
+    assert split_sentences("He served in the U.S. army. Then he left.") == [
+        "He served in the U.S. army.", "Then he left."]
+    assert not is_sentence_complete("He joined the U.S.")
+
+
+def test_french_closing_quotes_stay_with_their_sentence():
+    assert split_sentences("Il a dit « bonjour. » Puis il est parti.") == [
+        "Il a dit « bonjour. »", "Puis il est parti."]
+    assert is_sentence_complete("Il a dit « bonjour. »")
+
+
+def test_segmenter_waits_after_abbreviation():
+    segmenter = SentenceSegmenter(max_wait=10, pause=3)
+    assert segmenter.feed("Hello Mr.", now=0.0) == []
+    assert segmenter.feed("Smith. How are", now=1.0) == ["Hello Mr. Smith."]
+    assert segmenter.pending == "How are"
+
+
+def test_pause_flushes_pending_fragment():
+    segmenter = SentenceSegmenter(max_wait=10, pause=3)
+    assert segmenter.feed("How are", now=0.0) == []
+    assert segmenter.poll(now=2.0) == []
+    assert segmenter.poll(now=3.0) == ["How are"]
+
+
+def test_cache_is_case_sensitive():
+    cache = TranslationCache()
+    cache.put("US", "les États-Unis")
+    assert cache.get("us") is None
+    assert cache.get(" US ") == "les États-Unis"
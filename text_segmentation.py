@@ -0,0 +1,228 @@
+"""
+Segmentation du texte transcrit en phrases avant traduction
+- Regroupe les chunks Whisper (coupés toutes les ~2 s) en phrases complètes
+- Règles : ponctuation finale, pause (silence), attente maximale, longueur maximale
+- Cache des traductions par phrase : une révision ne retraduit que la phrase modifiée
+"""
+
+import re
+import time
+from collections import OrderedDict
+
+# Guillemets / parenthèses fermants après la ponctuation, éventuellement précédés d'une espace (« … »)
+SENTENCE_END_RE = re.compile(r'[.!?…。！？](?:\s*["»”\')\]])*(?=\s)')
+SENTENCE_COMPLETE_RE = re.compile(r'[.!?…。！？](?:\s*["»”\')\]])*$')
+# Sigles à points (U.S., U.K., A.B.C.) : le point final ne termine pas la phrase
+DOTTED_ACRONYM_RE = re.compile(r'[A-Z](?:\.[A-Z])+')
+SOFT_BREAK_RE = re.compile(r'[,;:—–]\s+')
+# Abréviations suivies d'un point qui ne terminent pas une phrase (en minuscules, sans le point final)
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "st", "sr", "jr", "vs", "e.g", "i.e", "cf", "approx", "fig",
+    "mme", "mmes", "mlle", "mlles", "mm", "pr", "ste", "p.ex",
+}
+
+DEFAULT_MAX_WAIT = 6.0       # secondes avant de forcer l'envoi d'une phrase incomplète
+DEFAULT_PAUSE = 3.0          # secondes sans nouveau texte = fin de phrase
+DEFAULT_MAX_CHARS = 220      # au-delà, on coupe sur une virgule ou un espace
+DEFAULT_CACHE_SIZE = 512
+
+
+def _ends_with_abbreviation(text: str) -> bool:
+    """'Mr.', 'Dr.', 'e.g.', sigle ('U.S.'), initiale ('J.', 'M.') : le point ne termine pas la phrase"""
+    words = text.split()
+    if not words or not words[-1].endswith("."):
+        return False
+    token = words[-1][:-1].lstrip('"«“\'([')
+    return (token.lower() in ABBREVIATIONS or (len(token) == 1 and token.isupper())
+            or bool(DOTTED_ACRONYM_RE.fullmatch(token)))
+
+
+def split_sentences(text: str):
+    """Découpe un texte en phrases ; la dernière peut être incomplète"""
+    text = " ".join(text.split())
+    if not text:
+        return []
+    # Coupe après la ponctuation et les guillemets fermants (conservés avec leur phrase)
+    pieces, start = [], 0
+    for match in SENTENCE_END_RE.finditer(text):
+        pieces.append(text[start:match.end()].strip())
+        start = match.end()
+    pieces.append(text[start:].strip())
+    sentences = []
+    for piece in pieces:
+        if not piece:
+            continue
+        if sentences and _ends_with_abbreviation(sentences[-1]):
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def is_sentence_complete(sentence: str) -> bool:
+    sentence = sentence.strip()
+    return bool(SENTENCE_COMPLETE_RE.search(sentence)) and not _ends_with_abbreviation(sentence)
+
+
+class SentenceSegmenter:
+    """Bufferise les transcriptions et restitue les phrases prêtes à traduire"""
+
+    def __init__(self, max_wait=DEFAULT_MAX_WAIT, pause=DEFAULT_PAUSE, max_chars=DEFAULT_MAX_CHARS):
+        self.max_wait = max_wait
+        self.pause = pause
+        self.max_chars = max_chars
+        self.pending = ""
+        self.pending_since = None
+        self.last_text_at = None
+
+    def feed(self, text: str, now=None):
+        """Ajoute le texte d'un chunk et retourne les phrases complètes"""
+        now = time.monotonic() if now is None else now
+        text = text.strip()
+        if not text:
+            return self.poll(now)
+        self.pending = f"{self.pending} {text}".strip() if self.pending else text
+        if self.pending_since is None:
+            self.pending_since = now
+        self.last_text_at = now
+
+        sentences = split_sentences(self.pending)
+        ready = []
+        if sentences and not is_sentence_complete(sentences[-1]):
+            self.pending = sentences.pop()
+        else:
+            self.pending = ""
+        ready.extend(sentences)
+
+        while len(self.pending) > self.max_chars:
+            head, self.pending = self._split_long(self.pending)
+            ready.append(head)
+
+        if not self.pending:
+            self.pending_since = None
+        elif ready:
+            self.pending_since = now
+        return ready + self.poll(now)
+
+    def poll(self, now=None):
+        """Force l'envoi de la phrase en attente si la pause ou l'attente max est dépassée"""
+        if not self.pending:
+            return []
+        now = time.monotonic() if now is None else now
+        if now - self.pending_since >= self.max_wait or now - self.last_text_at >= self.pause:
+            return self.flush()
+        return []
+
+    def mark_pause(self):
+        """Silence détecté côté audio : la phrase en cours est terminée"""
+        return self.flush()
+
+    def flush(self):
+        sentence = self.pending.strip()
+        self.pending = ""
+        self.pending_since = None
+        return [sentence] if sentence else []
+
+    def _split_long(self, text: str):
+        window = text[:self.max_chars]
+        breaks = list(SOFT_BREAK_RE.finditer(window))
+        if breaks:
+            cut = breaks[-1].end()
+        else:
+            cut = window.rfind(" ")
+            if cut <= 0:
+                cut = self.max_chars
+        return text[:cut].strip(), text[cut:].strip()
+
+
+class TranslationCache:
+    """Cache LRU phrase source -> traduction (namespace : langue source quand elle est détectée)"""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(sentence: str, namespace: str = "") -> str:
+        return namespace + "|" + " ".join(sentence.split())
+
+    def get(self, sentence: str, namespace: str = ""):
+        key = self._key(sentence, namespace)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, sentence: str, translation: str, namespace: str = ""):
+        key = self._key(sentence, namespace)
+        self.entries[key] = translation
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def _cacheable(translation) -> bool:
+    """Ni traducteur absent (None) ni erreur : les deux doivent être retentés plus tard"""
+    return translation is not None and not translation.startswith("[TRANSLATION ERROR")
+
+
+def translate_sentences(text: str, translate_fn, cache: TranslationCache, namespace: str = "") -> str:
+    """
+    Traduit un texte phrase par phrase en réutilisant le cache :
+    quand un segment est révisé, seules les phrases modifiées passent par le traducteur.
+    Sans traducteur (translate_fn renvoie None), la phrase source est conservée.
+    """
+    translated = []
+    for sentence in split_sentences(text):
+        cached = cache.get(sentence, namespace)
+        if cached is None:
+            cached = translate_fn(sentence)
+            if _cacheable(cached):
+                cache.put(sentence, cached, namespace)
+        translated.append(sentence if cached is None else cached)
+    return " ".join(translated)
+
+
+async def translate_sentences_async(text: str, translate_coro, cache: TranslationCache, namespace: str = "") -> str:
+    """Variante asynchrone (exécuteur local ou workers d'inférence)"""
+    translated = []
+    for sentence in split_sentences(text):
+        cached = cache.get(sentence, namespace)
+        if cached is None:
+            cached = await translate_coro(sentence)
+            if _cacheable(cached):
+                cache.put(sentence, cached, namespace)
+        translated.append(sentence if cached is None else cached)
+    return " ".join(translated)
+
+
+async def stream_sentences_async(text: str, stream_fn, cache: TranslationCache, namespace: str = ""):
+    """
+    Variante diffusée : produit la traduction cumulée du texte au fil des mots.
+    stream_fn(phrase) est un générateur asynchrone de traductions cumulées de la phrase.
+    """
+    translated = []
+    for sentence in split_sentences(text):
+        cached = cache.get(sentence, namespace)
+        if cached is None:
+            async for partial in stream_fn(sentence):
+                if partial is None:
+                    continue
+                cached = partial
+                yield " ".join(translated + [partial])
+            if cached is None:
+                # Pas de traducteur pour cette langue : phrase source
+                cached = sentence
+                yield " ".join(translated + [cached])
+            elif _cacheable(cached):
+                cache.put(sentence, cached, namespace)
+        else:
+            yield " ".join(translated + [cached])
+        translated.append(cached)
@@ -0,0 +1,191 @@
+"""
+Filtre post-transcription (avant traduction)
+- Segments Whisper peu fiables : no_speech_prob élevé + avg_logprob bas, compression_ratio élevé (boucles)
+- Phrases "fantômes" connues ("Thank you.", "Sous-titres réalisés par...")
+- Répétitions : segment déjà émis récemment, ou chevauchement avec la fin du texte précédent
+"""
+
+import re
+from collections import Counter, deque
+
+DEFAULT_NO_SPEECH_PROB = 0.6
+DEFAULT_LOGPROB = -1.0
+DEFAULT_COMPRESSION_RATIO = 2.4
+DEFAULT_NGRAM = 3
+DEFAULT_HISTORY_WORDS = 80
+
+# Génériques de fin / crédits : jamais prononcés en direct, supprimés partout
+CREDIT_PATTERNS = (
+    "sous-titres réalisés par",
+    "sous-titrage st'",
+    "sous-titrage société radio-canada",
+    "subtitles by the amara.org",
+    "amara.org",
+    "transcribed by",
+    "subtitles by",
+    "untertitel der amazon",
+    "untertitel im auftrag",
+)
+
+# Phrases courtes plausibles en vrai : supprimées seulement quand elles forment tout le segment
+# et que Whisper doute qu'il y ait de la parole
+SUSPICIOUS_PHRASES = (
+    "thank you",
+    "thank you very much",
+    "thanks for watching",
+    "thank you for watching",
+    "please subscribe",
+    "bye",
+    "you",
+    "merci",
+    "merci d'avoir regardé",
+    "merci de votre attention",
+    "abonnez-vous",
+    "...",
+)
+SUSPICIOUS_NO_SPEECH_PROB = 0.2
+
+_PUNCTUATION = re.compile(r"[^\w\s'.-]+")
+
+
+def normalize(text: str) -> str:
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return " ".join(text.split()).strip(" .-")
+
+
+def _words(text: str):
+    return normalize(text).replace(".", " ").split()
+
+
+def _ngrams(words, n):
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def collapse_repeats(text: str) -> str:
+    """
+    'a b c a b c a b c' -> 'a b c' (boucle de décodage à l'intérieur d'un segment).
+    Un mot isolé n'est réduit qu'à partir de trois occurrences ("very very" reste intact).
+    """
+    words = text.split()
+    keys = [normalize(w) for w in words]
+    changed = True
+    while changed:
+        changed = False
+        n = len(keys)
+        for size in range(n // 2, 0, -1):
+            for i in range(n - 2 * size + 1):
+                block = keys[i:i + size]
+                if block != keys[i + size:i + 2 * size]:
+                    continue
+                if size == 1 and keys[i + 2:i + 3] != block:
+                    continue
+                del words[i + size:i + 2 * size]
+                del keys[i + size:i + 2 * size]
+                changed = True
+                break
+            if changed:
+                break
+    return " ".join(words)
+
+
+class TranscriptFilter:
+    def __init__(self, no_speech_prob=DEFAULT_NO_SPEECH_PROB, logprob=DEFAULT_LOGPROB,
+                 compression_ratio=DEFAULT_COMPRESSION_RATIO, extra_phrases=None,
+                 ngram=DEFAULT_NGRAM, history_words=DEFAULT_HISTORY_WORDS):
+        self.no_speech_prob = no_speech_prob
+        self.logprob = logprob
+        self.compression_ratio = compression_ratio
+        self.suspicious = {normalize(p) for p in SUSPICIOUS_PHRASES}
+        self.credits = tuple(normalize(p) for p in CREDIT_PATTERNS) + tuple(normalize(p) for p in extra_phrases or ())
+        self.ngram = ngram
+        self.history = deque(maxlen=history_words)
+        self.stats = Counter()
+
+    def reset(self):
+        self.history.clear()
+
+    def context(self):
+        """Instantané de l'historique, pour refiltrer plus tard un re-décodage du même audio"""
+        return list(self.history)
+
+    def segment_reason(self, segment):
+        """Raison de suppression d'un segment, ou None s'il est conservé"""
+        text = normalize(segment.get("text") or "")
+        if not text:
+            return "empty"
+        no_speech = segment.get("no_speech_prob")
+        logprob = segment.get("avg_logprob")
+        compression = segment.get("compression_ratio")
+        # Même règle que Whisper pour ignorer un segment silencieux
+        if no_speech is not None and logprob is not None and no_speech > self.no_speech_prob and logprob < self.logprob:
+            return "no_speech"
+        if compression is not None and compression > self.compression_ratio:
+            return "compression"
+        if any(pattern in text for pattern in self.credits):
+            return "phrase"
+        if text in self.suspicious and (no_speech is None or no_speech >= SUSPICIOUS_NO_SPEECH_PROB):
+            return "phrase"
+        return None
+
+    def _dedupe(self, text: str, history=None):
+        """Supprime un segment déjà émis récemment, ou rogne le début qui répète la fin de l'historique"""
+        words = text.split()
+        normalized = _words(text)
+        if not normalized:
+            return ""
+        history = list(self.history) if history is None else history
+        if len(normalized) >= self.ngram and history:
+            grams = _ngrams(normalized, self.ngram)
+            if grams and grams <= _ngrams(history, self.ngram):
+                return ""
+        elif normalized == history[-len(normalized):]:
+            return ""
+        # Chevauchement chunk précédent / chunk courant (au moins `ngram` mots)
+        longest = 0
+        for size in range(min(len(normalized), len(history)), self.ngram - 1, -1):
+            if normalized[:size] == history[-size:]:
+                longest = size
+                break
+        if longest and len(words) == len(normalized):
+            return " ".join(words[longest:])
+        return text
+
+    def apply(self, result, dedupe=True, context=None):
+        """
+        Retourne le texte à traduire (éventuellement vide) et la liste des raisons de suppression.
+        Met à jour l'historique avec le texte conservé.
+        dedupe=False : filtrage par segment uniquement.
+        context (voir context()) : re-décodage d'un audio déjà transcrit, dédoublonné contre
+        l'historique de l'époque ; ni l'historique ni les compteurs ne sont modifiés.
+        """
+        segments = result.get("segments") or [{"text": result.get("text", "")}]
+        kept = []
+        reasons = []
+        for segment in segments:
+            reason = self.segment_reason(segment)
+            if reason:
+                if reason != "empty":
+                    reasons.append(reason)
+                continue
+            kept.append(collapse_repeats((segment.get("text") or "").strip()))
+
+        text = " ".join(t for t in kept if t)
+        if context is not None:
+            return (self._dedupe(text, context) if text else "").strip(), reasons
+        if not dedupe:
+            for reason in reasons:
+                self.stats[reason] += 1
+            return text.strip(), reasons
+        deduped = self._dedupe(text) if text else ""
+        if text and not deduped:
+            reasons.append("repeat")
+        elif deduped != text:
+            reasons.append("overlap")
+        for reason in reasons:
+            self.stats[reason] += 1
+        self.stats["kept" if deduped else "dropped"] += 1
+        self.history.extend(_words(deduped))
+        return deduped.strip(), reasons
+
+    def status(self):
+        return dict(self.stats)
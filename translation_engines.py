@@ -0,0 +1,334 @@
+"""
+Moteurs de traduction MarianMT
+- torch        : PyTorch (fp32 / bf16 / mmap selon memory_policy)
+- torch-int8   : PyTorch avec quantification dynamique int8 des Linear (CPU)
+- ctranslate2  : conversion CTranslate2 int8 (si le paquet ctranslate2 est installé)
+- onnx         : export ONNX Runtime quantifié int8 (si optimum + onnxruntime sont installés)
+Tous partagent les réglages de décodage : largeur de beam (1 = greedy), longueur de sortie
+proportionnelle à l'entrée. En greedy, la sortie peut être diffusée au fil des tokens (stream).
+"""
+
+import os
+import shutil
+import threading
+from pathlib import Path
+
+ENGINE_CACHE_DIR = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "live-translation"
+
+BACKENDS = ("torch", "torch-int8", "ctranslate2", "onnx")
+AUTO_PRECISION = "auto"
+MAX_LENGTH = 512
+
+DEFAULT_BEAM_SIZE = 1
+DEFAULT_LENGTH_RATIO = 1.5
+DEFAULT_LENGTH_MARGIN = 10
+
+
+class TranslationSettings:
+    """Réglages de décodage ; beam_size=1 = greedy (mode direct)"""
+
+    def __init__(self, beam_size=DEFAULT_BEAM_SIZE, length_ratio=DEFAULT_LENGTH_RATIO,
+                 length_margin=DEFAULT_LENGTH_MARGIN, max_length=MAX_LENGTH):
+        self.beam_size = max(1, int(beam_size))
+        self.length_ratio = length_ratio
+        self.length_margin = length_margin
+        self.max_length = max_length
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            beam_size=config.get("translator_beam_size", DEFAULT_BEAM_SIZE),
+            length_ratio=config.get("translator_length_ratio", DEFAULT_LENGTH_RATIO),
+            length_margin=config.get("translator_length_margin", DEFAULT_LENGTH_MARGIN)
+        )
+
+    def as_dict(self):
+        return {"beam_size": self.beam_size, "length_ratio": self.length_ratio,
+                "length_margin": self.length_margin, "max_length": self.max_length}
+
+    def max_new_tokens(self, input_tokens):
+        return min(self.max_length, int(input_tokens * self.length_ratio) + self.length_margin)
+
+
+def _installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def translator_precision(config):
+    """
+    Précision de MarianMT : translation_precision si elle est explicite, sinon cpu_weights_precision
+    s'il n'est pas fp32 (valeur par défaut), sinon "auto" (int8 dynamique sur CPU).
+    """
+    precision = config.get("translation_precision") or AUTO_PRECISION
+    if precision != AUTO_PRECISION:
+        return precision
+    weights = config.get("cpu_weights_precision") or "fp32"
+    return weights if weights != "fp32" else AUTO_PRECISION
+
+
+def _torch_backend(device, precision):
+    return "torch-int8" if device == "cpu" and precision in (AUTO_PRECISION, "int8") else "torch"
+
+
+def select_backend(backend, device="cpu", precision=AUTO_PRECISION):
+    """
+    (moteur, raison). 'auto' : CTranslate2, puis ONNX Runtime (CPU), puis PyTorch :
+    int8 dynamique sur CPU, sauf si une précision fp32 / bf16 est demandée explicitement.
+    """
+    if backend and backend != "auto":
+        return backend, "configured"
+    if _installed("ctranslate2"):
+        return "ctranslate2", "auto: ctranslate2 installed"
+    if device == "cpu" and _installed("onnxruntime") and _installed("optimum.onnxruntime"):
+        return "onnx", "auto: onnxruntime installed"
+    return _torch_backend(device, precision), "auto: ctranslate2/onnxruntime not installed"
+
+
+def resolve_backend(backend, device="cpu", precision=AUTO_PRECISION):
+    return select_backend(backend, device, precision)[0]
+
+
+def _cache_dir(kind, model_name):
+    return ENGINE_CACHE_DIR / kind / model_name.replace("/", "--")
+
+
+def group_words(pieces):
+    """
+    Regroupe des fragments de texte décodés en mises à jour par mot :
+    produit le texte cumulé jusqu'au dernier mot complet, puis le texte final.
+    """
+    text = ""
+    emitted = ""
+    for piece in pieces:
+        text += piece
+        boundary = text.rstrip().rfind(" ")
+        words = text[:boundary].strip() if boundary > 0 else ""
+        if words and words != emitted:
+            emitted = words
+            yield emitted
+    if text.strip() and text.strip() != emitted:
+        yield text.strip()
+
+
+# ----------------------
+# Moteurs
+# ----------------------
+class TranslatorEngine:
+    backend = None
+    backend_reason = None
+
+    def __init__(self, model_name, device="cpu", settings=None):
+        from transformers import MarianTokenizer
+        self.model_name = model_name
+        self.device = device
+        self.settings = settings or TranslationSettings()
+        self.tokenizer = MarianTokenizer.from_pretrained(model_name)
+
+    def translate(self, text: str) -> str:
+        try:
+            return self._translate(text)
+        except Exception as e:
+            return f"[TRANSLATION ERROR: {e}]"
+
+    def _translate(self, text: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, text: str):
+        """Textes cumulés mot par mot, le dernier étant la traduction complète"""
+        if self.settings.beam_size > 1:
+            # Le beam search ne connaît sa meilleure hypothèse qu'à la fin
+            yield self.translate(text)
+            return
+        try:
+            yield from group_words(self._stream_pieces(text))
+        except Exception as e:
+            yield f"[TRANSLATION ERROR: {e}]"
+
+    def _stream_pieces(self, text: str):
+        yield self._translate(text)
+
+    def _generate_streamed(self, model, inputs):
+        """generate() sur un thread dédié, fragments lus via TextIteratorStreamer"""
+        from transformers import TextIteratorStreamer
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        errors = []
+
+        def generate():
+            try:
+                model.generate(**inputs, num_beams=1, do_sample=False, streamer=streamer,
+                               max_new_tokens=self.settings.max_new_tokens(inputs["input_ids"].shape[1]))
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        thread = threading.Thread(target=generate, name="translation-stream", daemon=True)
+        thread.start()
+        try:
+            yield from streamer
+        finally:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+
+class TorchMarianEngine(TranslatorEngine):
+    backend = "torch"
+
+    def __init__(self, model_name, device="cpu", settings=None, mmap_weights=False, precision="fp32"):
+        super().__init__(model_name, device, settings)
+        from transformers import MarianMTModel
+        self.model = None
+        if precision == "int8" and device == "cpu":
+            self.backend = "torch-int8"
+        if device == "cpu" and (mmap_weights or precision != "fp32"):
+            try:
+                from memory_policy import load_marian_lean
+                self.model = load_marian_lean(model_name, precision, mmap_weights)
+            except Exception as e:
+                self.backend = "torch"
+                print(f"⚠️ Chargement économe du traducteur impossible: {e}\nFallback au chargement standard")
+        if self.model is None:
+            self.model = MarianMTModel.from_pretrained(model_name).to(device)
+        self.model.eval()
+
+    def _translate(self, text: str) -> str:
+        import torch
+        inputs = self.tokenizer(text, return_tensors="pt", truncation=True,
+                                max_length=self.settings.max_length).to(self.device)
+        with torch.inference_mode():
+            translated_tokens = self.model.generate(
+                **inputs,
+                num_beams=self.settings.beam_size,
+                do_sample=False,
+                max_new_tokens=self.settings.max_new_tokens(inputs["input_ids"].shape[1])
+            )
+        return self.tokenizer.decode(translated_tokens[0], skip_special_tokens=True)
+
+    def _stream_pieces(self, text: str):
+        inputs = self.tokenizer(text, return_tensors="pt", truncation=True,
+                                max_length=self.settings.max_length).to(self.device)
+        # generate() est déjà en no_grad sur son propre thread
+        yield from self._generate_streamed(self.model, inputs)
+
+
+class CTranslate2Engine(TranslatorEngine):
+    backend = "ctranslate2"
+
+    def __init__(self, model_name, device="cpu", settings=None, threads=0):
+        super().__init__(model_name, device, settings)
+        import ctranslate2
+        compute_type = "int8_float16" if device == "cuda" else "int8"
+        path = _cache_dir("ct2", f"{model_name}-int8")
+        if not (path / "model.bin").exists():
+            print(f"🗜️ Conversion de {model_name} pour CTranslate2 (int8)...")
+            converter = ctranslate2.converters.TransformersConverter(model_name)
+            converter.convert(str(path), quantization="int8", force=True)
+        self.translator = ctranslate2.Translator(
+            str(path), device="cuda" if device == "cuda" else "cpu",
+            compute_type=compute_type, inter_threads=1, intra_threads=threads or 0)
+
+    def _translate(self, text: str) -> str:
+        ids = self.tokenizer.encode(text, truncation=True, max_length=self.settings.max_length)
+        tokens = self.tokenizer.convert_ids_to_tokens(ids)
+        result = self.translator.translate_batch(
+            [tokens],
+            beam_size=self.settings.beam_size,
+            max_decoding_length=self.settings.max_new_tokens(len(ids)),
+            max_input_length=self.settings.max_length
+        )[0]
+        output = result.hypotheses[0]
+        return self.tokenizer.decode(self.tokenizer.convert_tokens_to_ids(output), skip_special_tokens=True)
+
+    def _stream_pieces(self, text: str):
+        ids = self.tokenizer.encode(text, truncation=True, max_length=self.settings.max_length)
+        step_results = self.translator.generate_tokens(
+            self.tokenizer.convert_ids_to_tokens(ids),
+            max_decoding_length=self.settings.max_new_tokens(len(ids))
+        )
+        # Décodage cumulatif : les tokens SentencePiece ne se décodent pas isolément
+        output_ids = []
+        decoded = ""
+        for step in step_results:
+            output_ids.append(step.token_id)
+            text_so_far = self.tokenizer.decode(output_ids, skip_special_tokens=True)
+            if text_so_far.startswith(decoded):
+                yield text_so_far[len(decoded):]
+                decoded = text_so_far
+
+
+class OnnxMarianEngine(TranslatorEngine):
+    backend = "onnx"
+
+    def __init__(self, model_name, device="cpu", settings=None):
+        super().__init__(model_name, device, settings)
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        path = self._quantized_export(model_name)
+        self.model = ORTModelForSeq2SeqLM.from_pretrained(path)
+
+    @staticmethod
+    def _quantized_export(model_name):
+        """Export ONNX (encodeur / décodeur) puis quantification dynamique int8 de chaque graphe"""
+        path = _cache_dir("onnx", f"{model_name}-int8")
+        if path.exists() and any(path.glob("*.onnx")):
+            return path
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        print(f"🗜️ Export ONNX de {model_name} (int8)...")
+        export_dir = _cache_dir("onnx", model_name)
+        ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+        tmp_path = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        shutil.copytree(export_dir, tmp_path, ignore=shutil.ignore_patterns("*.onnx", "*.onnx_data"))
+        for onnx_file in export_dir.glob("*.onnx"):
+            quantize_dynamic(str(onnx_file), str(tmp_path / onnx_file.name), weight_type=QuantType.QInt8)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        shutil.rmtree(export_dir, ignore_errors=True)
+        return path
+
+    def _translate(self, text: str) -> str:
+        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=self.settings.max_length)
+        translated_tokens = self.model.generate(
+            **inputs,
+            num_beams=self.settings.beam_size,
+            do_sample=False,
+            max_new_tokens=self.settings.max_new_tokens(inputs["input_ids"].shape[1])
+        )
+        return self.tokenizer.decode(translated_tokens[0], skip_special_tokens=True)
+
+    def _stream_pieces(self, text: str):
+        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=self.settings.max_length)
+        yield from self._generate_streamed(self.model, inputs)
+
+
+def create_engine(model_name, device="cpu", backend="auto", settings=None, mmap_weights=False,
+                  precision=AUTO_PRECISION):
+    """
+    Crée le moteur demandé ; en cas d'échec (paquet absent, conversion impossible), PyTorch
+    (int8 sur CPU sauf précision explicite). engine.backend_reason indique pourquoi ce moteur a été choisi.
+    """
+    backend, reason = select_backend(backend, device, precision)
+    engine = None
+    try:
+        if backend == "ctranslate2":
+            engine = CTranslate2Engine(model_name, device, settings)
+        elif backend == "onnx":
+            engine = OnnxMarianEngine(model_name, device, settings)
+    except Exception as e:
+        print(f"⚠️ Moteur de traduction '{backend}' indisponible: {e}\nFallback PyTorch")
+        reason = f"fallback: {backend} unavailable"
+        backend = _torch_backend(device, precision)
+    if engine is None:
+        if backend == "torch-int8":
+            precision = "int8"
+        elif precision == AUTO_PRECISION:
+            precision = "fp32"
+        engine = TorchMarianEngine(model_name, device, settings, mmap_weights, precision)
+        if device == "cpu":
+            reason = f"{reason}, precision {precision}"
+    engine.backend_reason = reason
+    return engine